@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import json
+import sys
+
+
+class CallGraph:
+    """The calls between the functions of a module, by function name.
+        Calls to functions outside the module (e.g. when functions are
+        streamed one by one) are not edges.
+    """
+    def __init__(self, module):
+        self._names = [function.get_identifier()
+                       for function in module.get_functions()]
+        self._functions = {function.get_identifier(): function
+                           for function in module.get_functions()}
+        self._callees = {name: [] for name in self._names}
+        self._callers = {name: [] for name in self._names}
+        # name -> number of call sites calling it
+        self._num_calls = {name: 0 for name in self._names}
+        self._sccs = None
+
+        for function in module.get_functions():
+            caller = function.get_identifier()
+            for basic_block in function.get_basic_blocks():
+                for instruction in basic_block.get_instructions():
+                    for callee in instruction.get_functions():
+                        if callee not in self._functions:
+                            continue
+                        self._num_calls[callee] += 1
+                        if callee not in self._callees[caller]:
+                            self._callees[caller].append(callee)
+                            self._callers[callee].append(caller)
+
+    def get_names(self):
+        return self._names
+
+    def get_function(self, name):
+        return self._functions.get(name)
+
+    def get_callees(self, name):
+        return self._callees[name]
+
+    def get_callers(self, name):
+        return self._callers[name]
+
+    def get_number_of_calls(self, name):
+        return self._num_calls[name]
+
+    def get_sccs(self):
+        """The strongly connected components, a callee's before its
+            caller's (Tarjan's algorithm emits them in that order).
+            Computed iteratively like the reverse postorder of the CFG.
+        """
+        if self._sccs is not None:
+            return self._sccs
+        index = {}
+        low_link = {}
+        on_stack = set()
+        stack = []
+        sccs = []
+        for root in self._names:
+            if root in index:
+                continue
+            index[root] = low_link[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._callees[root]))]
+            while work:
+                name, callees = work[-1]
+                for callee in callees:
+                    if callee not in index:
+                        index[callee] = low_link[callee] = len(index)
+                        stack.append(callee)
+                        on_stack.add(callee)
+                        work.append((callee, iter(self._callees[callee])))
+                        break
+                    if callee in on_stack:
+                        low_link[name] = min(low_link[name], index[callee])
+                else:
+                    work.pop()
+                    if work:
+                        caller = work[-1][0]
+                        low_link[caller] = min(low_link[caller],
+                                               low_link[name])
+                    if low_link[name] != index[name]:
+                        continue
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        scc.append(member)
+                        if member == name:
+                            break
+                    scc.reverse()
+                    sccs.append(scc)
+        self._sccs = sccs
+        return sccs
+
+    def is_recursive(self, scc):
+        """Whether the functions of scc may call themselves"""
+        return len(scc) > 1 or scc[0] in self._callees[scc[0]]
+
+    def get_reachable(self, root):
+        """Names of the functions root may call, root included"""
+        reachable = set([root])
+        worklist = [root]
+        while worklist:
+            for callee in self._callees[worklist.pop()]:
+                if callee not in reachable:
+                    reachable.add(callee)
+                    worklist.append(callee)
+        return reachable
+
+
+def print_call_graph(module, out_stream=sys.stdout):
+    """Print the callees of every function and the strongly connected
+        components, callees first
+    """
+    call_graph = CallGraph(module)
+    result = {
+        "callees": {name: call_graph.get_callees(name)
+                    for name in call_graph.get_names()},
+        "sccs": call_graph.get_sccs(),
+    }
+    out_stream.write(json.dumps(result, indent=2, sort_keys=True))
+    out_stream.write("\n")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""A worklist dataflow engine over the control-flow graph.
+
+A problem supplies its direction, the value at the boundary, a meet over
+the values flowing into a block and a transfer function through the
+block. Set lattices are bitsets (Python ints) indexed by the interned
+symbol ids of the function, or by definition sites for reaching
+definitions, so meets and transfers are a handful of integer operations
+regardless of the number of variables.
+
+The blocks are visited in reverse postorder (postorder for backward
+problems) from a priority worklist, which converges in a few passes on
+reducible graphs.
+"""
+
+import heapq
+import sys
+
+from bril_compiler.constant import BrilOperator
+
+
+def iterate_bits(bitset):
+    """The indices of the set bits, lowest first"""
+    while bitset:
+        lowest = bitset & -bitset
+        yield lowest.bit_length() - 1
+        bitset ^= lowest
+
+
+class DataflowProblem:
+    """meet(block, values) combines the values of the edges into block;
+        transfer(block, value) pushes a value through it. For a backward
+        problem "into" means from the successors and the transfer goes
+        from the end of the block to its start.
+    """
+    FORWARD = True
+
+    def boundary(self, block):
+        """The value flowing into a block without incoming edges"""
+        raise NotImplementedError
+
+    def initial(self, block):
+        """The optimistic value a block starts with"""
+        raise NotImplementedError
+
+    def meet(self, block, values):
+        raise NotImplementedError
+
+    def transfer(self, block, value):
+        raise NotImplementedError
+
+    def widen(self, block, previous, value):
+        """Combine the meet value of a block with the one of its previous
+            visit. A lattice of infinite height widens at loop headers so
+            the iteration stops; the default keeps the new value.
+        """
+        return value
+
+    def format_value(self, value):
+        """The value as printed by bril's df.py"""
+        raise NotImplementedError
+
+
+class DataflowResult:
+    """The values at the start and at the end of every block"""
+    def __init__(self, block_in, block_out):
+        self._in = block_in
+        self._out = block_out
+
+    def get_in(self, block):
+        return self._in[block]
+
+    def get_out(self, block):
+        return self._out[block]
+
+
+def solve(problem, cfg):
+    num_blocks = cfg.get_number_of_blocks()
+    if problem.FORWARD:
+        order = list(cfg.get_reverse_postorder())
+        in_edges, out_edges = cfg.get_predecessors, cfg.get_successors
+    else:
+        order = cfg.get_postorder()
+        in_edges, out_edges = cfg.get_successors, cfg.get_predecessors
+    # unreachable blocks are solved as well, after the others
+    order += [block for block in range(num_blocks)
+              if not cfg.is_reachable(block)]
+    priorities = [0] * num_blocks
+    for priority, block in enumerate(order):
+        priorities[block] = priority
+
+    meet_values = [None] * num_blocks
+    transferred = [problem.initial(block) for block in range(num_blocks)]
+    worklist = list(range(num_blocks))
+    in_worklist = [True] * num_blocks
+    visited = [False] * num_blocks
+    while worklist:
+        block = order[heapq.heappop(worklist)]
+        in_worklist[block] = False
+        edges = in_edges(block)
+        if edges:
+            value = problem.meet(
+                block, [transferred[edge] for edge in edges])
+        else:
+            value = problem.boundary(block)
+        if visited[block]:
+            value = problem.widen(block, meet_values[block], value)
+        meet_values[block] = value
+        value = problem.transfer(block, value)
+        if visited[block] and value == transferred[block]:
+            continue
+        visited[block] = True
+        transferred[block] = value
+        for successor in out_edges(block):
+            if not in_worklist[successor]:
+                in_worklist[successor] = True
+                heapq.heappush(worklist, priorities[successor])
+
+    if problem.FORWARD:
+        return DataflowResult(meet_values, transferred)
+    return DataflowResult(transferred, meet_values)
+
+
+class ReachingDefinitions(DataflowProblem):
+    """Which definitions may reach each point. A definition is one
+        instruction with a destination; get_definition(bit) tells where.
+    """
+    def __init__(self, function, cfg):
+        symbol_table = function.intern_symbols()
+        get_id = symbol_table.get_id
+        self._symbol_table = symbol_table
+        # definition bit -> (block, instruction index, symbol id)
+        self._definitions = []
+        definitions_of = [0] * len(symbol_table)
+        block_definitions = []
+        for block in range(cfg.get_number_of_blocks()):
+            last_definitions = {}
+            instructions = cfg.get_block(block).get_instructions()
+            for i, instruction in enumerate(instructions):
+                destination = instruction.get_destination()
+                if destination is None:
+                    continue
+                symbol_id = get_id(destination)
+                bit = len(self._definitions)
+                self._definitions.append((block, i, symbol_id))
+                definitions_of[symbol_id] |= 1 << bit
+                last_definitions[symbol_id] = bit
+            block_definitions.append(last_definitions)
+
+        self._generated = []
+        self._killed = []
+        for last_definitions in block_definitions:
+            generated, killed = 0, 0
+            for symbol_id, bit in last_definitions.items():
+                generated |= 1 << bit
+                killed |= definitions_of[symbol_id]
+            self._generated.append(generated)
+            self._killed.append(killed & ~generated)
+
+    def get_definition(self, bit):
+        """(block, instruction index, symbol id) of a definition"""
+        return self._definitions[bit]
+
+    def boundary(self, block):
+        return 0
+
+    def initial(self, block):
+        return 0
+
+    def meet(self, block, values):
+        result = 0
+        for value in values:
+            result |= value
+        return result
+
+    def transfer(self, block, value):
+        return self._generated[block] | (value & ~self._killed[block])
+
+    def format_value(self, value):
+        """The names defined by the reaching definitions"""
+        names = set()
+        for bit in iterate_bits(value):
+            symbol_id = self._definitions[bit][2]
+            names.add(self._symbol_table.get_name(symbol_id))
+        return ", ".join(sorted(names)) if names else "∅"
+
+
+class LiveVariables(DataflowProblem):
+    """Variables whose current value may still be read. A phi argument
+        is live at the end of the predecessor it comes from, not at the
+        start of the phi's block.
+    """
+    FORWARD = False
+
+    def __init__(self, function, cfg):
+        symbol_table = function.intern_symbols()
+        get_id = symbol_table.get_id
+        self._symbol_table = symbol_table
+        num_blocks = cfg.get_number_of_blocks()
+        name_to_index = {name: i for i, name in enumerate(cfg.get_names())}
+
+        self._uses = [0] * num_blocks
+        self._definitions = [0] * num_blocks
+        self._phi_uses = [0] * num_blocks
+        for block in range(num_blocks):
+            used, defined = 0, 0
+            for instruction in cfg.get_block(block).get_instructions():
+                operator = instruction.get_opcode()
+                if operator == BrilOperator.PHI:
+                    for label, arg in instruction.get_incoming():
+                        predecessor = name_to_index.get(label)
+                        if predecessor is not None:
+                            self._phi_uses[predecessor] |= 1 << get_id(arg)
+                elif operator != BrilOperator.CONST:
+                    for arg in instruction.get_arguments():
+                        bit = 1 << get_id(arg)
+                        if not defined & bit:
+                            used |= bit
+                destination = instruction.get_destination()
+                if destination is not None:
+                    defined |= 1 << get_id(destination)
+            self._uses[block] = used
+            self._definitions[block] = defined
+
+    def boundary(self, block):
+        return self._phi_uses[block]
+
+    def initial(self, block):
+        return 0
+
+    def meet(self, block, values):
+        result = self._phi_uses[block]
+        for value in values:
+            result |= value
+        return result
+
+    def transfer(self, block, value):
+        return self._uses[block] | (value & ~self._definitions[block])
+
+    def format_value(self, value):
+        names = sorted(self._symbol_table.get_name(symbol_id)
+                       for symbol_id in iterate_bits(value))
+        return ", ".join(names) if names else "∅"
+
+
+class _Unknown:
+    """The lattice value of a variable that is not a single constant"""
+    def __repr__(self):
+        return "?"
+
+
+UNKNOWN = _Unknown()
+
+
+class ConstantPropagation(DataflowProblem):
+    """{symbol id: constant or UNKNOWN} for the variables defined on some
+        path. A variable keeps its constant through a join when the other
+        paths do not define it, like bril's df.py.
+    """
+    def __init__(self, function, cfg):
+        symbol_table = function.intern_symbols()
+        self._symbol_table = symbol_table
+        self._cfg = cfg
+
+    def boundary(self, block):
+        return {}
+
+    def initial(self, block):
+        return {}
+
+    def meet(self, block, values):
+        result = {}
+        for value in values:
+            for symbol_id, constant in value.items():
+                if constant is UNKNOWN:
+                    result[symbol_id] = UNKNOWN
+                elif symbol_id not in result:
+                    result[symbol_id] = constant
+                elif result[symbol_id] != constant:
+                    result[symbol_id] = UNKNOWN
+        return result
+
+    def transfer(self, block, value):
+        get_id = self._symbol_table.get_id
+        value = dict(value)
+        for instruction in self._cfg.get_block(block).get_instructions():
+            destination = instruction.get_destination()
+            if destination is None:
+                continue
+            if instruction.get_opcode() == BrilOperator.CONST:
+                value[get_id(destination)] = instruction.get_value()
+            else:
+                value[get_id(destination)] = UNKNOWN
+        return value
+
+    def format_value(self, value):
+        if not value:
+            return "∅"
+        items = sorted(
+            (self._symbol_table.get_name(symbol_id), constant)
+            for symbol_id, constant in value.items()
+        )
+        return ", ".join(f"{name}: {constant}" for name, constant in items)
+
+
+def _print_problem(module, problem_class, out_stream):
+    for function in module.get_functions():
+        cfg = function.get_cfg()
+        problem = problem_class(function, cfg)
+        result = solve(problem, cfg)
+        for block in range(cfg.get_number_of_blocks()):
+            out_stream.write(f"{cfg.get_name(block)}:\n")
+            out_stream.write(
+                f"  in:  {problem.format_value(result.get_in(block))}\n")
+            out_stream.write(
+                f"  out: {problem.format_value(result.get_out(block))}\n")
+
+
+def print_defined(module, out_stream=sys.stdout):
+    _print_problem(module, ReachingDefinitions, out_stream)
+
+
+def print_live(module, out_stream=sys.stdout):
+    _print_problem(module, LiveVariables, out_stream)
+
+
+def print_cprop(module, out_stream=sys.stdout):
+    _print_problem(module, ConstantPropagation, out_stream)
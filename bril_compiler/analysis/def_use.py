@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+from bril_compiler.constant import BrilOperator
+
+
+class DefUseChains:
+    """Where every variable of a function is defined and used.
+        Sites are (block_index, instruction_index) pairs, indexed by the
+        symbol id of the variable.
+    """
+    def __init__(self, function):
+        self._symbol_table = function.intern_symbols()
+        num_symbols = len(self._symbol_table)
+        self._definitions = [[] for _ in range(num_symbols)]
+        self._uses = [[] for _ in range(num_symbols)]
+
+        get_id = self._symbol_table.get_id
+        for block_index, basic_block in enumerate(
+                function.get_basic_blocks()):
+            for i, instruction in enumerate(basic_block.get_instructions()):
+                if instruction.get_opcode() != BrilOperator.CONST:
+                    for arg in instruction.get_arguments():
+                        self._uses[get_id(arg)].append((block_index, i))
+                destination = instruction.get_destination()
+                if destination is not None:
+                    self._definitions[get_id(destination)].append(
+                        (block_index, i))
+
+    def get_definitions(self, name):
+        symbol_id = self._symbol_table.get_id(name)
+        if symbol_id is None or symbol_id >= len(self._definitions):
+            return []
+        return self._definitions[symbol_id]
+
+    def get_uses(self, name):
+        symbol_id = self._symbol_table.get_id(name)
+        if symbol_id is None or symbol_id >= len(self._uses):
+            return []
+        return self._uses[symbol_id]
+
+    def get_definitions_by_id(self, symbol_id):
+        return self._definitions[symbol_id]
+
+    def get_uses_by_id(self, symbol_id):
+        return self._uses[symbol_id]
+
+
+def get_definitions(cfg):
+    """The index of the block defining every variable of cfg and the
+        instruction defining it. In SSA form there is one of each.
+    """
+    definition_blocks = {}
+    definitions = {}
+    for index, basic_block in enumerate(cfg.get_blocks()):
+        for instruction in basic_block.get_instructions():
+            destination = instruction.get_destination()
+            if destination is not None:
+                definition_blocks[destination] = index
+                definitions[destination] = instruction
+    return definition_blocks, definitions
+
+
+def get_constants(definitions):
+    """The value of every variable defined by a const"""
+    return {
+        name: instruction.get_value()
+        for name, instruction in definitions.items()
+        if instruction.get_opcode() == BrilOperator.CONST
+    }
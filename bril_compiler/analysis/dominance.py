@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Dominator tree and dominance frontiers.
+
+Immediate dominators are computed with the iterative algorithm of Cooper,
+Harvey and Kennedy ("A Simple, Fast Dominance Algorithm") over the reverse
+postorder of the CFG. Dominance frontiers use the same paper's
+join-point walk, and dominance queries are answered in O(1) from a
+pre/post numbering of the dominator tree.
+"""
+
+import json
+import sys
+
+
+class DominatorTree:
+    """Dominance over a graph whose nodes are 0..num_nodes-1.
+        Use DominatorTree.from_cfg for the dominators of a function. A
+        post-dominator tree can be built the same way from the reversed
+        edges.
+        Unreachable nodes have no immediate dominator and are dominated by
+        nothing.
+    """
+    def __init__(self, num_nodes, root, predecessors, reverse_postorder):
+        self._num_nodes = num_nodes
+        self._root = root
+        self._predecessors = predecessors
+        self._reverse_postorder = reverse_postorder
+        self._immediate_dominators = self._compute_immediate_dominators()
+        self._children = [[] for _ in range(num_nodes)]
+        for node in reverse_postorder:
+            idom = self._immediate_dominators[node]
+            if node != root:
+                self._children[idom].append(node)
+        self._number_tree()
+        self._frontiers = None
+
+    @classmethod
+    def from_cfg(cls, cfg):
+        return cls(cfg.get_number_of_blocks(), cfg.get_entry(),
+                   [cfg.get_predecessors(i)
+                    for i in range(cfg.get_number_of_blocks())],
+                   cfg.get_reverse_postorder())
+
+    def _compute_immediate_dominators(self):
+        order = [None] * self._num_nodes
+        for position, node in enumerate(self._reverse_postorder):
+            order[node] = position
+
+        idom = [None] * self._num_nodes
+        if not self._reverse_postorder:
+            return idom
+        idom[self._root] = self._root
+
+        def intersect(finger0, finger1):
+            while finger0 != finger1:
+                while order[finger0] > order[finger1]:
+                    finger0 = idom[finger0]
+                while order[finger1] > order[finger0]:
+                    finger1 = idom[finger1]
+            return finger0
+
+        changed = True
+        while changed:
+            changed = False
+            for node in self._reverse_postorder:
+                if node == self._root:
+                    continue
+                new_idom = None
+                for predecessor in self._predecessors[node]:
+                    if idom[predecessor] is None:
+                        continue
+                    if new_idom is None:
+                        new_idom = predecessor
+                    else:
+                        new_idom = intersect(predecessor, new_idom)
+                if idom[node] != new_idom:
+                    idom[node] = new_idom
+                    changed = True
+        return idom
+
+    def _number_tree(self):
+        """Pre/post numbers of a DFS over the tree for dominance checks"""
+        self._preorder = [None] * self._num_nodes
+        self._postorder = [None] * self._num_nodes
+        if not self._reverse_postorder:
+            return
+        counter = 0
+        stack = [(self._root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                self._postorder[node] = counter
+                counter += 1
+                continue
+            self._preorder[node] = counter
+            counter += 1
+            stack.append((node, True))
+            for child in reversed(self._children[node]):
+                stack.append((child, False))
+
+    def get_root(self):
+        return self._root
+
+    def get_immediate_dominator(self, node):
+        """None for the root and for unreachable nodes"""
+        if node == self._root:
+            return None
+        return self._immediate_dominators[node]
+
+    def get_children(self, node):
+        return self._children[node]
+
+    def is_reachable(self, node):
+        return self._preorder[node] is not None
+
+    def dominates(self, dominator, node):
+        if not self.is_reachable(dominator) or not self.is_reachable(node):
+            return False
+        return (self._preorder[dominator] <= self._preorder[node] and
+                self._postorder[node] <= self._postorder[dominator])
+
+    def strictly_dominates(self, dominator, node):
+        return dominator != node and self.dominates(dominator, node)
+
+    def get_dominators(self, node):
+        """All dominators of node, from node itself up to the root"""
+        if not self.is_reachable(node):
+            return []
+        dominators = [node]
+        while node != self._root:
+            node = self._immediate_dominators[node]
+            dominators.append(node)
+        return dominators
+
+    def get_preorder(self):
+        """Reachable nodes in dominator-tree preorder (parents first)"""
+        nodes = [node for node in range(self._num_nodes)
+                 if self._preorder[node] is not None]
+        nodes.sort(key=lambda node: self._preorder[node])
+        return nodes
+
+    def get_dominance_frontier(self, node):
+        if self._frontiers is None:
+            self._frontiers = self._compute_dominance_frontiers()
+        return self._frontiers[node]
+
+    def _compute_dominance_frontiers(self):
+        frontiers = [set() for _ in range(self._num_nodes)]
+        idom = self._immediate_dominators
+        for node in self._reverse_postorder:
+            predecessors = [
+                predecessor for predecessor in self._predecessors[node]
+                if idom[predecessor] is not None
+            ]
+            if len(predecessors) < 2 and node != self._root:
+                continue
+            # the root has no immediate dominator: walk up to the root
+            stop = None if node == self._root else idom[node]
+            for runner in predecessors:
+                while runner is not None and runner != stop:
+                    frontiers[runner].add(node)
+                    runner = None if runner == self._root else idom[runner]
+        return frontiers
+
+
+def compute_dominators(function):
+    return DominatorTree.from_cfg(function.get_cfg())
+
+
+def _dump_per_block(module, get_blocks, out_stream):
+    """Print {block: sorted block names} for every function, formatted
+        like bril's dom.py.
+    """
+    for function in module.get_functions():
+        function.add_entry_block()
+        cfg = function.get_cfg()
+        dominator_tree = DominatorTree.from_cfg(cfg)
+        result = {}
+        for index in range(cfg.get_number_of_blocks()):
+            result[cfg.get_name(index)] = sorted(
+                cfg.get_name(block)
+                for block in get_blocks(dominator_tree, index)
+            )
+        out_stream.write(json.dumps(result, indent=2, sort_keys=True))
+        out_stream.write("\n")
+
+
+def print_dominators(module, out_stream=sys.stdout):
+    _dump_per_block(module, DominatorTree.get_dominators, out_stream)
+
+
+def print_dominance_frontiers(module, out_stream=sys.stdout):
+    _dump_per_block(module, DominatorTree.get_dominance_frontier,
+                    out_stream)
+
+
+def print_dominator_tree(module, out_stream=sys.stdout):
+    _dump_per_block(module, DominatorTree.get_children, out_stream)
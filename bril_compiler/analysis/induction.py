@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Induction variables of the natural loops of a function in SSA form.
+
+A basic induction variable is a phi in a loop header that gets the same
+variable on every back edge, defined as itself plus or minus a
+loop-invariant step:
+
+    i = phi i0 i.next ...;    i.next = add i step;
+
+A derived induction variable is a linear function of a basic one: it
+is computed from another induction variable of the same loop by a mul
+or an add with a loop invariant, or by subtracting a loop invariant.
+"""
+
+import json
+import sys
+
+from bril_compiler.analysis import def_use
+from bril_compiler.analysis import loops
+from bril_compiler.analysis import ssa
+from bril_compiler.constant import BrilOperator
+
+
+class BasicInductionVariable:
+    def __init__(self, name, phi, initial, step, step_operator, update):
+        self.name = name
+        self.phi = phi
+        # the value entering the loop
+        self.initial = initial
+        # ADD or SUBTRACT by step
+        self.step = step
+        self.step_operator = step_operator
+        # the variable the back edges bring in
+        self.update = update
+
+    def dump(self):
+        sign = "+" if self.step_operator == BrilOperator.ADD else "-"
+        return f"{self.initial}; {sign}{self.step}"
+
+
+class DerivedInductionVariable:
+    """source operator invariant, where source is an induction variable
+        of the same loop. Following the sources down to the basic one
+        gives the chain of operations computing the variable from it.
+    """
+    def __init__(self, name, instruction, source, operator, invariant):
+        self.name = name
+        self.instruction = instruction
+        self.source = source
+        # MULTIPLY, ADD or SUBTRACT
+        self.operator = operator
+        self.invariant = invariant
+
+    def get_basic(self):
+        return self.get_chain()[0]
+
+    def get_chain(self):
+        """[basic, the derived variables from the basic one to this]"""
+        chain = [self]
+        while isinstance(chain[-1], DerivedInductionVariable):
+            chain.append(chain[-1].source)
+        chain.reverse()
+        return chain
+
+    def is_scaled(self):
+        """Whether the chain multiplies"""
+        return any(derived.operator == BrilOperator.MULTIPLY
+                   for derived in self.get_chain()[1:])
+
+    def dump(self):
+        chain = self.get_chain()
+        text = chain[0].name
+        for derived in chain[1:]:
+            if derived.operator == BrilOperator.MULTIPLY:
+                if " " in text:
+                    text = f"({text})"
+                text = f"{text} * {derived.invariant}"
+            elif derived.operator == BrilOperator.ADD:
+                text = f"{text} + {derived.invariant}"
+            else:
+                text = f"{text} - {derived.invariant}"
+        return text
+
+
+class InductionVariables:
+    """The induction variables of every loop of loop_info, by variable
+        name. A function that is not in SSA form has none.
+    """
+    def __init__(self, function, cfg, loop_info):
+        self._cfg = cfg
+        self._by_header = {}
+        if not ssa.is_ssa(function):
+            return
+        # the block and the instruction defining every variable
+        self._definition_blocks, self._definitions = (
+            def_use.get_definitions(cfg))
+
+        for loop in loop_info.get_loops():
+            induction_variables = {}
+            self._find_basic(loop, induction_variables)
+            if induction_variables:
+                self._find_derived(loop, induction_variables)
+            self._by_header[loop.get_header()] = induction_variables
+
+    def get_induction_variables(self, loop):
+        """{name: induction variable}, the basic ones first"""
+        return self._by_header.get(loop.get_header(), {})
+
+    def get_basic(self, loop):
+        return [induction_variable for induction_variable
+                in self.get_induction_variables(loop).values()
+                if isinstance(induction_variable, BasicInductionVariable)]
+
+    def get_derived(self, loop):
+        return [induction_variable for induction_variable
+                in self.get_induction_variables(loop).values()
+                if isinstance(induction_variable, DerivedInductionVariable)]
+
+    def _is_invariant(self, loop, name):
+        block = self._definition_blocks.get(name)
+        return block is None or not loop.contains(block)
+
+    def _find_basic(self, loop, induction_variables):
+        header_block = self._cfg.get_block(loop.get_header())
+        for phi in header_block.get_instructions():
+            if phi.get_opcode() != BrilOperator.PHI:
+                break
+            initial, update = set(), set()
+            for label, argument in phi.get_incoming():
+                predecessor = self._cfg.get_index_by_label(label)
+                if predecessor is None:
+                    continue
+                if loop.contains(predecessor):
+                    update.add(argument)
+                else:
+                    initial.add(argument)
+            if len(initial) != 1 or len(update) != 1:
+                continue
+            initial, update = initial.pop(), update.pop()
+            if update not in self._definitions:
+                continue
+            step = self._get_step(
+                loop, self._definitions[update], phi.get_destination())
+            if step is None:
+                continue
+            name = phi.get_destination()
+            induction_variables[name] = BasicInductionVariable(
+                name, phi, initial, step[0], step[1], update)
+
+    def _get_step(self, loop, instruction, name):
+        """(step, ADD or SUBTRACT) if instruction is name +/- an
+            invariant, None otherwise
+        """
+        operator = instruction.get_opcode()
+        if operator not in (BrilOperator.ADD, BrilOperator.SUBTRACT):
+            return None
+        arguments = instruction.get_arguments()
+        if arguments[0] == name and self._is_invariant(loop, arguments[1]):
+            return arguments[1], operator
+        if (operator == BrilOperator.ADD and arguments[1] == name and
+            self._is_invariant(loop, arguments[0])):
+            return arguments[0], operator
+        return None
+
+    def _find_derived(self, loop, induction_variables):
+        # in reverse postorder the operands are classified first
+        for block in loop.get_blocks():
+            for instruction in self._cfg.get_block(block).get_instructions():
+                operator = instruction.get_opcode()
+                destination = instruction.get_destination()
+                if (destination is None or
+                    destination in induction_variables):
+                    continue
+                derived = self._derive(
+                    loop, instruction, operator, induction_variables)
+                if derived is not None:
+                    induction_variables[destination] = derived
+
+    def _derive(self, loop, instruction, operator, induction_variables):
+        if operator not in (BrilOperator.MULTIPLY, BrilOperator.ADD,
+                            BrilOperator.SUBTRACT):
+            return None
+        arguments = instruction.get_arguments()
+        # (induction variable, invariant) operand pairs
+        candidates = [(arguments[0], arguments[1])]
+        if operator != BrilOperator.SUBTRACT:
+            candidates.append((arguments[1], arguments[0]))
+        for variable, invariant in candidates:
+            source = induction_variables.get(variable)
+            if source is not None and self._is_invariant(loop, invariant):
+                return DerivedInductionVariable(
+                    instruction.get_destination(), instruction, source,
+                    operator, invariant)
+        return None
+
+
+def print_induction_variables(module, out_stream=sys.stdout):
+    """Print {header: {variable: description}} for every function"""
+    for function in module.get_functions():
+        cfg = function.get_cfg()
+        loop_info = loops.compute_loops(function)
+        induction_variables = InductionVariables(function, cfg, loop_info)
+        result = {}
+        for loop in loop_info.get_loops():
+            result[cfg.get_name(loop.get_header())] = {
+                name: induction_variable.dump()
+                for name, induction_variable in
+                induction_variables.get_induction_variables(loop).items()
+            }
+        out_stream.write(json.dumps(result, indent=2, sort_keys=True))
+        out_stream.write("\n")
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+from bril_compiler.analysis import dataflow
+
+
+class Liveness:
+    """Live variables at the entry and exit of every block.
+        Sets are bitsets (Python ints) over the symbol ids of the
+        function, solved by dataflow.LiveVariables.
+    """
+    def __init__(self, function, cfg):
+        self._problem = dataflow.LiveVariables(function, cfg)
+        self._symbol_table = function.get_symbol_table()
+        result = dataflow.solve(self._problem, cfg)
+        num_blocks = cfg.get_number_of_blocks()
+        self._live_in = [result.get_in(block) for block in range(num_blocks)]
+        self._live_out = [result.get_out(block)
+                          for block in range(num_blocks)]
+
+    def get_live_in(self, block_index):
+        return self._live_in[block_index]
+
+    def get_live_out(self, block_index):
+        return self._live_out[block_index]
+
+    def is_live_in(self, block_index, symbol_id):
+        return (self._live_in[block_index] >> symbol_id) & 1 == 1
+
+    def is_live_out(self, block_index, symbol_id):
+        return (self._live_out[block_index] >> symbol_id) & 1 == 1
+
+    def get_live_in_names(self, block_index):
+        return self._to_names(self._live_in[block_index])
+
+    def get_live_out_names(self, block_index):
+        return self._to_names(self._live_out[block_index])
+
+    def _to_names(self, bitset):
+        return [self._symbol_table.get_name(symbol_id)
+                for symbol_id in dataflow.iterate_bits(bitset)]
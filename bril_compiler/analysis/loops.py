@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Natural loops.
+
+An edge whose target dominates its source is a back edge, and its target
+is a loop header. The natural loop of a header is the header plus every
+block that reaches one of its back edges without going through the
+header; the loops of back edges sharing a header are merged into one.
+Two natural loops are either disjoint or nested, so the loops form a
+forest in which a loop's parent is the innermost loop around it.
+"""
+
+import json
+import sys
+
+from bril_compiler.analysis import dominance
+
+
+class NaturalLoop:
+    def __init__(self, header, latches, blocks):
+        self._header = header
+        # sources of the back edges into the header
+        self._latches = latches
+        # in reverse postorder, the header first
+        self._blocks = blocks
+        self._block_set = set(blocks)
+        self._parent = None
+        self._children = []
+        self._depth = 1
+
+    def get_header(self):
+        return self._header
+
+    def get_latches(self):
+        return self._latches
+
+    def get_blocks(self):
+        return self._blocks
+
+    def contains(self, block):
+        return block in self._block_set
+
+    def get_parent(self):
+        """The innermost loop around this one, None at the top level"""
+        return self._parent
+
+    def get_children(self):
+        return self._children
+
+    def get_depth(self):
+        """1 for a top level loop"""
+        return self._depth
+
+    def get_exit_edges(self, cfg):
+        """(block in the loop, successor outside the loop) pairs"""
+        return [(block, successor) for block in self._blocks
+                for successor in cfg.get_successors(block)
+                if successor not in self._block_set]
+
+
+class LoopInfo:
+    """The natural loops of a function, found from the back edges of its
+        dominator tree. Loops are listed by the reverse postorder of
+        their headers, so a loop comes after every loop around it.
+    """
+    def __init__(self, cfg, dominator_tree):
+        self._cfg = cfg
+        reverse_postorder = cfg.get_reverse_postorder()
+        order = [None] * cfg.get_number_of_blocks()
+        for position, block in enumerate(reverse_postorder):
+            order[block] = position
+
+        latches = {}
+        for block in reverse_postorder:
+            for successor in cfg.get_successors(block):
+                if dominator_tree.dominates(successor, block):
+                    latches.setdefault(successor, []).append(block)
+
+        self._loops = []
+        # innermost loop of every block
+        self._block_to_loop = [None] * cfg.get_number_of_blocks()
+        for header in sorted(latches, key=lambda block: order[block]):
+            blocks = self._collect_body(header, latches[header], order)
+            loop = NaturalLoop(header, latches[header], blocks)
+            # the loops around the header were all found before
+            parent = self._block_to_loop[header]
+            if parent is not None:
+                loop._parent = parent
+                loop._depth = parent.get_depth() + 1
+                parent._children.append(loop)
+            for block in blocks:
+                self._block_to_loop[block] = loop
+            self._loops.append(loop)
+
+    def _collect_body(self, header, latches, order):
+        body = {header}
+        worklist = []
+        for latch in latches:
+            if latch not in body:
+                body.add(latch)
+                worklist.append(latch)
+        while worklist:
+            block = worklist.pop()
+            for predecessor in self._cfg.get_predecessors(block):
+                # an unreachable block can reach the loop too
+                if (order[predecessor] is not None and
+                    predecessor not in body):
+                    body.add(predecessor)
+                    worklist.append(predecessor)
+        return sorted(body, key=lambda block: order[block])
+
+    def get_loops(self):
+        """Outer loops before the loops they contain"""
+        return self._loops
+
+    def get_top_level_loops(self):
+        return [loop for loop in self._loops if loop.get_parent() is None]
+
+    def get_loop_for(self, block):
+        """The innermost loop containing block, None if there is none"""
+        return self._block_to_loop[block]
+
+    def get_loop_depth(self, block):
+        loop = self._block_to_loop[block]
+        return 0 if loop is None else loop.get_depth()
+
+    def get_preheader(self, loop):
+        """The only predecessor of the header outside the loop, if the
+            header is its only successor; None otherwise.
+        """
+        header = loop.get_header()
+        entering = [predecessor
+                    for predecessor in self._cfg.get_predecessors(header)
+                    if not loop.contains(predecessor)]
+        if len(entering) != 1:
+            return None
+        if self._cfg.get_successors(entering[0]) != [header]:
+            return None
+        return entering[0]
+
+
+def compute_loops(function):
+    cfg = function.get_cfg()
+    return LoopInfo(cfg, dominance.DominatorTree.from_cfg(cfg))
+
+
+def print_loops(module, out_stream=sys.stdout):
+    """Print {header: {blocks, depth, latches, preheader}} for every
+        function, with block names like the dominator printers.
+    """
+    for function in module.get_functions():
+        function.add_entry_block()
+        cfg = function.get_cfg()
+        loop_info = compute_loops(function)
+        result = {}
+        for loop in loop_info.get_loops():
+            preheader = loop_info.get_preheader(loop)
+            result[cfg.get_name(loop.get_header())] = {
+                "blocks": sorted(cfg.get_name(block)
+                                 for block in loop.get_blocks()),
+                "depth": loop.get_depth(),
+                "latches": sorted(cfg.get_name(block)
+                                  for block in loop.get_latches()),
+                "preheader": (None if preheader is None
+                              else cfg.get_name(preheader)),
+            }
+        out_stream.write(json.dumps(result, indent=2, sort_keys=True))
+        out_stream.write("\n")
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+import sys
+
+
+def is_ssa(function):
+    """Whether every variable, arguments included, is assigned once"""
+    assigned = set(name for name, _ in function.arguments)
+    for basic_block in function.get_basic_blocks():
+        for instruction in basic_block.get_instructions():
+            destination = instruction.get_destination()
+            if destination is None:
+                continue
+            if destination in assigned:
+                return False
+            assigned.add(destination)
+    return True
+
+
+def print_is_ssa(module, out_stream=sys.stdout):
+    """Print yes or no like bril's is_ssa.py"""
+    if all(is_ssa(function) for function in module.get_functions()):
+        out_stream.write("yes\n")
+    else:
+        out_stream.write("no\n")
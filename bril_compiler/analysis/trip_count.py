@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Constant trip counts of the natural loops of a function in SSA form.
+
+A loop has a known trip count when its header is its only exit and
+branches on a comparison of a basic induction variable with a constant:
+
+    .header:
+      i = phi i0 i.next ...;
+      cond = lt i n;
+      br cond .body .exit;
+
+where i0, the step of i and n are constants. The trip count is the
+number of times the header branches into the loop. Bril integers wrap,
+so a count is only given when the induction variable reaches the exit
+without overflowing.
+"""
+
+import json
+import sys
+
+from bril_compiler import opcode
+from bril_compiler.analysis import def_use
+from bril_compiler.analysis import induction
+from bril_compiler.analysis import loops
+from bril_compiler.constant import BrilOperator
+
+_INT_MIN = -(1 << 63)
+_INT_MAX = (1 << 63) - 1
+
+# the comparison with swapped operands, and the one testing the opposite
+_SWAPPED = {
+    BrilOperator.LESS_THAN: BrilOperator.GREATER_THAN,
+    BrilOperator.LESS_THAN_OR_EQUAL_TO:
+        BrilOperator.GREATER_THAN_OR_EQUAL_TO,
+    BrilOperator.GREATER_THAN: BrilOperator.LESS_THAN,
+    BrilOperator.GREATER_THAN_OR_EQUAL_TO:
+        BrilOperator.LESS_THAN_OR_EQUAL_TO,
+}
+_NEGATED = {
+    BrilOperator.LESS_THAN: BrilOperator.GREATER_THAN_OR_EQUAL_TO,
+    BrilOperator.LESS_THAN_OR_EQUAL_TO: BrilOperator.GREATER_THAN,
+    BrilOperator.GREATER_THAN: BrilOperator.LESS_THAN_OR_EQUAL_TO,
+    BrilOperator.GREATER_THAN_OR_EQUAL_TO: BrilOperator.LESS_THAN,
+}
+
+
+class TripCount:
+    def __init__(self, loop, induction_variable, compare, operator, bound,
+                 count, body, exit):
+        self.loop = loop
+        self.induction_variable = induction_variable
+        # the instruction computing the exit condition
+        self.compare = compare
+        # the loop goes on while "induction variable operator bound"
+        self.operator = operator
+        self.bound = bound
+        self.count = count
+        # the successors of the header inside and outside the loop
+        self.body = body
+        self.exit = exit
+
+    def dump(self):
+        return self.count
+
+
+class TripCounts:
+    """The constant trip counts of the loops of loop_info"""
+    def __init__(self, function, cfg, loop_info, induction_variables):
+        self._cfg = cfg
+        self._trip_counts = {}
+        self._definition_blocks, definitions = def_use.get_definitions(cfg)
+        self._constants = def_use.get_constants(definitions)
+
+        for loop in loop_info.get_loops():
+            trip_count = self._compute(loop, induction_variables)
+            if trip_count is not None:
+                self._trip_counts[loop.get_header()] = trip_count
+
+    def get_trip_count(self, loop):
+        """The TripCount of loop, None if it is not a known constant"""
+        return self._trip_counts.get(loop.get_header())
+
+    def _compute(self, loop, induction_variables):
+        header = loop.get_header()
+        exit_edges = loop.get_exit_edges(self._cfg)
+        if len(exit_edges) != 1 or exit_edges[0][0] != header:
+            return None
+        exit = exit_edges[0][1]
+        branch = self._cfg.get_block(header).get_terminator()
+        if branch is None or branch.get_opcode() != BrilOperator.BR:
+            return None
+        label_on_true, label_on_false = branch.get_labels()
+        body = self._cfg.get_index_by_label(label_on_true)
+        if body == exit:
+            body = self._cfg.get_index_by_label(label_on_false)
+
+        condition = branch.get_arguments()[0]
+        if self._definition_blocks.get(condition) != header:
+            return None
+        compare = None
+        for instruction in self._cfg.get_block(header).get_instructions():
+            if instruction.get_destination() == condition:
+                compare = instruction
+        operator = compare.get_opcode()
+        if operator not in _SWAPPED:
+            return None
+
+        basic = {induction_variable.name: induction_variable for
+                 induction_variable in induction_variables.get_basic(loop)}
+        operand0, operand1 = compare.get_arguments()
+        if operand0 in basic and operand1 in self._constants:
+            induction_variable, bound = basic[operand0], operand1
+        elif operand1 in basic and operand0 in self._constants:
+            induction_variable, bound = basic[operand1], operand0
+            operator = _SWAPPED[operator]
+        else:
+            return None
+        if self._cfg.get_index_by_label(label_on_true) == exit:
+            operator = _NEGATED[operator]
+
+        initial = self._constants.get(induction_variable.initial)
+        step = self._constants.get(induction_variable.step)
+        bound_value = self._constants[bound]
+        if not all(_is_int(value) for value in (initial, step, bound_value)):
+            return None
+        if induction_variable.step_operator == BrilOperator.SUBTRACT:
+            step = -step
+        count = count_iterations(initial, step, operator, bound_value)
+        if count is None:
+            return None
+        return TripCount(loop, induction_variable, compare, operator,
+                         bound, count, body, exit)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def count_iterations(initial, step, operator, bound):
+    """How many times "i operator bound" holds for i = initial,
+        initial + step, ... before it fails the first time. None if it
+        never fails or i would wrap around first.
+    """
+    if not opcode.fold(operator, [initial, bound]):
+        return 0
+    if operator in (BrilOperator.LESS_THAN,
+                    BrilOperator.LESS_THAN_OR_EQUAL_TO):
+        if step <= 0:
+            return None
+        distance = bound - initial
+    else:
+        if step >= 0:
+            return None
+        distance = initial - bound
+    if operator in (BrilOperator.LESS_THAN, BrilOperator.GREATER_THAN):
+        count = -(-distance // abs(step))
+    else:
+        count = distance // abs(step) + 1
+    # the value failing the test must not have wrapped
+    if not _INT_MIN <= initial + count * step <= _INT_MAX:
+        return None
+    return count
+
+
+def print_trip_counts(module, out_stream=sys.stdout):
+    """Print {header: trip count} for the loops with a constant one"""
+    for function in module.get_functions():
+        cfg = function.get_cfg()
+        loop_info = loops.compute_loops(function)
+        induction_variables = induction.InductionVariables(
+            function, cfg, loop_info)
+        trip_counts = TripCounts(function, cfg, loop_info,
+                                 induction_variables)
+        result = {}
+        for loop in loop_info.get_loops():
+            trip_count = trip_counts.get_trip_count(loop)
+            if trip_count is not None:
+                result[cfg.get_name(loop.get_header())] = trip_count.dump()
+        out_stream.write(json.dumps(result, indent=2, sort_keys=True))
+        out_stream.write("\n")
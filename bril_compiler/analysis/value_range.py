@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""Value ranges of the integer and boolean variables of a function.
+
+A range is an interval (low, high) of 64-bit integers, booleans being
+ranges over 0 and 1. The analysis is a forward problem of the dataflow
+engine whose values map symbol ids to ranges, None standing for a block
+no execution reaches. Intervals have infinite ascending chains, so the
+targets of retreating edges widen a growing bound to the end of the
+integer range, and a second, narrowing, solve then takes back what the
+loop exits allow.
+
+Branches refine their operands: on the edge taken when "i < n" holds, i
+is below the top of n. An edge whose condition cannot hold contributes
+nothing, which is how comparisons decided by the ranges make code
+unreachable. Phis take the range of their argument on each edge.
+"""
+
+import sys
+
+from bril_compiler import opcode
+from bril_compiler.analysis import dataflow
+from bril_compiler.constant import BrilOperator
+
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+FULL = (INT_MIN, INT_MAX)
+BOOL = (0, 1)
+TRUE = (1, 1)
+FALSE = (0, 0)
+
+COMPARISONS = (
+    BrilOperator.EQUAL,
+    BrilOperator.LESS_THAN,
+    BrilOperator.LESS_THAN_OR_EQUAL_TO,
+    BrilOperator.GREATER_THAN,
+    BrilOperator.GREATER_THAN_OR_EQUAL_TO,
+)
+
+
+def join(range0, range1):
+    return (min(range0[0], range1[0]), max(range0[1], range1[1]))
+
+
+def _widen(previous, value):
+    low = INT_MIN if value[0] < previous[0] else previous[0]
+    high = INT_MAX if value[1] > previous[1] else previous[1]
+    return (low, high)
+
+
+def _narrow(previous, value):
+    low = value[0] if previous[0] == INT_MIN else previous[0]
+    high = value[1] if previous[1] == INT_MAX else previous[1]
+    return (low, high)
+
+
+def _bounded(low, high):
+    """The range, or FULL if a bound wrapped around"""
+    if low < INT_MIN or high > INT_MAX:
+        return FULL
+    return (low, high)
+
+
+def _divide(dividend, divisor):
+    if dividend[0] == INT_MIN and divisor[0] <= -1 <= divisor[1]:
+        return FULL
+    divisors = []
+    if divisor[0] <= -1:
+        divisors += [divisor[0], min(divisor[1], -1)]
+    if divisor[1] >= 1:
+        divisors += [max(divisor[0], 1), divisor[1]]
+    if not divisors:
+        return FULL
+    quotients = [opcode.fold(BrilOperator.DIVIDE, [a, b])
+                 for a in dividend for b in divisors]
+    return (min(quotients), max(quotients))
+
+
+def compare(operator, range0, range1):
+    """True or False if "range0 operator range1" holds for all values of
+        the ranges or for none, None if it depends
+    """
+    if operator == BrilOperator.GREATER_THAN:
+        operator, range0, range1 = BrilOperator.LESS_THAN, range1, range0
+    elif operator == BrilOperator.GREATER_THAN_OR_EQUAL_TO:
+        operator = BrilOperator.LESS_THAN_OR_EQUAL_TO
+        range0, range1 = range1, range0
+    if operator == BrilOperator.LESS_THAN:
+        if range0[1] < range1[0]:
+            return True
+        if range0[0] >= range1[1]:
+            return False
+    elif operator == BrilOperator.LESS_THAN_OR_EQUAL_TO:
+        if range0[1] <= range1[0]:
+            return True
+        if range0[0] > range1[1]:
+            return False
+    elif operator == BrilOperator.EQUAL:
+        if range0[0] == range0[1] == range1[0] == range1[1]:
+            return True
+        if range0[1] < range1[0] or range1[1] < range0[0]:
+            return False
+    return None
+
+
+def _from_bool(result):
+    if result is None:
+        return BOOL
+    return TRUE if result else FALSE
+
+
+def evaluate(instruction, get_range):
+    """The range of the destination of instruction, get_range(name)
+        giving the ranges of the arguments
+    """
+    operator = instruction.get_opcode()
+    if operator == BrilOperator.CONST:
+        value = instruction.get_value()
+        return (int(value), int(value))
+    if operator == BrilOperator.PHI:
+        raise ValueError("phis are evaluated on the incoming edges")
+    arguments = [get_range(arg) for arg in instruction.get_arguments()]
+    if operator == BrilOperator.ID:
+        return arguments[0]
+    if operator == BrilOperator.ADD:
+        return _bounded(arguments[0][0] + arguments[1][0],
+                        arguments[0][1] + arguments[1][1])
+    if operator == BrilOperator.SUBTRACT:
+        return _bounded(arguments[0][0] - arguments[1][1],
+                        arguments[0][1] - arguments[1][0])
+    if operator == BrilOperator.MULTIPLY:
+        products = [a * b for a in arguments[0] for b in arguments[1]]
+        return _bounded(min(products), max(products))
+    if operator == BrilOperator.DIVIDE:
+        return _divide(*arguments)
+    if operator in COMPARISONS:
+        return _from_bool(compare(operator, *arguments))
+    if operator == BrilOperator.NOT:
+        return (1 - arguments[0][1], 1 - arguments[0][0])
+    if operator == BrilOperator.AND:
+        return (min(arguments[0][0], arguments[1][0]),
+                min(arguments[0][1], arguments[1][1]))
+    if operator == BrilOperator.OR:
+        return (max(arguments[0][0], arguments[1][0]),
+                max(arguments[0][1], arguments[1][1]))
+    return FULL if instruction.get_type() == "int" else BOOL
+
+
+def _is_tracked(dest_type):
+    return dest_type in ("int", "bool")
+
+
+class _ValueRangeProblem(dataflow.DataflowProblem):
+    """{symbol id: range} for the tracked variables defined on some path
+        to a point, None where no execution gets
+    """
+    def __init__(self, function, cfg, start=None):
+        self._symbol_table = function.intern_symbols()
+        self._cfg = cfg
+        # the widened solution the narrowing solve starts from
+        self._start = start
+        get_id = self._symbol_table.get_id
+        self._arguments = {
+            get_id(name): FULL if arg_type == "int" else BOOL
+            for name, arg_type in function.arguments
+            if _is_tracked(arg_type)}
+
+        order = {block: position for position, block in
+                 enumerate(cfg.get_reverse_postorder())}
+        self._headers = set(
+            block for block in order
+            if any(order.get(predecessor, -1) >= order[block]
+                   for predecessor in cfg.get_predecessors(block)))
+
+    def get_range(self, value, name):
+        symbol_id = self._symbol_table.get_id(name)
+        if symbol_id is None or symbol_id not in value:
+            return FULL
+        return value[symbol_id]
+
+    def boundary(self, block):
+        return dict(self._arguments)
+
+    def initial(self, block):
+        if self._start is None:
+            return None
+        return self._start.get_out(block)
+
+    def meet(self, block, values):
+        # the entry is also entered from the caller
+        result = None
+        if block == self._cfg.get_entry():
+            result = dict(self._arguments)
+        for predecessor, value in zip(self._cfg.get_predecessors(block),
+                                      values):
+            value = self.refine(predecessor, block, value)
+            if value is None:
+                continue
+            if result is None:
+                result = value
+                continue
+            for symbol_id, value_range in value.items():
+                if symbol_id in result:
+                    result[symbol_id] = join(result[symbol_id], value_range)
+                else:
+                    result[symbol_id] = value_range
+        return result
+
+    def widen(self, block, previous, value):
+        if block not in self._headers or previous is None or value is None:
+            return value
+        combine = _widen if self._start is None else _narrow
+        for symbol_id, value_range in value.items():
+            if symbol_id in previous:
+                value[symbol_id] = combine(previous[symbol_id], value_range)
+        return value
+
+    def refine(self, predecessor, block, value):
+        """The value at the end of predecessor as seen on its edge to
+            block: narrowed by the branch taken, with the phis of block
+            bound. None if the edge is never taken.
+        """
+        if value is None:
+            return None
+        value = dict(value)
+        get_id = self._symbol_table.get_id
+        predecessor_block = self._cfg.get_block(predecessor)
+        terminator = predecessor_block.get_terminator()
+        if (terminator is not None and
+            terminator.get_opcode() == BrilOperator.BR):
+            label_on_true, label_on_false = terminator.get_labels()
+            if label_on_true != label_on_false:
+                taken = (self._cfg.get_index_by_label(label_on_true) ==
+                         block)
+                condition = terminator.get_arguments()[0]
+                if not self._assume(value, predecessor_block, condition,
+                                    taken):
+                    return None
+
+        name = self._cfg.get_name(predecessor)
+        for instruction in self._cfg.get_block(block).get_instructions():
+            if instruction.get_opcode() != BrilOperator.PHI:
+                break
+            if not _is_tracked(instruction.get_type()):
+                continue
+            arg = instruction.get_argument_for(name)
+            if arg is None:
+                value_range = FULL if instruction.get_type() == "int" else BOOL
+            else:
+                value_range = self.get_range(value, arg)
+            value[get_id(instruction.get_destination())] = value_range
+        return value
+
+    def _assume(self, value, basic_block, condition, taken):
+        """Narrow value knowing condition is taken at the end of
+            basic_block. False if it cannot be.
+        """
+        get_id = self._symbol_table.get_id
+        outcome = TRUE if taken else FALSE
+        condition_range = self.get_range(value, condition)
+        if condition_range[0] > outcome[0] or condition_range[1] < outcome[0]:
+            return False
+        value[get_id(condition)] = outcome
+
+        # the comparison computing the condition, if its operands still
+        # hold the values it compared
+        compare_instruction = None
+        redefined = set()
+        for instruction in reversed(basic_block.get_instructions()):
+            destination = instruction.get_destination()
+            if destination == condition:
+                compare_instruction = instruction
+                break
+            if destination is not None:
+                redefined.add(destination)
+        if (compare_instruction is None or
+            compare_instruction.get_opcode() not in COMPARISONS or
+            redefined.intersection(compare_instruction.get_arguments())):
+            return True
+        operator = compare_instruction.get_opcode()
+        name0, name1 = compare_instruction.get_arguments()
+        range0 = self.get_range(value, name0)
+        range1 = self.get_range(value, name1)
+        if operator == BrilOperator.GREATER_THAN:
+            operator, range0, range1 = BrilOperator.LESS_THAN, range1, range0
+            name0, name1 = name1, name0
+        elif operator == BrilOperator.GREATER_THAN_OR_EQUAL_TO:
+            operator = BrilOperator.LESS_THAN_OR_EQUAL_TO
+            range0, range1 = range1, range0
+            name0, name1 = name1, name0
+        if not taken:
+            # not (a < b) is b <= a, not (a <= b) is b < a
+            if operator == BrilOperator.LESS_THAN:
+                operator = BrilOperator.LESS_THAN_OR_EQUAL_TO
+            elif operator == BrilOperator.LESS_THAN_OR_EQUAL_TO:
+                operator = BrilOperator.LESS_THAN
+            if operator != BrilOperator.EQUAL:
+                range0, range1 = range1, range0
+                name0, name1 = name1, name0
+
+        if operator == BrilOperator.EQUAL and taken:
+            range0 = range1 = (max(range0[0], range1[0]),
+                               min(range0[1], range1[1]))
+        elif operator == BrilOperator.EQUAL:
+            range0, range1 = (_exclude(range0, range1),
+                              _exclude(range1, range0))
+        else:
+            gap = 1 if operator == BrilOperator.LESS_THAN else 0
+            range0, range1 = ((range0[0], min(range0[1], range1[1] - gap)),
+                              (max(range1[0], range0[0] + gap), range1[1]))
+        if range0[0] > range0[1] or range1[0] > range1[1]:
+            return False
+        value[get_id(name0)] = range0
+        value[get_id(name1)] = range1
+        return True
+
+    def transfer(self, block, value):
+        if value is None:
+            return None
+        value = dict(value)
+        for instruction in self._cfg.get_block(block).get_instructions():
+            self.step(value, instruction)
+        return value
+
+    def step(self, value, instruction):
+        """Update value in place past instruction"""
+        destination = instruction.get_destination()
+        if (destination is None or
+            instruction.get_opcode() == BrilOperator.PHI or
+            not _is_tracked(instruction.get_type())):
+            return
+        value[self._symbol_table.get_id(destination)] = evaluate(
+            instruction, lambda name: self.get_range(value, name))
+
+    def format_value(self, value):
+        if value is None:
+            return "unreachable"
+        if not value:
+            return "∅"
+        items = sorted(
+            (self._symbol_table.get_name(symbol_id), value_range)
+            for symbol_id, value_range in value.items())
+        return ", ".join(f"{name}: {_format_range(value_range)}"
+                         for name, value_range in items)
+
+
+def _exclude(range0, range1):
+    """range0 without the single value of range1, if it is a bound"""
+    if range1[0] != range1[1]:
+        return range0
+    if range0[0] == range1[0]:
+        return (range0[0] + 1, range0[1])
+    if range0[1] == range1[0]:
+        return (range0[0], range0[1] - 1)
+    return range0
+
+
+def _format_range(value_range):
+    low = "-inf" if value_range[0] == INT_MIN else str(value_range[0])
+    high = "+inf" if value_range[1] == INT_MAX else str(value_range[1])
+    return f"[{low}, {high}]"
+
+
+class ValueRanges:
+    """The ranges of the variables at the start and at the end of every
+        block of a function
+    """
+    def __init__(self, function, cfg):
+        self._cfg = cfg
+        widened = dataflow.solve(_ValueRangeProblem(function, cfg), cfg)
+        self._problem = _ValueRangeProblem(function, cfg, start=widened)
+        self._result = dataflow.solve(self._problem, cfg)
+
+    def get_in(self, block):
+        """{symbol id: range}, None if block is never reached"""
+        return self._result.get_in(block)
+
+    def get_out(self, block):
+        return self._result.get_out(block)
+
+    def get_range(self, value, name):
+        """The range of name in a value of get_in or get_out"""
+        return self._problem.get_range(value, name)
+
+    def walk(self, block):
+        """(instruction, get_range) for the instructions of a reached
+            block, get_range(name) giving the ranges right before the
+            instruction
+        """
+        value = self.get_in(block)
+        if value is None:
+            return
+        value = dict(value)
+        for instruction in self._cfg.get_block(block).get_instructions():
+            yield instruction, lambda name: self.get_range(value, name)
+            self._problem.step(value, instruction)
+
+    def is_edge_taken(self, predecessor, block):
+        """Whether the ranges allow the edge to be taken"""
+        return self._problem.refine(
+            predecessor, block, self.get_out(predecessor)) is not None
+
+    def format_value(self, value):
+        return self._problem.format_value(value)
+
+
+def print_value_ranges(module, out_stream=sys.stdout):
+    for function in module.get_functions():
+        cfg = function.get_cfg()
+        value_ranges = ValueRanges(function, cfg)
+        for block in range(cfg.get_number_of_blocks()):
+            block_in = value_ranges.format_value(value_ranges.get_in(block))
+            block_out = value_ranges.format_value(
+                value_ranges.get_out(block))
+            out_stream.write(f"{cfg.get_name(block)}:\n")
+            out_stream.write(f"  in:  {block_in}\n")
+            out_stream.write(f"  out: {block_out}\n")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Memory benchmark of the instruction representation.
+
+Builds the same synthetic instruction stream twice: once with the slotted
+classes of bril_compiler.ir and once with mirrors of the classes as they
+were before slotting, which keep their attributes in a per-instance
+__dict__. The bytes per instruction of both layouts are measured with
+tracemalloc.
+"""
+
+import argparse
+import tracemalloc
+
+from bril_compiler import ir
+
+
+INSTRUCTION_MIX = [
+    (ir.ConstInstruction, lambda i: (i, f"c{i}", "int")),
+    (ir.AddInstruction, lambda i: (f"c{i}", f"v{i}", f"s{i}", "int")),
+    (ir.MultiplyInstruction, lambda i: (f"s{i}", f"c{i}", f"m{i}", "int")),
+    (ir.LessThanInstruction, lambda i: (f"m{i}", f"s{i}", f"b{i}", "bool")),
+    (ir.IdInstruction, lambda i: (f"m{i}", f"v{i}", "int")),
+    (ir.PrintInstruction, lambda i: ([f"v{i}"],)),
+    (ir.JumpInstruction, lambda i: (f"l{i}",)),
+    (ir.LabelInstruction, lambda i: (f"l{i}",)),
+]
+
+
+class DictUnaryInstruction(object):
+    """The unslotted layouts only store the operands: the methods live on
+        the class and do not change the size of an instance. They do not
+        derive from the ir classes, whose __slots__ would be inherited.
+    """
+    def __init__(self, operand, destination=None, dest_type=None):
+        self._destination = destination
+        self._operand = operand
+        self._dest_type = dest_type
+
+
+class DictBinaryInstruction(object):
+    def __init__(self, operand0, operand1,
+                 destination=None, dest_type=None):
+        self._destination = destination
+        self._operand0 = operand0
+        self._operand1 = operand1
+        self._dest_type = dest_type
+
+
+class DictPrintInstruction(object):
+    def __init__(self, arguments, destination=None, dest_type=None):
+        self._destination = None
+        self._arguments = tuple(arguments)
+        self._dest_type = None
+
+
+class DictJumpInstruction(object):
+    def __init__(self, label):
+        self._label = label
+
+
+class DictLabelInstruction(object):
+    def __init__(self, name):
+        self._name = name
+
+
+DICT_CLASSES = {
+    ir.ConstInstruction: DictUnaryInstruction,
+    ir.AddInstruction: DictBinaryInstruction,
+    ir.MultiplyInstruction: DictBinaryInstruction,
+    ir.LessThanInstruction: DictBinaryInstruction,
+    ir.IdInstruction: DictUnaryInstruction,
+    ir.PrintInstruction: DictPrintInstruction,
+    ir.JumpInstruction: DictJumpInstruction,
+    ir.LabelInstruction: DictLabelInstruction,
+}
+
+
+def prepare_operands(num_instructions):
+    """Operand tuples are built up front so their strings are not counted"""
+    operands = []
+    for i in range(num_instructions):
+        _, make_operands = INSTRUCTION_MIX[i % len(INSTRUCTION_MIX)]
+        operands.append(make_operands(i // len(INSTRUCTION_MIX)))
+    return operands
+
+
+def measure(classes, operands):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    instructions = [
+        classes[i % len(classes)](*operand)
+        for i, operand in enumerate(operands)
+    ]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the list holding the instructions is shared overhead for both layouts
+    list_bytes = instructions.__sizeof__()
+    return (after - before - list_bytes) / len(instructions)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("-n", "--num-instructions", type=int,
+                           default=200000)
+    args = argparser.parse_args()
+
+    operands = prepare_operands(args.num_instructions)
+    slotted_classes = [cls for cls, _ in INSTRUCTION_MIX]
+    dict_classes = [DICT_CLASSES[cls] for cls in slotted_classes]
+
+    dict_bytes = measure(dict_classes, operands)
+    slotted_bytes = measure(slotted_classes, operands)
+    print(f"instructions:           {args.num_instructions}")
+    print(f"__dict__ layout:        {dict_bytes:8.1f} bytes/instruction")
+    print(f"__slots__ layout:       {slotted_bytes:8.1f} bytes/instruction")
+    print(f"reduction:              {dict_bytes / slotted_bytes:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
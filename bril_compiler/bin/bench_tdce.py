@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Running time of trivial dead code elimination on deep dead chains.
+
+Every generated function holds a chain v0 -> v1 -> ... -> vN in which
+each variable is only read by the next one and the last one is never
+read. The sweeping TrivilDeadCodeEliminationOldPass removes one link per
+round over the module, the worklist TrivilDeadCodeEliminationPass removes
+the whole chain in one pass. Both results are checked to be identical.
+"""
+
+import argparse
+import json
+import time
+
+from bril_compiler import ir
+from bril_compiler import program
+from bril_compiler.optimization.redundancy import tdce
+
+
+def build_module(chain_length, num_chains):
+    """num_chains interleaved dead chains next to a printed value"""
+    function = program.Function("main")
+    basic_block = program.BasicBlock()
+    basic_block.add_instruction(ir.ConstInstruction(1, "one", "int"))
+    for chain in range(num_chains):
+        basic_block.add_instruction(
+            ir.ConstInstruction(chain, f"c{chain}.0", "int"))
+    for link in range(1, chain_length + 1):
+        for chain in range(num_chains):
+            basic_block.add_instruction(ir.AddInstruction(
+                f"c{chain}.{link - 1}", "one", f"c{chain}.{link}", "int"))
+    basic_block.add_instruction(ir.PrintInstruction(["one"]))
+    function.add_basic_block(basic_block)
+    module = program.Module()
+    module.add_function(function)
+    return module
+
+
+def measure(pass_class, chain_length, num_chains):
+    module = build_module(chain_length, num_chains)
+    start = time.perf_counter()
+    pass_class().optimize(module)
+    elapsed = time.perf_counter() - start
+    return elapsed, json.dumps(module.dump_json())
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("-n", "--chain-lengths", type=int, nargs="+",
+                           default=[250, 500, 1000, 2000])
+    argparser.add_argument("-c", "--num-chains", type=int, default=2)
+    args = argparser.parse_args()
+
+    print(f"{'chain':>8} {'sweeping (s)':>14} {'worklist (s)':>14} "
+          f"{'speedup':>9}")
+    for chain_length in args.chain_lengths:
+        old_time, old_result = measure(
+            tdce.TrivilDeadCodeEliminationOldPass, chain_length,
+            args.num_chains)
+        new_time, new_result = measure(
+            tdce.TrivilDeadCodeEliminationPass, chain_length,
+            args.num_chains)
+        if old_result != new_result:
+            print(f"[ERROR] results differ for chain length {chain_length}")
+            quit()
+        print(f"{chain_length:>8} {old_time:>14.4f} {new_time:>14.4f} "
+              f"{old_time / new_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
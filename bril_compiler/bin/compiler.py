@@ -11,61 +11,189 @@ from bril_compiler.optimization import compiler_pass
 
 pass_map = {
     "tdce": "bril_compiler.optimization.redundancy.tdce.TrivilDeadCodeEliminationPass",
+    "dce": "bril_compiler.optimization.redundancy.dce.DeadCodeEliminationPass",
+    "adce": "bril_compiler.optimization.redundancy.adce.AggressiveDeadCodeEliminationCompositePass",
+    "adce-only": "bril_compiler.optimization.redundancy.adce.AggressiveDeadCodeEliminationPass",
     "lvn": "bril_compiler.optimization.redundancy.lvn.LocalValueNumberingCompositePass",
     "lvn-only": "bril_compiler.optimization.redundancy.lvn.LocalValueNumberingPass",
+    "lvn-ebb": "bril_compiler.optimization.redundancy.lvn.ExtendedValueNumberingCompositePass",
     "lvn-constant-folding": "bril_compiler.optimization.redundancy.lvn.NumberingConstantPropagationCompositePass",
     "lvn-constant-propagation": "bril_compiler.optimization.redundancy.lvn.NumberingConstantPropagationPass",
+    "simplifycfg": "bril_compiler.optimization.control_flow.simplify.ControlFlowSimplificationPass",
+    "to_ssa": "bril_compiler.optimization.ssa.construction.SSAConstructionPass",
+    "from_ssa": "bril_compiler.optimization.ssa.destruction.SSADestructionPass",
+    "gvn": "bril_compiler.optimization.redundancy.gvn.GlobalValueNumberingCompositePass",
+    "gvn-only": "bril_compiler.optimization.redundancy.gvn.GlobalValueNumberingPass",
+    "pre": "bril_compiler.optimization.redundancy.pre.PartialRedundancyEliminationCompositePass",
+    "pre-only": "bril_compiler.optimization.redundancy.pre.PartialRedundancyEliminationPass",
+    "sccp": "bril_compiler.optimization.constant.sccp.SparseConditionalConstantPropagationCompositePass",
+    "sccp-only": "bril_compiler.optimization.constant.sccp.SparseConditionalConstantPropagationPass",
+    "vrp": "bril_compiler.optimization.constant.vrp.ValueRangePropagationCompositePass",
+    "vrp-only": "bril_compiler.optimization.constant.vrp.ValueRangePropagationPass",
+    "licm": "bril_compiler.optimization.loop.licm.LoopInvariantCodeMotionCompositePass",
+    "licm-only": "bril_compiler.optimization.loop.licm.LoopInvariantCodeMotionPass",
+    "strength": "bril_compiler.optimization.loop.strength.StrengthReductionCompositePass",
+    "strength-only": "bril_compiler.optimization.loop.strength.StrengthReductionPass",
+    "unroll": "bril_compiler.optimization.loop.unroll.LoopUnrollingCompositePass",
+    "unroll-only": "bril_compiler.optimization.loop.unroll.LoopUnrollingPass",
+    "inline": "bril_compiler.optimization.interprocedural.inline.FunctionInliningCompositePass",
+    "inline-only": "bril_compiler.optimization.interprocedural.inline.FunctionInliningPass",
 }
 
-def dynamic_import(pass_name):
-    pass_module = pass_map[pass_name]
+analysis_map = {
+    "dom": "bril_compiler.analysis.dominance.print_dominators",
+    "front": "bril_compiler.analysis.dominance.print_dominance_frontiers",
+    "tree": "bril_compiler.analysis.dominance.print_dominator_tree",
+    "loops": "bril_compiler.analysis.loops.print_loops",
+    "induction": "bril_compiler.analysis.induction.print_induction_variables",
+    "trip-count": "bril_compiler.analysis.trip_count.print_trip_counts",
+    "is-ssa": "bril_compiler.analysis.ssa.print_is_ssa",
+    "defined": "bril_compiler.analysis.dataflow.print_defined",
+    "live": "bril_compiler.analysis.dataflow.print_live",
+    "cprop": "bril_compiler.analysis.dataflow.print_cprop",
+    "range": "bril_compiler.analysis.value_range.print_value_ranges",
+    "call-graph": "bril_compiler.analysis.call_graph.print_call_graph",
+}
+
+def dynamic_import(pass_name, name_map=pass_map):
+    pass_module = name_map[pass_name]
     module_name, class_name = pass_module.rsplit(".", 1)
     module = __import__(module_name, fromlist=[class_name])
     return getattr(module, class_name)
 
-def opt(module, bril_passes_name):
-    """the optimizer routine"""
+def build_pass_manager(bril_passes_name, pass_options=None):
+    """pass_options maps a pass name to the keyword arguments its class
+        is built with
+    """
+    pass_options = {} if pass_options is None else pass_options
     pass_manager = compiler_pass.BrilPassManager()
     for pass_name in bril_passes_name:
         if pass_name not in pass_map:
-            print(f"[ERROR] Do not have pass named {bril_pass}")
+            print(f"[ERROR] Do not have pass named {pass_name}")
             quit()
         BrilPassClass = dynamic_import(pass_name)
-        bril_pass = BrilPassClass()
+        bril_pass = BrilPassClass(**pass_options.get(pass_name, {}))
         pass_manager.add_pass(bril_pass)
+    return pass_manager
 
+def opt(module, bril_passes_name, statistics=False, pass_options=None):
+    """the optimizer routine"""
+    pass_manager = build_pass_manager(bril_passes_name, pass_options)
     pass_manager.optimize(module)
     data = module.dump_json()
     json.dump(data, sys.stdout)
+    if statistics:
+        print_statistics(pass_manager)
+
+def opt_stream(in_stream, out_stream, bril_passes_name, statistics=False,
+               pass_options=None):
+    """the streaming optimizer routine: every function is parsed,
+        optimized and written out before the next one is read.
+    """
+    pass_manager = build_pass_manager(bril_passes_name, pass_options)
+    bril_parser = parser.JSonToBrilParser()
+    out_stream.write('{"functions": [')
+    for i, function in enumerate(bril_parser.iterate_functions(in_stream)):
+        module = program.Module()
+        module.add_function(function)
+        pass_manager.optimize(module)
+        if i > 0:
+            out_stream.write(", ")
+        json.dump(function.dump_json(), out_stream)
+        out_stream.flush()
+    out_stream.write("]}\n")
+    out_stream.flush()
+    if statistics:
+        print_statistics(pass_manager)
 
 def list_all_passes():
     print("Pass lists:")
     for pass_name in pass_map.keys():
         print(f"\t{pass_name}")
+    print("Analysis lists:")
+    for analysis_name in analysis_map.keys():
+        print(f"\t{analysis_name}")
     print("===end of list====")
     quit()
 
+def print_statistics(bril_pass, out_stream=sys.stderr):
+    """print the num_* counters of every pass run"""
+    for sub_pass in getattr(bril_pass, "_passes", ()):
+        print_statistics(sub_pass, out_stream)
+    for name, value in vars(bril_pass).items():
+        if name.startswith("num_") and isinstance(value, int):
+            out_stream.write(
+                f"{type(bril_pass).__name__}.{name}: {value}\n")
+
+def analyze(module, analysis_name):
+    """print the result of an analysis instead of optimizing"""
+    if analysis_name not in analysis_map:
+        print(f"[ERROR] Do not have analysis named {analysis_name}")
+        quit()
+    print_analysis = dynamic_import(analysis_name, analysis_map)
+    print_analysis(module)
+
 def main():
     argparser = argparse.ArgumentParser()
     argparser.add_argument("-l", "--list", action="store_true")
-    argparser.add_argument("-c", "--source", type=str)
+    argparser.add_argument("-c", "--source", type=str,
+                           help="Bril source; reads JSON from stdin if "
+                                "omitted or '-'")
     argparser.add_argument("-p", "--passes", nargs="+")
+    argparser.add_argument("-a", "--analysis", type=str,
+                           help="print an analysis after running the "
+                                "passes instead of the program")
+    argparser.add_argument("-s", "--statistics", action="store_true",
+                           help="print the counters of the passes to "
+                                "stderr")
+    argparser.add_argument("--unroll-factor", type=int,
+                           help="copies of the body in a partially "
+                                "unrolled loop")
+    argparser.add_argument("--unroll-full-size", type=int,
+                           help="largest fully unrolled loop, in "
+                                "instructions")
+    argparser.add_argument("--unroll-size-budget", type=int,
+                           help="instructions unrolling may add to a "
+                                "function")
     args = argparser.parse_args()
 
     # -l has the first priority: just print out list of passes
     if args.list:
         list_all_passes()
 
-    # check if the source script exists
-    if not os.path.exists(args.source):
-        print("[Error] cannot find source {args.source}")
-        quit()
+    passes = [] if args.passes is None else args.passes
+    unroll_options = {
+        name: value for name, value in (
+            ("factor", args.unroll_factor),
+            ("full_unroll_size", args.unroll_full_size),
+            ("size_budget", args.unroll_size_budget),
+        ) if value is not None
+    }
+    pass_options = {"unroll": unroll_options, "unroll-only": unroll_options}
 
-    # parse the file and represent it as a Module
     bril_parser = parser.JSonToBrilParser()
-    module = bril_parser.parse(args.source)
-    passes = [] if args.passes is None else args.passes
-    opt(module, passes)
+    if args.source is None or args.source == "-":
+        # no source (or "-"): stream Bril JSON from stdin to stdout
+        if args.analysis is None:
+            opt_stream(sys.stdin, sys.stdout, passes, args.statistics,
+                       pass_options)
+            return
+        # an analysis looks at the whole module, so it is not streamed
+        module = bril_parser.parse_json(json.load(sys.stdin))
+    else:
+        # check if the source script exists
+        if not os.path.exists(args.source):
+            print("[Error] cannot find source {args.source}")
+            quit()
+
+        # parse the file and represent it as a Module
+        module = bril_parser.parse(args.source)
+    if args.analysis is not None:
+        pass_manager = build_pass_manager(passes, pass_options)
+        pass_manager.optimize(module)
+        analyze(module, args.analysis)
+        return
+    opt(module, passes, args.statistics, pass_options)
 
 
 if __name__ == "__main__":
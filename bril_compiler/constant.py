@@ -5,8 +5,10 @@ import enum
 BrilType = enum.Enum('BrilType', [
                      'INT', 'FLOAT'])
 
-BrilOperator = enum.Enum('BrilOperator', [
-                         'CONST', 'ID', 'PRINT', 'JMP',
-                         'ADD', 'SUBTRACT', 'MUTIPLY', 'DIVIDE'])
-
-
+# integer opcodes; per-opcode metadata lives in bril_compiler.opcode
+BrilOperator = enum.IntEnum('BrilOperator', [
+                            'CONST', 'ID', 'PRINT', 'JMP', 'BR',
+                            'ADD', 'SUBTRACT', 'MULTIPLY', 'DIVIDE',
+                            'EQUAL', 'LESS_THAN', 'LESS_THAN_OR_EQUAL_TO',
+                            'GREATER_THAN', 'GREATER_THAN_OR_EQUAL_TO',
+                            'NOT', 'AND', 'OR', 'PHI', 'CALL', 'RET'])
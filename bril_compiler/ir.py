@@ -1,14 +1,34 @@
 #!/usr/bin/env python3
 
+from bril_compiler import opcode
+from bril_compiler.constant import BrilOperator
+
 class Instruction(object):
+    """Instructions are slotted: a function may hold millions of them, so
+        no per-instance __dict__ is allocated. get_arguments() returns a
+        tuple of the operand names.
+        Every concrete instruction class sets OPCODE; operator properties
+        are looked up in the opcode registry.
+    """
+    __slots__ = ()
+    OPCODE = None
+
     def __init__(self):
         raise NotImplementedError
 
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        """Build the instruction from the IRBuilder operand convention"""
+        raise NotImplementedError
+
     def get_type(self):
         raise NotImplementedError
 
+    def get_opcode(self):
+        return self.OPCODE
+
     def get_operator_string(self):
-        raise NotImplementedError
+        return opcode.get_name(self.OPCODE)
 
     def get_destination(self):
         raise NotImplementedError
@@ -19,19 +39,40 @@ class Instruction(object):
     def get_arguments(self):
         raise NotImplementedError
 
+    def set_arguments(self, arguments):
+        """Replace the operand names, in the order of get_arguments()"""
+        raise NotImplementedError
+
     def is_label(self):
         return False
 
     def is_terminator(self):
         return False
 
+    def get_labels(self):
+        """Labels this instruction may transfer control to"""
+        return ()
+
+    def set_labels(self, labels):
+        raise NotImplementedError
+
+    def get_functions(self):
+        """Functions this instruction calls"""
+        return ()
+
 
 class UnaryInstruction(Instruction):
+    __slots__ = ("_destination", "_operand", "_dest_type")
+
     def __init__(self, operand, destination=None, dest_type=None):
         self._destination = destination
         self._operand = operand
         self._dest_type = dest_type
 
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        return cls(uses[0], destination, dest_type)
+
     def get_destination(self):
         return self._destination
 
@@ -39,7 +80,10 @@ class UnaryInstruction(Instruction):
         self._destination = name
 
     def get_arguments(self):
-        return [self._operand]
+        return (self._operand,)
+
+    def set_arguments(self, arguments):
+        self._operand, = arguments
 
     def get_type(self):
         return self._dest_type
@@ -55,6 +99,8 @@ class UnaryInstruction(Instruction):
 
 
 class BinaryInstruction(Instruction):
+    __slots__ = ("_destination", "_operand0", "_operand1", "_dest_type")
+
     def __init__(self, operand0, operand1,
                  destination=None, dest_type=None):
         self._destination = destination
@@ -62,6 +108,10 @@ class BinaryInstruction(Instruction):
         self._operand1 = operand1
         self._dest_type = dest_type
 
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        return cls(uses[0], uses[1], destination, dest_type)
+
     def get_destination(self):
         return self._destination
 
@@ -69,7 +119,10 @@ class BinaryInstruction(Instruction):
         self._destination = name
 
     def get_arguments(self):
-        return [self._operand0, self._operand1]
+        return (self._operand0, self._operand1)
+
+    def set_arguments(self, arguments):
+        self._operand0, self._operand1 = arguments
 
     def get_type(self):
         return self._dest_type
@@ -84,12 +137,52 @@ class BinaryInstruction(Instruction):
         return data
 
 
-class ConstInstruction(UnaryInstruction):
+class VariadicInstruction(Instruction):
+    __slots__ = ("_destination", "_arguments", "_dest_type")
+
+    def __init__(self, arguments, destination=None, dest_type=None):
+        self._destination = destination
+        self._arguments = tuple(arguments)
+        self._dest_type = dest_type
+
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        return cls(uses, destination, dest_type)
+
+    def get_destination(self):
+        return self._destination
+
+    def set_destination(self, name):
+        self._destination = name
+
+    def get_arguments(self):
+        return self._arguments
+
+    def set_arguments(self, arguments):
+        self._arguments = tuple(arguments)
+
+    def get_type(self):
+        return self._dest_type
+
     def get_value(self):
-        return self._value
+        return None
 
-    def get_operator_string(self):
-        return "const"
+    def dump_json(self):
+        data = {}
+        if self._destination is not None:
+            data["dest"] = self._destination
+            data["type"] = self._dest_type
+        data["args"] = list(self._arguments)
+        data["op"] = self.get_operator_string()
+        return data
+
+
+class ConstInstruction(UnaryInstruction):
+    __slots__ = ()
+    OPCODE = BrilOperator.CONST
+
+    def get_value(self):
+        return self._operand
 
     def dump_json(self):
         """
@@ -105,36 +198,75 @@ class ConstInstruction(UnaryInstruction):
 
 
 class IdInstruction(UnaryInstruction):
+    __slots__ = ()
+    OPCODE = BrilOperator.ID
+
     def get_value(self):
-        return self._reference
+        return self._operand
 
-    def get_operator_string(self):
-        return "id"
 
+class PrintInstruction(VariadicInstruction):
+    __slots__ = ()
+    OPCODE = BrilOperator.PRINT
 
-class PrintInstruction(UnaryInstruction):
-    def __init__(self, operand, destination=None, dest_type=None):
-        """Print instruction is similar to other unary operator yet
-            does not have destination
-        """
-        self._operand = operand
-        self._destination = None
-        self._dest_type = None
+    def __init__(self, arguments, destination=None, dest_type=None):
+        """Print takes any number of arguments and has no destination"""
+        super().__init__(arguments)
 
-    def get_value(self):
-        return None
 
-    def get_operator_string(self):
-        return "print"
+class CallInstruction(VariadicInstruction):
+    """dest = call @function arguments; the destination is None when the
+        result is not used. The uses follow the IRBuilder convention: the
+        arguments followed by the function.
+    """
+    __slots__ = ("_function",)
+    OPCODE = BrilOperator.CALL
+
+    def __init__(self, function, arguments, destination=None,
+                 dest_type=None):
+        super().__init__(arguments, destination, dest_type)
+        self._function = function
+
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        return cls(uses[-1], uses[:-1], destination, dest_type)
+
+    def get_functions(self):
+        return (self._function,)
+
+    def set_functions(self, functions):
+        self._function, = functions
+
+    def dump_json(self):
+        data = super().dump_json()
+        data["funcs"] = [self._function]
+        return data
+
+
+class ReturnInstruction(VariadicInstruction):
+    """ret with the returned value as its only argument, or none"""
+    __slots__ = ()
+    OPCODE = BrilOperator.RET
+
+    def __init__(self, arguments=(), destination=None, dest_type=None):
+        super().__init__(arguments)
+
+    def is_terminator(self):
+        return True
 
 
 class LabelInstruction(Instruction):
+    __slots__ = ("_name",)
+
     def __init__(self, name):
         self._name = name
 
     def is_label(self):
         return True
 
+    def get_name(self):
+        return self._name
+
     def get_type(self):
         return None
 
@@ -152,20 +284,27 @@ class LabelInstruction(Instruction):
 
 
 class JumpInstruction(Instruction):
+    __slots__ = ("_label",)
+    OPCODE = BrilOperator.JMP
+
     def __init__(self, label):
         self._label = label
 
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        return cls(uses[0])
+
     def get_value(self):
         return None
 
     def get_destination(self):
         return None
 
-    def get_operator_string(self):
-        return "jmp"
-
     def get_arguments(self):
-        return []
+        return ()
+
+    def set_arguments(self, arguments):
+        pass
 
     def get_type(self):
         return None
@@ -173,6 +312,12 @@ class JumpInstruction(Instruction):
     def is_terminator(self):
         return True
 
+    def get_labels(self):
+        return (self._label,)
+
+    def set_labels(self, labels):
+        self._label, = labels
+
     def dump_json(self):
         data = {}
         data["op"] = self.get_operator_string()
@@ -181,29 +326,42 @@ class JumpInstruction(Instruction):
 
 
 class BranchInstruction(Instruction):
+    __slots__ = ("_condition", "_label_on_true", "_label_on_false")
+    OPCODE = BrilOperator.BR
+
     def __init__(self, condition, label_on_true, label_on_false):
         self._condition = condition
         self._label_on_true = label_on_true
         self._label_on_false = label_on_false
 
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        return cls(uses[0], uses[1], uses[2])
+
     def get_value(self):
         return None
 
-    def get_operator_string(self):
-        return "br"
-
     def get_destination(self):
         return None
 
     def get_arguments(self):
-        return [self._condition]
+        return (self._condition,)
+
+    def set_arguments(self, arguments):
+        self._condition, = arguments
 
     def get_type(self):
         return None
 
-    def is_termiator(self):
+    def is_terminator(self):
         return True
 
+    def get_labels(self):
+        return (self._label_on_true, self._label_on_false)
+
+    def set_labels(self, labels):
+        self._label_on_true, self._label_on_false = labels
+
     def dump_json(self):
         data = {}
         data["op"] = self.get_operator_string()
@@ -214,60 +372,155 @@ class BranchInstruction(Instruction):
 
 
 class AddInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "add"
+    __slots__ = ()
+    OPCODE = BrilOperator.ADD
 
 
 class SubtractInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "sub"
+    __slots__ = ()
+    OPCODE = BrilOperator.SUBTRACT
 
 
 class MultiplyInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "mul"
+    __slots__ = ()
+    OPCODE = BrilOperator.MULTIPLY
 
 
 class DivideInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "div"
+    __slots__ = ()
+    OPCODE = BrilOperator.DIVIDE
 
 
 class EqualInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "eq"
+    __slots__ = ()
+    OPCODE = BrilOperator.EQUAL
 
 
 class LessThanInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "lt"
+    __slots__ = ()
+    OPCODE = BrilOperator.LESS_THAN
 
 
 class LessThanOrEqualToInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "le"
+    __slots__ = ()
+    OPCODE = BrilOperator.LESS_THAN_OR_EQUAL_TO
 
 
 class GreaterThanInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "gt"
+    __slots__ = ()
+    OPCODE = BrilOperator.GREATER_THAN
 
 
 class GreaterThanOrEqualToInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "ge"
+    __slots__ = ()
+    OPCODE = BrilOperator.GREATER_THAN_OR_EQUAL_TO
 
 
 class NotInstruction(UnaryInstruction):
-    def get_operator_string(self):
-        return "not"
+    __slots__ = ()
+    OPCODE = BrilOperator.NOT
 
 
 class AndInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "and"
+    __slots__ = ()
+    OPCODE = BrilOperator.AND
 
 
 class OrInstruction(BinaryInstruction):
-    def get_operator_string(self):
-        return "or"
+    __slots__ = ()
+    OPCODE = BrilOperator.OR
+
+
+class PhiInstruction(Instruction):
+    """dest = phi of the incoming values, one argument per predecessor
+        label. The uses follow the IRBuilder convention: all arguments
+        followed by their labels in the same order.
+    """
+    __slots__ = ("_destination", "_arguments", "_labels", "_dest_type")
+    OPCODE = BrilOperator.PHI
+
+    def __init__(self, arguments, labels, destination=None, dest_type=None):
+        self._destination = destination
+        self._arguments = list(arguments)
+        self._labels = list(labels)
+        self._dest_type = dest_type
+
+    @classmethod
+    def from_uses(cls, uses, destination=None, dest_type=None):
+        half = len(uses) // 2
+        return cls(uses[:half], uses[half:], destination, dest_type)
+
+    def get_destination(self):
+        return self._destination
+
+    def set_destination(self, name):
+        self._destination = name
+
+    def get_arguments(self):
+        return tuple(self._arguments)
+
+    def set_arguments(self, arguments):
+        self._arguments = list(arguments)
+
+    def get_type(self):
+        return self._dest_type
+
+    def get_value(self):
+        return None
+
+    def get_incoming_labels(self):
+        return tuple(self._labels)
+
+    def get_incoming(self):
+        """(label, argument) pairs"""
+        return list(zip(self._labels, self._arguments))
+
+    def get_argument_for(self, label):
+        if label not in self._labels:
+            return None
+        return self._arguments[self._labels.index(label)]
+
+    def set_incoming(self, label, argument):
+        if label in self._labels:
+            self._arguments[self._labels.index(label)] = argument
+            return
+        self._labels.append(label)
+        self._arguments.append(argument)
+
+    def remove_incoming(self, label):
+        if label not in self._labels:
+            return
+        index = self._labels.index(label)
+        del self._labels[index]
+        del self._arguments[index]
+
+    def dump_json(self):
+        data = {}
+        data["dest"] = self._destination
+        data["type"] = self._dest_type
+        data["args"] = list(self._arguments)
+        data["labels"] = list(self._labels)
+        data["op"] = self.get_operator_string()
+        return data
+
+
+INSTRUCTION_CLASSES = [
+    ConstInstruction, IdInstruction, PrintInstruction,
+    JumpInstruction, BranchInstruction,
+    AddInstruction, SubtractInstruction, MultiplyInstruction,
+    DivideInstruction, EqualInstruction, LessThanInstruction,
+    LessThanOrEqualToInstruction, GreaterThanInstruction,
+    GreaterThanOrEqualToInstruction, NotInstruction,
+    AndInstruction, OrInstruction, PhiInstruction,
+    CallInstruction, ReturnInstruction,
+]
+
+# OPCODE_TO_CLASS[opcode] -> instruction class, indexed like
+# opcode.OPCODE_TABLE
+OPCODE_TO_CLASS = [None] * len(opcode.OPCODE_TABLE)
+for _instruction_class in INSTRUCTION_CLASSES:
+    OPCODE_TO_CLASS[_instruction_class.OPCODE] = _instruction_class
+
+
+def get_instruction_class(op):
+    return OPCODE_TO_CLASS[op]
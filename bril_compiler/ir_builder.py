@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 from bril_compiler import ir
+from bril_compiler import opcode
 
 class IRBuilder:
     """An utility builder provides ways to build instructions.
@@ -8,25 +9,6 @@ class IRBuilder:
     """
     def __init__(self):
         self.num_built = 0
-        self.BINARY_CONSTRUCTOR_MAP = {
-            "add": ir.AddInstruction,
-            "sub": ir.SubtractInstruction,
-            "mul": ir.MultiplyInstruction,
-            "div": ir.DivideInstruction,
-            "eq": ir.EqualInstruction,
-            "lt": ir.LessThanInstruction,
-            "le": ir.LessThanOrEqualToInstruction,
-            "gt": ir.GreaterThanInstruction,
-            "ge": ir.GreaterThanOrEqualToInstruction,
-            "and": ir.AndInstruction,
-            "or": ir.OrInstruction
-        }
-        self.UNARY_OPERATOR_CONSTRUCTOR_MAP = {
-            "id": ir.IdInstruction,
-            "print": ir.PrintInstruction,
-            "const": ir.ConstInstruction,
-            "not": ir.NotInstruction,
-        }
 
     def build_by_name(self, operator, destination=None, uses=[],
                       dest_type=None):
@@ -34,24 +16,18 @@ class IRBuilder:
             print("[Error] cannot create Label instruction by builder")
             quit()
 
-        if operator == "jmp":
-            return ir.JumpInstruction(uses[0])
-        elif operator == "br":
-            return ir.BranchInstruction(
-                uses[0], uses[1], uses[2])
-        elif operator in self.UNARY_OPERATOR_CONSTRUCTOR_MAP:
-            return self.UNARY_OPERATOR_CONSTRUCTOR_MAP[operator](
-                uses[0],
-                destination,
-                dest_type
-            )
-        elif operator in self.BINARY_CONSTRUCTOR_MAP:
-            return self.BINARY_CONSTRUCTOR_MAP[operator](
-                uses[0],
-                uses[1],
-                destination,
-                dest_type
-            )
-        else:
+        operator_code = opcode.get_opcode(operator)
+        if operator_code is None:
             print(f"IRBuilder.build_by_name: Cannot handle {operator}")
             quit()
+        return self.build_by_opcode(operator_code, destination, uses,
+                                    dest_type)
+
+    def build_by_opcode(self, operator, destination=None, uses=[],
+                        dest_type=None):
+        """uses holds the variables followed by the labels and the
+            called function, and the literal value for const
+        """
+        self.num_built += 1
+        return ir.get_instruction_class(operator).from_uses(
+            uses, destination, dest_type)
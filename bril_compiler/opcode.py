@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""The opcode registry: the single place that describes Bril operators.
+
+Instructions, the parser, the builder and the optimization passes look up
+operator properties here by integer opcode (constant.BrilOperator) instead
+of comparing operator strings.
+"""
+
+from bril_compiler.constant import BrilOperator
+
+VARIADIC = -1
+
+
+class OpcodeInfo:
+    __slots__ = ("opcode", "name", "arity", "is_commutative",
+                 "has_side_effect", "is_terminator", "fold")
+
+    def __init__(self, opcode, name, arity, is_commutative=False,
+                 has_side_effect=False, is_terminator=False, fold=None):
+        self.opcode = opcode
+        self.name = name
+        # number of variable arguments, VARIADIC if not fixed
+        self.arity = arity
+        self.is_commutative = is_commutative
+        self.has_side_effect = has_side_effect
+        self.is_terminator = is_terminator
+        # fold(arguments) -> constant result, or None if it cannot fold
+        self.fold = fold
+
+    def __repr__(self):
+        return f"OpcodeInfo({self.name})"
+
+
+def _wrap_int(value):
+    """Bril integers are 64-bit two's complement"""
+    if isinstance(value, bool) or not isinstance(value, int):
+        return value
+    value &= 0xFFFFFFFFFFFFFFFF
+    if value >= 0x8000000000000000:
+        value -= 0x10000000000000000
+    return value
+
+
+def _fold_divide(arguments):
+    dividend, divisor = arguments
+    if divisor == 0:
+        return None
+    # Bril division truncates toward zero
+    quotient = abs(dividend) // abs(divisor)
+    if (dividend < 0) != (divisor < 0):
+        quotient = -quotient
+    return _wrap_int(quotient)
+
+
+OPCODE_INFOS = [
+    OpcodeInfo(BrilOperator.CONST, "const", 0),
+    OpcodeInfo(BrilOperator.ID, "id", 1),
+    OpcodeInfo(BrilOperator.PRINT, "print", VARIADIC,
+               has_side_effect=True),
+    OpcodeInfo(BrilOperator.JMP, "jmp", 0,
+               is_terminator=True),
+    OpcodeInfo(BrilOperator.BR, "br", 1,
+               is_terminator=True),
+    OpcodeInfo(BrilOperator.ADD, "add", 2, is_commutative=True,
+               fold=lambda a: _wrap_int(a[0] + a[1])),
+    OpcodeInfo(BrilOperator.SUBTRACT, "sub", 2,
+               fold=lambda a: _wrap_int(a[0] - a[1])),
+    OpcodeInfo(BrilOperator.MULTIPLY, "mul", 2, is_commutative=True,
+               fold=lambda a: _wrap_int(a[0] * a[1])),
+    OpcodeInfo(BrilOperator.DIVIDE, "div", 2,
+               fold=_fold_divide),
+    OpcodeInfo(BrilOperator.EQUAL, "eq", 2, is_commutative=True,
+               fold=lambda a: a[0] == a[1]),
+    OpcodeInfo(BrilOperator.LESS_THAN, "lt", 2,
+               fold=lambda a: a[0] < a[1]),
+    OpcodeInfo(BrilOperator.LESS_THAN_OR_EQUAL_TO, "le", 2,
+               fold=lambda a: a[0] <= a[1]),
+    OpcodeInfo(BrilOperator.GREATER_THAN, "gt", 2,
+               fold=lambda a: a[0] > a[1]),
+    OpcodeInfo(BrilOperator.GREATER_THAN_OR_EQUAL_TO, "ge", 2,
+               fold=lambda a: a[0] >= a[1]),
+    OpcodeInfo(BrilOperator.NOT, "not", 1,
+               fold=lambda a: not a[0]),
+    OpcodeInfo(BrilOperator.AND, "and", 2, is_commutative=True,
+               fold=lambda a: a[0] and a[1]),
+    OpcodeInfo(BrilOperator.OR, "or", 2, is_commutative=True,
+               fold=lambda a: a[0] or a[1]),
+    OpcodeInfo(BrilOperator.PHI, "phi", VARIADIC),
+    # the callee may print, so a call is never removed or merged
+    OpcodeInfo(BrilOperator.CALL, "call", VARIADIC,
+               has_side_effect=True),
+    # a ret hands its argument to the caller, it is never removed either
+    OpcodeInfo(BrilOperator.RET, "ret", VARIADIC,
+               has_side_effect=True, is_terminator=True),
+]
+
+# OPCODE_TABLE[opcode] -> OpcodeInfo; index 0 is unused since enum
+# values start from 1
+OPCODE_TABLE = [None] * (max(BrilOperator) + 1)
+NAME_TO_OPCODE = {}
+for _info in OPCODE_INFOS:
+    OPCODE_TABLE[_info.opcode] = _info
+    NAME_TO_OPCODE[_info.name] = _info.opcode
+
+
+def get_opcode(name):
+    """The opcode of an operator string, None if it is unknown"""
+    return NAME_TO_OPCODE.get(name)
+
+
+def get_info(opcode):
+    return OPCODE_TABLE[opcode]
+
+
+def get_name(opcode):
+    return OPCODE_TABLE[opcode].name
+
+
+def is_commutative(opcode):
+    return OPCODE_TABLE[opcode].is_commutative
+
+
+def has_side_effect(opcode):
+    return OPCODE_TABLE[opcode].has_side_effect
+
+
+def is_terminator(opcode):
+    return OPCODE_TABLE[opcode].is_terminator
+
+
+def fold(opcode, arguments):
+    """Evaluate opcode on constant arguments, None if not foldable"""
+    folder = OPCODE_TABLE[opcode].fold
+    if folder is None:
+        return None
+    return folder(arguments)
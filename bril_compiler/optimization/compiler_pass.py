@@ -1,7 +1,150 @@
 #!/usr/bin/env python3
 
+from bril_compiler.analysis import def_use
+from bril_compiler.analysis import dominance
+from bril_compiler.analysis import induction
+from bril_compiler.analysis import liveness
+from bril_compiler.analysis import loops
+from bril_compiler.analysis import trip_count
+from bril_compiler.analysis import value_range
+
+# Analyses that only depend on the shape of the control-flow graph. A pass
+# that does not add, remove or retarget blocks preserves all of them.
+CONTROL_FLOW_ANALYSES = ("cfg", "dominators", "loops")
+
+
+def _compute_cfg(function, analysis_manager):
+    return function.get_cfg()
+
+
+def _invalidate_cfg(function):
+    function.invalidate_cfg()
+
+
+def _compute_def_use(function, analysis_manager):
+    return def_use.DefUseChains(function)
+
+
+def _compute_dominators(function, analysis_manager):
+    cfg = analysis_manager.get_result("cfg", function)
+    return dominance.DominatorTree.from_cfg(cfg)
+
+
+def _compute_loops(function, analysis_manager):
+    cfg = analysis_manager.get_result("cfg", function)
+    dominator_tree = analysis_manager.get_result("dominators", function)
+    return loops.LoopInfo(cfg, dominator_tree)
+
+
+def _compute_induction_variables(function, analysis_manager):
+    cfg = analysis_manager.get_result("cfg", function)
+    loop_info = analysis_manager.get_result("loops", function)
+    return induction.InductionVariables(function, cfg, loop_info)
+
+
+def _compute_trip_counts(function, analysis_manager):
+    cfg = analysis_manager.get_result("cfg", function)
+    loop_info = analysis_manager.get_result("loops", function)
+    induction_variables = analysis_manager.get_result(
+        "induction_variables", function)
+    return trip_count.TripCounts(function, cfg, loop_info,
+                                 induction_variables)
+
+
+def _compute_value_ranges(function, analysis_manager):
+    cfg = analysis_manager.get_result("cfg", function)
+    return value_range.ValueRanges(function, cfg)
+
+
+def _compute_liveness(function, analysis_manager):
+    cfg = analysis_manager.get_result("cfg", function)
+    return liveness.Liveness(function, cfg)
+
+
+class AnalysisManager:
+    """Computes function analyses on demand and caches them until a pass
+        that does not preserve them has run.
+        An analysis is registered as compute(function, analysis_manager);
+        analyses it requests through the manager while computing become
+        its dependencies and invalidate it as well.
+    """
+    def __init__(self):
+        self._analyses = {}
+        self._invalidators = {}
+        # function -> {analysis name: result}
+        self._results = {}
+        # function -> {analysis name: set of analyses depending on it}
+        self._dependents = {}
+        self._computing = []
+        self.num_computed = 0
+
+        self.register_analysis("cfg", _compute_cfg, _invalidate_cfg)
+        self.register_analysis("def_use", _compute_def_use)
+        self.register_analysis("dominators", _compute_dominators)
+        self.register_analysis("liveness", _compute_liveness)
+        self.register_analysis("loops", _compute_loops)
+        self.register_analysis("induction_variables",
+                               _compute_induction_variables)
+        self.register_analysis("trip_counts", _compute_trip_counts)
+        self.register_analysis("value_ranges", _compute_value_ranges)
+
+    def register_analysis(self, name, compute, invalidate=None):
+        self._analyses[name] = compute
+        if invalidate is not None:
+            self._invalidators[name] = invalidate
+
+    def get_result(self, name, function):
+        results = self._results.setdefault(function, {})
+        if self._computing:
+            dependents = self._dependents.setdefault(function, {})
+            dependents.setdefault(name, set()).add(self._computing[-1])
+        if name in results:
+            return results[name]
+
+        if name not in self._analyses:
+            print(f"[ERROR] AnalysisManager: no analysis named {name}")
+            quit()
+        self._computing.append(name)
+        try:
+            result = self._analyses[name](function, self)
+        finally:
+            self._computing.pop()
+        results[name] = result
+        self.num_computed += 1
+        return result
+
+    def invalidate(self, function, preserved_analyses=()):
+        """Drop every result of function not in preserved_analyses,
+            together with the results computed from them.
+        """
+        results = self._results.get(function)
+        if not results:
+            return
+        dependents = self._dependents.get(function, {})
+        stale = [name for name in results if name not in preserved_analyses]
+        while stale:
+            name = stale.pop()
+            if name not in results:
+                continue
+            del results[name]
+            if name in self._invalidators:
+                self._invalidators[name](function)
+            stale.extend(dependents.pop(name, ()))
+
+    def invalidate_module(self, module, preserved_analyses=()):
+        for function in module.get_functions():
+            self.invalidate(function, preserved_analyses)
+
+    def clear(self):
+        self._results.clear()
+        self._dependents.clear()
+
+
 class BrilPass:
     """Compiler Pass follows Composite design pattern, where """
+    # names of the analyses that are still valid after this pass ran
+    PRESERVED_ANALYSES = ()
+    _analysis_manager = None
 
     def __init__(self):
         raise NotImplementedError
@@ -10,8 +153,25 @@ class BrilPass:
         raise NotImplementedError
 
     def optimize(self, module):
+        """Returning False tells the manager nothing changed"""
         raise NotImplementedError
 
+    def set_analysis_manager(self, analysis_manager):
+        self._analysis_manager = analysis_manager
+
+    def get_analysis_manager(self):
+        # a pass used outside of a pass manager gets its own cache
+        if self._analysis_manager is None:
+            self._analysis_manager = AnalysisManager()
+        return self._analysis_manager
+
+    def get_analysis(self, name, function):
+        return self.get_analysis_manager().get_result(name, function)
+
+    def get_preserved_analyses(self):
+        return self.PRESERVED_ANALYSES
+
+
 class BrilCompositePass(BrilPass):
     """The composite design pattern of CompilerPass"""
     def __init__(self):
@@ -19,10 +179,32 @@ class BrilCompositePass(BrilPass):
 
     def add_pass(self, bril_pass):
         self._passes.append(bril_pass)
+        if self._analysis_manager is not None:
+            bril_pass.set_analysis_manager(self._analysis_manager)
+
+    def set_analysis_manager(self, analysis_manager):
+        self._analysis_manager = analysis_manager
+        for bril_pass in self._passes:
+            bril_pass.set_analysis_manager(analysis_manager)
 
     def optimize(self, module):
+        analysis_manager = self.get_analysis_manager()
+        for bril_pass in self._passes:
+            program_changed = bril_pass.optimize(module)
+            if program_changed is False:
+                continue
+            analysis_manager.invalidate_module(
+                module, bril_pass.get_preserved_analyses())
+
+    def get_preserved_analyses(self):
+        preserved_analyses = None
         for bril_pass in self._passes:
-            bril_pass.optimize(module)
+            preserved = set(bril_pass.get_preserved_analyses())
+            if preserved_analyses is None:
+                preserved_analyses = preserved
+            else:
+                preserved_analyses &= preserved
+        return tuple(preserved_analyses or ())
 
 
 class BrilPassManager(BrilCompositePass):
@@ -30,9 +212,15 @@ class BrilPassManager(BrilCompositePass):
     def __init__(self):
         super().__init__()
         self._is_manager = True
+        self.set_analysis_manager(AnalysisManager())
 
     def __new__(cls):
         """Singleton"""
         if not hasattr(cls, 'instance'):
             cls.instance = super(BrilPassManager, cls).__new__(cls)
         return cls.instance
+
+    def optimize(self, module):
+        super().optimize(module)
+        # results are keyed by function; do not keep modules alive
+        self._analysis_manager.clear()
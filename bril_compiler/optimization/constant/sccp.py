@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import opcode
+from bril_compiler.analysis import ssa
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.redundancy import dce
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class _LatticeValue:
+    def __init__(self, name):
+        self._name = name
+
+    def __repr__(self):
+        return self._name
+
+
+# not known to be executed yet / known to take more than one value
+TOP = _LatticeValue("TOP")
+BOTTOM = _LatticeValue("BOTTOM")
+
+
+def _same_constant(value0, value1):
+    return type(value0) is type(value1) and value0 == value1
+
+
+class SparseConditionalConstantPropagationPass(compiler_pass.BrilPass):
+    """Sparse conditional constant propagation (Wegman and Zadeck) on
+        SSA form.
+        Values and executable CFG edges are discovered together, so a
+        constant can flow around a branch that is never taken. Variables
+        found constant get a const definition, branches on a known
+        condition become jumps and blocks that are never executed are
+        deleted. Functions that are not in SSA form are left alone.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_constants = 0
+        self.num_branches_folded = 0
+        self.num_blocks_removed = 0
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or not ssa.is_ssa(function):
+                continue
+            program_changed |= self.propagate(function)
+        return program_changed
+
+    def propagate(self, function):
+        cfg = self.get_analysis("cfg", function)
+        def_use = self.get_analysis("def_use", function)
+        solver = _Solver(function, cfg, def_use)
+        solver.solve()
+        return self._rewrite(function, cfg, solver)
+
+    def _rewrite(self, function, cfg, solver):
+        symbol_table = function.intern_symbols()
+        get_id = symbol_table.get_id
+        values = solver.values
+        program_changed = False
+
+        basic_blocks = []
+        for index, basic_block in enumerate(cfg.get_blocks()):
+            if not solver.is_executable(index):
+                self.num_blocks_removed += 1
+                program_changed = True
+                continue
+            basic_blocks.append(basic_block)
+
+            phis, constants, body = [], [], []
+            for instruction in basic_block.get_instructions():
+                operator = instruction.get_opcode()
+                destination = instruction.get_destination()
+                value = (TOP if destination is None
+                         else values[get_id(destination)])
+                if (destination is not None and operator != BrilOperator.CONST
+                    and value is not TOP and value is not BOTTOM):
+                    constant = ir.ConstInstruction(
+                        value, destination, instruction.get_type())
+                    # phis stay at the top of the block
+                    if operator == BrilOperator.PHI:
+                        constants.append(constant)
+                    else:
+                        body.append(constant)
+                    self.num_constants += 1
+                    program_changed = True
+                elif operator == BrilOperator.PHI:
+                    phis.append(instruction)
+                elif operator == BrilOperator.BR:
+                    target = solver.get_branch_target(index, instruction)
+                    if target is None:
+                        body.append(instruction)
+                    else:
+                        body.append(ir.JumpInstruction(target))
+                        self.num_branches_folded += 1
+                        program_changed = True
+                else:
+                    body.append(instruction)
+
+            # drop the incoming values of edges that are never taken
+            for phi in phis:
+                for label in phi.get_incoming_labels():
+                    predecessor = cfg.get_index_by_label(label)
+                    if (predecessor is None or
+                        not solver.is_edge_executable(predecessor, index)):
+                        phi.remove_incoming(label)
+                        program_changed = True
+            basic_block.transform_into(phis + constants + body)
+
+        if len(basic_blocks) != cfg.get_number_of_blocks():
+            function.set_basic_blocks(basic_blocks)
+        return program_changed
+
+
+class _Solver:
+    def __init__(self, function, cfg, def_use):
+        self._cfg = cfg
+        self._def_use = def_use
+        self._symbol_table = function.intern_symbols()
+        num_blocks = cfg.get_number_of_blocks()
+        self.values = [TOP] * len(self._symbol_table)
+        for name, _ in function.arguments:
+            self.values[self._symbol_table.get_id(name)] = BOTTOM
+        self._executable_blocks = [False] * num_blocks
+        self._executable_edges = set()
+        self._flow_worklist = [(None, cfg.get_entry())]
+        self._ssa_worklist = []
+
+    def is_executable(self, block):
+        return self._executable_blocks[block]
+
+    def is_edge_executable(self, predecessor, block):
+        return (predecessor, block) in self._executable_edges
+
+    def get_branch_target(self, block, branch):
+        """The only label a branch can go to, None if it is not known"""
+        condition = self.values[
+            self._symbol_table.get_id(branch.get_arguments()[0])]
+        if condition is BOTTOM:
+            return None
+        label_on_true, label_on_false = branch.get_labels()
+        if condition is TOP or condition:
+            target, other = label_on_true, label_on_false
+        else:
+            target, other = label_on_false, label_on_true
+        other = self._cfg.get_index_by_label(other)
+        if (block, other) in self._executable_edges:
+            return None
+        return target
+
+    def solve(self):
+        while True:
+            while self._flow_worklist or self._ssa_worklist:
+                while self._flow_worklist:
+                    predecessor, block = self._flow_worklist.pop()
+                    self._visit_edge(predecessor, block)
+                while self._ssa_worklist:
+                    symbol_id = self._ssa_worklist.pop()
+                    for block, i in self._def_use.get_uses_by_id(symbol_id):
+                        if self._executable_blocks[block]:
+                            self._visit_instruction(block, i)
+            # a branch on a value that is never defined may go anywhere;
+            # follow its true edge so the target is kept
+            if not self._resolve_undefined_branches():
+                return
+
+    def _resolve_undefined_branches(self):
+        resolved = False
+        for block in range(self._cfg.get_number_of_blocks()):
+            if not self._executable_blocks[block]:
+                continue
+            terminator = self._cfg.get_block(block).get_terminator()
+            if (terminator is None or
+                terminator.get_opcode() != BrilOperator.BR):
+                continue
+            condition = terminator.get_arguments()[0]
+            if self.values[self._symbol_table.get_id(condition)] is TOP:
+                target = self._cfg.get_index_by_label(
+                    terminator.get_labels()[0])
+                if (block, target) not in self._executable_edges:
+                    self._flow_worklist.append((block, target))
+                    resolved = True
+        return resolved
+
+    def _visit_edge(self, predecessor, block):
+        if predecessor is not None:
+            if (predecessor, block) in self._executable_edges:
+                return
+            self._executable_edges.add((predecessor, block))
+        instructions = self._cfg.get_block(block).get_instructions()
+        if self._executable_blocks[block]:
+            # only the phis see the new edge
+            for i, instruction in enumerate(instructions):
+                if instruction.get_opcode() != BrilOperator.PHI:
+                    break
+                self._visit_instruction(block, i)
+            return
+        self._executable_blocks[block] = True
+        for i in range(len(instructions)):
+            self._visit_instruction(block, i)
+        if self._cfg.get_block(block).get_terminator() is None:
+            for successor in self._cfg.get_successors(block):
+                self._flow_worklist.append((block, successor))
+
+    def _visit_instruction(self, block, i):
+        instruction = self._cfg.get_block(block).get_instructions()[i]
+        operator = instruction.get_opcode()
+        if operator == BrilOperator.JMP:
+            self._flow_worklist.append((block, self._cfg.get_successors(
+                block)[0]))
+            return
+        if operator == BrilOperator.BR:
+            self._visit_branch(block, instruction)
+            return
+        destination = instruction.get_destination()
+        if destination is None:
+            return
+        if operator == BrilOperator.PHI:
+            value = self._evaluate_phi(block, instruction)
+        else:
+            value = self._evaluate(instruction)
+        self._lower(self._symbol_table.get_id(destination), value)
+
+    def _visit_branch(self, block, branch):
+        condition = self.values[
+            self._symbol_table.get_id(branch.get_arguments()[0])]
+        if condition is TOP:
+            return
+        label_on_true, label_on_false = branch.get_labels()
+        if condition is BOTTOM:
+            labels = (label_on_true, label_on_false)
+        elif condition:
+            labels = (label_on_true,)
+        else:
+            labels = (label_on_false,)
+        for label in labels:
+            self._flow_worklist.append(
+                (block, self._cfg.get_index_by_label(label)))
+
+    def _lower(self, symbol_id, value):
+        old_value = self.values[symbol_id]
+        if old_value is BOTTOM or old_value is value:
+            return
+        if old_value is not TOP and value is not BOTTOM:
+            if _same_constant(old_value, value):
+                return
+            value = BOTTOM
+        if value is TOP:
+            return
+        self.values[symbol_id] = value
+        self._ssa_worklist.append(symbol_id)
+
+    def _evaluate_phi(self, block, phi):
+        result = TOP
+        for label, arg in phi.get_incoming():
+            predecessor = self._cfg.get_index_by_label(label)
+            if (predecessor is None or
+                (predecessor, block) not in self._executable_edges):
+                continue
+            if arg == construction.UNDEFINED:
+                continue
+            value = self._get_value(arg)
+            if value is TOP:
+                continue
+            if value is BOTTOM:
+                return BOTTOM
+            if result is TOP:
+                result = value
+            elif not _same_constant(result, value):
+                return BOTTOM
+        return result
+
+    def _evaluate(self, instruction):
+        operator = instruction.get_opcode()
+        if operator == BrilOperator.CONST:
+            return instruction.get_value()
+        arguments = []
+        for arg in instruction.get_arguments():
+            value = self._get_value(arg)
+            if value is BOTTOM:
+                return BOTTOM
+            arguments.append(value)
+        if any(value is TOP for value in arguments):
+            return TOP
+        if operator == BrilOperator.ID:
+            return arguments[0]
+        result = opcode.fold(operator, arguments)
+        return BOTTOM if result is None else result
+
+    def _get_value(self, name):
+        symbol_id = self._symbol_table.get_id(name)
+        if symbol_id is None or symbol_id >= len(self.values):
+            return BOTTOM
+        return self.values[symbol_id]
+
+
+class SparseConditionalConstantPropagationCompositePass(
+        compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(construction.SSAConstructionPass())
+        self.add_pass(SparseConditionalConstantPropagationPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler.analysis import value_range
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.control_flow import simplify
+from bril_compiler.optimization.redundancy import dce
+
+
+class ValueRangePropagationPass(compiler_pass.BrilPass):
+    """Folds the comparisons the value ranges decide.
+        A comparison whose operand ranges make it always true or always
+        false becomes a constant, and a branch becomes a jump when the
+        range of its condition, or the refined ranges on one of its
+        edges, rule that edge out. The blocks left unreachable are
+        deleted. Ranges do not need SSA form, so the pass runs on any
+        function.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_comparisons_folded = 0
+        self.num_branches_folded = 0
+        self.num_blocks_removed = 0
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks():
+                continue
+            program_changed |= self.propagate(function)
+        return program_changed
+
+    def propagate(self, function):
+        cfg = self.get_analysis("cfg", function)
+        value_ranges = self.get_analysis("value_ranges", function)
+        program_changed = False
+        for block in range(cfg.get_number_of_blocks()):
+            instructions = []
+            for instruction, get_range in value_ranges.walk(block):
+                operator = instruction.get_opcode()
+                if operator in value_range.COMPARISONS:
+                    result = value_range.compare(
+                        operator, *map(get_range, instruction.get_arguments()))
+                    if result is not None:
+                        instruction = ir.ConstInstruction(
+                            result, instruction.get_destination(),
+                            instruction.get_type())
+                        self.num_comparisons_folded += 1
+                        program_changed = True
+                elif operator == BrilOperator.BR:
+                    target = self._get_branch_target(
+                        cfg, value_ranges, block, instruction)
+                    if target is not None:
+                        instruction = ir.JumpInstruction(target)
+                        self.num_branches_folded += 1
+                        program_changed = True
+                instructions.append(instruction)
+            if instructions:
+                cfg.get_block(block).transform_into(instructions)
+
+        if program_changed:
+            function.invalidate_cfg()
+            num_blocks_removed = simplify.remove_unreachable_blocks(function)
+            self.num_blocks_removed += num_blocks_removed
+        return program_changed
+
+    def _get_branch_target(self, cfg, value_ranges, block, branch):
+        """The only label branch can go to, None if it can go to both"""
+        label_on_true, label_on_false = branch.get_labels()
+        if label_on_true == label_on_false:
+            return None
+        taken = [
+            label for label in (label_on_true, label_on_false)
+            if value_ranges.is_edge_taken(
+                block, cfg.get_index_by_label(label))
+        ]
+        if len(taken) == 1:
+            return taken[0]
+        return None
+
+
+class ValueRangePropagationCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(ValueRangePropagationPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(simplify.ControlFlowSimplificationPass())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.ssa import construction
+
+
+class ControlFlowSimplificationPass(compiler_pass.BrilPass):
+    """Cleans up the control flow graph until nothing changes:
+        - blocks the entry cannot reach are removed;
+        - a br whose two labels are the same becomes a jmp;
+        - an edge into a block holding nothing but a jump (or nothing,
+          falling through) is threaded to where that block goes;
+        - a block whose only successor has it as only predecessor
+          absorbs that successor, phis turning into copies;
+        - a jmp to the block laid out next is dropped.
+        Phis are kept consistent, so the pass runs in and out of SSA
+        form. An edge is only threaded into a block with phis when the
+        source does not reach that block already, as the phis could not
+        tell the two edges apart.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_blocks_removed = 0
+        self.num_branches_folded = 0
+        self.num_jumps_threaded = 0
+        self.num_blocks_merged = 0
+        self.num_jumps_removed = 0
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks():
+                continue
+            program_changed |= self.simplify(function)
+        return program_changed
+
+    def simplify(self, function):
+        program_changed = False
+        while True:
+            num_blocks_removed = remove_unreachable_blocks(function)
+            self.num_blocks_removed += num_blocks_removed
+            changed = num_blocks_removed > 0
+            changed |= self._fold_branches(function)
+            changed |= self._thread_jumps(function)
+            changed |= self._merge_blocks(function)
+            changed |= self._remove_jumps_to_next(function)
+            if not changed:
+                return program_changed
+            program_changed = True
+
+    def _fold_branches(self, function):
+        changed = False
+        for basic_block in function.get_basic_blocks():
+            terminator = basic_block.get_terminator()
+            if (terminator is None or
+                terminator.get_opcode() != BrilOperator.BR):
+                continue
+            label_on_true, label_on_false = terminator.get_labels()
+            if label_on_true != label_on_false:
+                continue
+            instructions = basic_block.get_instructions()
+            instructions[-1] = ir.JumpInstruction(label_on_true)
+            self.num_branches_folded += 1
+            changed = True
+        # the successors stay the same
+        return changed
+
+    def _get_forward_target(self, cfg, block):
+        """Where block goes if it holds nothing but a jump or nothing at
+            all, None otherwise
+        """
+        if block == cfg.get_entry():
+            return None
+        instructions = cfg.get_block(block).get_instructions()
+        if len(instructions) > 1 or len(cfg.get_successors(block)) != 1:
+            return None
+        if (instructions and
+            instructions[0].get_opcode() != BrilOperator.JMP):
+            return None
+        return cfg.get_successors(block)[0]
+
+    def _thread_jumps(self, function):
+        cfg = function.get_cfg()
+        changed = False
+        for block in range(cfg.get_number_of_blocks()):
+            target = self._get_forward_target(cfg, block)
+            if target is None or self._forwards_in_cycle(cfg, block):
+                continue
+            name = cfg.get_name(block)
+            target_block = cfg.get_block(target)
+            phis = target_block.get_phis()
+            for predecessor in cfg.get_predecessors(block):
+                predecessor_block = cfg.get_block(predecessor)
+                terminator = predecessor_block.get_terminator()
+                # a block falling through keeps its way in
+                if terminator is None:
+                    continue
+                if phis:
+                    if (target in cfg.get_successors(predecessor) or
+                        predecessor_block.get_label() is None):
+                        continue
+                    for phi in phis:
+                        phi.set_incoming(cfg.get_name(predecessor),
+                                         phi.get_argument_for(name))
+                if target_block.get_label() is None:
+                    target_block.set_label(
+                        ir.LabelInstruction(cfg.get_name(target)))
+                terminator.set_labels([
+                    cfg.get_name(target) if label == name else label
+                    for label in terminator.get_labels()])
+                self.num_jumps_threaded += 1
+                changed = True
+            if changed:
+                # the edges just changed; the next round sees the rest
+                function.invalidate_cfg()
+                return True
+        return False
+
+    def _forwards_in_cycle(self, cfg, block):
+        """Whether following the forwarding blocks from block comes back"""
+        visited = set()
+        while block is not None and block not in visited:
+            visited.add(block)
+            block = self._get_forward_target(cfg, block)
+        return block is not None
+
+    def _merge_blocks(self, function):
+        cfg = function.get_cfg()
+        entry = cfg.get_entry()
+
+        def get_absorbed(block):
+            """The successor block can absorb, None if there is none"""
+            successors = cfg.get_successors(block)
+            if len(successors) != 1:
+                return None
+            successor = successors[0]
+            if (successor == entry or successor == block or
+                len(cfg.get_predecessors(successor)) != 1):
+                return None
+            return successor
+
+        absorbed = set()
+        groups = []
+        for block in cfg.get_reverse_postorder():
+            if block in absorbed:
+                continue
+            group = [block]
+            successor = get_absorbed(block)
+            while successor is not None and successor not in absorbed:
+                absorbed.add(successor)
+                group.append(successor)
+                successor = get_absorbed(successor)
+            if len(group) > 1:
+                groups.append(group)
+        if not groups:
+            return False
+        layout = [block for block in range(cfg.get_number_of_blocks())
+                  if block not in absorbed]
+        # the block falling off the end of the function has to stay last
+        last = cfg.get_number_of_blocks() - 1
+        if (last in absorbed and
+            cfg.get_block(last).get_terminator() is None):
+            group = next(group for group in groups if group[-1] == last)
+            if layout[-1] != group[0]:
+                group.pop()
+                absorbed.remove(last)
+                layout.append(last)
+        groups = [group for group in groups if len(group) > 1]
+        if not groups:
+            return False
+        next_in_layout = dict(zip(layout, layout[1:]))
+        for group in groups:
+            self._merge_group(cfg, group, next_in_layout.get(group[0]))
+        function.set_basic_blocks([cfg.get_block(block) for block in layout])
+        return True
+
+    def _merge_group(self, cfg, group, next_block):
+        """Move the instructions of group[1:] into group[0]"""
+        head_block = cfg.get_block(group[0])
+        instructions = []
+        for block in group:
+            for instruction in cfg.get_block(block).get_instructions():
+                if (block != group[0] and
+                    instruction.get_opcode() == BrilOperator.PHI):
+                    # the block had a single predecessor; like SSA
+                    # destruction, no copy from an undefined value
+                    arguments = instruction.get_arguments()
+                    if (not arguments or
+                        arguments[0] == construction.UNDEFINED):
+                        continue
+                    instruction = ir.IdInstruction(
+                        arguments[0], instruction.get_destination(),
+                        instruction.get_type())
+                elif instruction.get_opcode() == BrilOperator.JMP:
+                    continue
+                instructions.append(instruction)
+        tail = group[-1]
+        tail_terminator = cfg.get_block(tail).get_terminator()
+        if tail_terminator is not None:
+            if tail_terminator.get_opcode() == BrilOperator.JMP:
+                instructions.append(tail_terminator)
+        elif (cfg.get_successors(tail) and
+              cfg.get_successors(tail)[0] != next_block):
+            # the tail fell through into a block that no longer follows
+            successor = cfg.get_successors(tail)[0]
+            successor_block = cfg.get_block(successor)
+            if successor_block.get_label() is None:
+                successor_block.set_label(
+                    ir.LabelInstruction(cfg.get_name(successor)))
+            instructions.append(
+                ir.JumpInstruction(cfg.get_name(successor)))
+        head_block.transform_into(instructions)
+
+        # the phis after the tail now come from the head
+        tail_name = cfg.get_name(tail)
+        for successor in cfg.get_successors(tail):
+            for phi in cfg.get_block(successor).get_phis():
+                argument = phi.get_argument_for(tail_name)
+                if argument is None:
+                    continue
+                if head_block.get_label() is None:
+                    head_block.set_label(
+                        ir.LabelInstruction(cfg.get_name(group[0])))
+                phi.remove_incoming(tail_name)
+                phi.set_incoming(head_block.get_label_name(), argument)
+        self.num_blocks_merged += len(group) - 1
+
+    def _remove_jumps_to_next(self, function):
+        basic_blocks = function.get_basic_blocks()
+        changed = False
+        for basic_block, next_block in zip(basic_blocks, basic_blocks[1:]):
+            terminator = basic_block.get_terminator()
+            if (terminator is None or
+                terminator.get_opcode() != BrilOperator.JMP or
+                terminator.get_labels()[0] != next_block.get_label_name()):
+                continue
+            basic_block.get_instructions().pop()
+            self.num_jumps_removed += 1
+            changed = True
+        if changed:
+            # the successors stay the same, but the terminators are gone
+            function.invalidate_cfg()
+        return changed
+
+
+def remove_unreachable_blocks(function):
+    """Drop the blocks the entry cannot reach, and the incoming values of
+        the phis for the edges leaving them. Returns how many blocks were
+        dropped.
+    """
+    cfg = function.get_cfg()
+    basic_blocks = []
+    for block, basic_block in enumerate(cfg.get_blocks()):
+        if not cfg.is_reachable(block):
+            continue
+        basic_blocks.append(basic_block)
+        predecessors = set(cfg.get_name(predecessor)
+                           for predecessor in cfg.get_predecessors(block)
+                           if cfg.is_reachable(predecessor))
+        for phi in basic_block.get_phis():
+            for label in phi.get_incoming_labels():
+                if label not in predecessors:
+                    phi.remove_incoming(label)
+    num_removed = cfg.get_number_of_blocks() - len(basic_blocks)
+    if num_removed:
+        function.set_basic_blocks(basic_blocks)
+    return num_removed
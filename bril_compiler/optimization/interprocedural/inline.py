@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import ir_builder
+from bril_compiler import program
+from bril_compiler.analysis import call_graph
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.control_flow import simplify
+from bril_compiler.optimization.redundancy import adce
+from bril_compiler.optimization.redundancy import lvn
+
+
+class FunctionInliningPass(compiler_pass.BrilPass):
+    """Replaces calls by the body of the called function.
+        The strongly connected components of the call graph are visited
+        callees first, so a function is inlined with the calls in its
+        body already inlined. Calls inside a component are recursive and
+        stay. A call site is inlined when the callee has at most
+        always_inline_size instructions, or when inlining every call to
+        it and then dropping it grows the program by growth_budget
+        instructions at most, i.e. size * (calls - 1). A caller never
+        grows past max_function_size.
+        The body goes between the two halves of the calling block: a
+        parameter the callee never assigns is read from the argument
+        directly, and a ret becomes a copy to the destination of the
+        call and a jump to the second half. When the module has a main
+        function, the functions main no longer calls are removed.
+        Functions with phis are neither inlined nor inlined into.
+    """
+    PRESERVED_ANALYSES = ()
+    ALWAYS_INLINE_SIZE = 16
+    GROWTH_BUDGET = 64
+    MAX_FUNCTION_SIZE = 1024
+
+    def __init__(self, always_inline_size=ALWAYS_INLINE_SIZE,
+                 growth_budget=GROWTH_BUDGET,
+                 max_function_size=MAX_FUNCTION_SIZE):
+        self._always_inline_size = always_inline_size
+        self._growth_budget = growth_budget
+        self._max_function_size = max_function_size
+        self.num_inlined = 0
+        self.num_functions_removed = 0
+        self._ir_builder = ir_builder.IRBuilder()
+
+    def optimize(self, module):
+        graph = call_graph.CallGraph(module)
+        self._graph = graph
+        self._sizes = {}
+        self._num_calls = {}
+        for name in graph.get_names():
+            self._sizes[name] = _get_size(graph.get_function(name))
+            self._num_calls[name] = graph.get_number_of_calls(name)
+
+        program_changed = False
+        for scc in graph.get_sccs():
+            for name in scc:
+                function = graph.get_function(name)
+                if function.has_phis():
+                    continue
+                program_changed |= self.inline_calls(function, scc)
+
+        if graph.get_function("main") is not None:
+            program_changed |= self._remove_uncalled_functions(module)
+        return program_changed
+
+    def inline_calls(self, function, scc):
+        """Inline the calls of function to functions outside scc"""
+        name = function.get_identifier()
+        program_changed = False
+        basic_blocks = function.get_basic_blocks()
+        i = 0
+        while i < len(basic_blocks):
+            basic_block = basic_blocks[i]
+            for j, instruction in enumerate(basic_block.get_instructions()):
+                if instruction.get_opcode() != BrilOperator.CALL:
+                    continue
+                callee_name = instruction.get_functions()[0]
+                callee = self._graph.get_function(callee_name)
+                if (callee is None or callee_name in scc or
+                    callee.has_phis() or
+                    not self._should_inline(name, callee_name)):
+                    continue
+                inlined_blocks = self._inline(function, basic_block, j,
+                                              callee)
+                basic_blocks[i + 1:i + 1] = inlined_blocks
+                function.set_basic_blocks(basic_blocks)
+
+                self._sizes[name] += self._sizes[callee_name]
+                self._num_calls[callee_name] -= 1
+                for called in _get_calls(callee):
+                    if called in self._num_calls:
+                        self._num_calls[called] += 1
+                self.num_inlined += 1
+                program_changed = True
+                # the inlined body was visited with the callee; go on
+                # with the second half of the block
+                i += len(inlined_blocks) - 1
+                break
+            i += 1
+        return program_changed
+
+    def _should_inline(self, caller_name, callee_name):
+        size = self._sizes[callee_name]
+        if self._sizes[caller_name] + size > self._max_function_size:
+            return False
+        if size <= self._always_inline_size:
+            return True
+        growth = size * (self._num_calls[callee_name] - 1)
+        return growth <= self._growth_budget
+
+    def _inline(self, function, basic_block, index, callee):
+        """Split basic_block at its call at index and return the blocks
+            of the inlined body followed by the second half of the block
+        """
+        call = basic_block.get_instructions()[index]
+        suffix = _get_fresh_suffix(function)
+        assigned = set()
+        for callee_block in callee.get_basic_blocks():
+            for instruction in callee_block.get_instructions():
+                if instruction.get_destination() is not None:
+                    assigned.add(instruction.get_destination())
+
+        names = {}
+        copies = []
+        for (parameter, parameter_type), argument in zip(
+                callee.arguments, call.get_arguments()):
+            if parameter in assigned:
+                names[parameter] = f"{parameter}{suffix}"
+                copies.append(ir.IdInstruction(
+                    argument, names[parameter], parameter_type))
+            else:
+                names[parameter] = argument
+
+        def rename(name):
+            return names.get(name, f"{name}{suffix}")
+
+        def map_label(label):
+            return f"{label}{suffix}"
+
+        return_label = f"{callee.get_fresh_label('return')}{suffix}"
+        inlined_blocks = []
+        for callee_block in callee.get_basic_blocks():
+            new_block = program.BasicBlock()
+            if callee_block.get_label() is not None:
+                new_block.set_label(ir.LabelInstruction(
+                    map_label(callee_block.get_label_name())))
+            for instruction in callee_block.get_instructions():
+                if instruction.get_opcode() == BrilOperator.RET:
+                    if (call.get_destination() is not None and
+                        instruction.get_arguments()):
+                        new_block.add_instruction(ir.IdInstruction(
+                            rename(instruction.get_arguments()[0]),
+                            call.get_destination(), call.get_type()))
+                    new_block.add_instruction(
+                        ir.JumpInstruction(return_label))
+                    continue
+                new_block.add_instruction(
+                    self._copy_instruction(instruction, rename, map_label))
+            inlined_blocks.append(new_block)
+
+        # the first half falls through into the body, and a body falling
+        # off its end returns into the second half
+        instructions = basic_block.get_instructions()
+        return_block = program.BasicBlock()
+        return_block.set_label(ir.LabelInstruction(return_label))
+        return_block.transform_into(instructions[index + 1:])
+        basic_block.transform_into(instructions[:index] + copies)
+        inlined_blocks.append(return_block)
+        return inlined_blocks
+
+    def _copy_instruction(self, instruction, rename, map_label):
+        operator = instruction.get_opcode()
+        destination = instruction.get_destination()
+        if destination is not None:
+            destination = rename(destination)
+        if operator == BrilOperator.CONST:
+            uses = [instruction.get_value()]
+        else:
+            uses = [rename(arg) for arg in instruction.get_arguments()]
+            uses += [map_label(label) for label in instruction.get_labels()]
+            uses += instruction.get_functions()
+        return self._ir_builder.build_by_opcode(
+            operator, destination, uses, instruction.get_type())
+
+    def _remove_uncalled_functions(self, module):
+        reachable = call_graph.CallGraph(module).get_reachable("main")
+        functions = [function for function in module.get_functions()
+                     if function.get_identifier() in reachable]
+        num_removed = len(module.get_functions()) - len(functions)
+        if not num_removed:
+            return False
+        module.set_functions(functions)
+        self.num_functions_removed += num_removed
+        return True
+
+
+def _get_size(function):
+    return sum(len(basic_block.get_instructions())
+               for basic_block in function.get_basic_blocks())
+
+
+def _get_calls(function):
+    for basic_block in function.get_basic_blocks():
+        for instruction in basic_block.get_instructions():
+            yield from instruction.get_functions()
+
+
+def _get_fresh_suffix(function):
+    """A suffix .inline.N no variable or label of function ends with"""
+    symbol_table = function.intern_symbols()
+    names = [symbol_table.get_name(symbol_id)
+             for symbol_id in range(len(symbol_table))]
+    names += [basic_block.get_label_name()
+              for basic_block in function.get_basic_blocks()
+              if basic_block.get_label() is not None]
+    index = 0
+    while any(name.endswith(f".inline.{index}") for name in names):
+        index += 1
+    return f".inline.{index}"
+
+
+class FunctionInliningCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(FunctionInliningPass())
+        self.add_pass(simplify.ControlFlowSimplificationPass())
+        self.add_pass(lvn.LocalValueNumberingCompositePass())
+        self.add_pass(adce.AggressiveDeadCodeEliminationCompositePass())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+from bril_compiler import opcode
+from bril_compiler.analysis import def_use
+from bril_compiler.analysis import ssa
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.loop import preheader
+from bril_compiler.optimization.redundancy import dce
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class LoopInvariantCodeMotionPass(compiler_pass.BrilPass):
+    """Loop-invariant code motion on SSA form.
+        An instruction without side effects whose arguments are all
+        defined outside the loop, or by instructions already hoisted, is
+        moved to the loop's preheader, which is created if the loop has
+        none. Loops are done inner first, so an invariant can climb out
+        of a whole nest. Every SSA name is defined once and the
+        preheader dominates the loop, so a hoisted definition still
+        dominates its uses. A division is only hoisted by a constant
+        other than zero, since the loop may never have executed it.
+        Functions that are not in SSA form are left alone.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_hoisted = 0
+        self.num_preheaders = 0
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or not ssa.is_ssa(function):
+                continue
+            program_changed |= self.hoist(function)
+        return program_changed
+
+    def hoist(self, function):
+        cfg = self.get_analysis("cfg", function)
+        loop_info = self.get_analysis("loops", function)
+        if not loop_info.get_loops():
+            return False
+        num_preheaders = preheader.insert_preheaders(
+            function, cfg, loop_info)
+        if num_preheaders:
+            self.num_preheaders += num_preheaders
+            self.get_analysis_manager().invalidate(function)
+            cfg = self.get_analysis("cfg", function)
+            loop_info = self.get_analysis("loops", function)
+
+        # the block defining every variable, and the value of constants
+        definition_blocks, definitions = def_use.get_definitions(cfg)
+        constants = def_use.get_constants(definitions)
+
+        num_hoisted = 0
+        for loop in reversed(loop_info.get_loops()):
+            num_hoisted += self._hoist_loop(
+                cfg, loop_info, loop, definition_blocks, constants)
+        self.num_hoisted += num_hoisted
+        return num_preheaders > 0 or num_hoisted > 0
+
+    def _hoist_loop(self, cfg, loop_info, loop, definition_blocks,
+                    constants):
+        preheader_index = loop_info.get_preheader(loop)
+        if preheader_index is None:
+            return 0
+
+        def is_invariant(instruction):
+            operator = instruction.get_opcode()
+            info = opcode.get_info(operator)
+            if (info.has_side_effect or info.is_terminator or
+                operator == BrilOperator.PHI or
+                instruction.get_destination() is None):
+                return False
+            if operator == BrilOperator.CONST:
+                return True
+            for arg in instruction.get_arguments():
+                block = definition_blocks.get(arg)
+                if block is not None and loop.contains(block):
+                    return False
+            if operator == BrilOperator.DIVIDE:
+                divisor = constants.get(instruction.get_arguments()[1])
+                return divisor is not None and divisor != 0
+            return True
+
+        hoisted = []
+        # in reverse postorder a definition is seen before its uses
+        for block in loop.get_blocks():
+            basic_block = cfg.get_block(block)
+            kept = []
+            for instruction in basic_block.get_instructions():
+                if not is_invariant(instruction):
+                    kept.append(instruction)
+                    continue
+                hoisted.append(instruction)
+                definition_blocks[instruction.get_destination()] = (
+                    preheader_index)
+            if len(kept) != len(basic_block.get_instructions()):
+                basic_block.transform_into(kept)
+        if not hoisted:
+            return 0
+
+        instructions = cfg.get_block(preheader_index).get_instructions()
+        if cfg.get_block(preheader_index).get_terminator() is None:
+            instructions.extend(hoisted)
+        else:
+            instructions[-1:-1] = hoisted
+        return len(hoisted)
+
+
+class LoopInvariantCodeMotionCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(construction.SSAConstructionPass())
+        self.add_pass(LoopInvariantCodeMotionPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
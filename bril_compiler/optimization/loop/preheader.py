@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import program
+from bril_compiler.constant import BrilOperator
+
+
+def insert_preheaders(function, cfg, loop_info):
+    """Give every loop of loop_info without a preheader a new, empty
+        one: the edges entering the header from outside the loop are
+        redirected to it and it falls through into the header. Returns
+        the number of blocks added; cfg and loop_info are stale if any.
+    """
+    preheaders = {}
+    for loop in loop_info.get_loops():
+        if loop_info.get_preheader(loop) is not None:
+            continue
+        preheaders[loop.get_header()] = _make_preheader(function, cfg, loop)
+    if not preheaders:
+        return 0
+
+    basic_blocks = []
+    for index, basic_block in enumerate(cfg.get_blocks()):
+        if index in preheaders:
+            basic_blocks.append(preheaders[index])
+        basic_blocks.append(basic_block)
+    function.set_basic_blocks(basic_blocks)
+    return len(preheaders)
+
+
+def _make_preheader(function, cfg, loop):
+    header = loop.get_header()
+    header_block = cfg.get_block(header)
+    target = cfg.get_name(header)
+    if header_block.get_label() is None:
+        header_block.set_label(ir.LabelInstruction(target))
+    preheader = program.BasicBlock()
+    preheader.set_label(ir.LabelInstruction(
+        function.get_fresh_label(f"{target}.preheader")))
+    label = preheader.get_label_name()
+    # get_fresh_label must see the labels taken so far
+    function.get_basic_blocks().append(preheader)
+
+    entering = []
+    for predecessor in cfg.get_predecessors(header):
+        predecessor_block = cfg.get_block(predecessor)
+        terminator = predecessor_block.get_terminator()
+        if loop.contains(predecessor):
+            # the preheader goes right before the header, in the way of a
+            # latch falling through into it
+            if terminator is None:
+                predecessor_block.add_instruction(ir.JumpInstruction(target))
+            continue
+        entering.append(cfg.get_name(predecessor))
+        if terminator is not None:
+            terminator.set_labels([
+                label if successor == target else successor
+                for successor in terminator.get_labels()
+            ])
+
+    for phi in header_block.get_instructions():
+        if phi.get_opcode() != BrilOperator.PHI:
+            break
+        _split_phi(function, phi, entering, preheader)
+    return preheader
+
+
+def _split_phi(function, phi, entering, preheader):
+    """Make the incoming values of the entering edges come from the
+        preheader, merged there by a phi if they differ.
+    """
+    incoming = [(label, phi.get_argument_for(label)) for label in entering
+                if phi.get_argument_for(label) is not None]
+    if not incoming:
+        return
+    for label, _ in incoming:
+        phi.remove_incoming(label)
+    arguments = set(argument for _, argument in incoming)
+    if len(arguments) == 1:
+        phi.set_incoming(preheader.get_label_name(), arguments.pop())
+        return
+    destination = function.get_fresh_name(f"{phi.get_destination()}.pre")
+    preheader.add_instruction(ir.PhiInstruction(
+        [argument for _, argument in incoming],
+        [label for label, _ in incoming],
+        destination, phi.get_type()))
+    phi.set_incoming(preheader.get_label_name(), destination)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir_builder
+from bril_compiler import opcode
+from bril_compiler.analysis import def_use
+from bril_compiler.analysis import ssa
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.loop import licm
+from bril_compiler.optimization.loop import preheader
+from bril_compiler.optimization.redundancy import dce
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class StrengthReductionPass(compiler_pass.BrilPass):
+    """Strength reduction of induction variables on SSA form.
+        A derived induction variable j = factor * i + offset gets a phi
+        of its own in the loop header. It starts at factor * i0 + offset
+        and is stepped by factor * step next to the update of i, both
+        computed in the preheader by replaying the operations deriving j
+        from i, so the muls in the loop become one add. The uses of j
+        read the new phi instead. Only variables computed in every
+        iteration and not merged by a phi of the loop are reduced, so
+        the add does not cost more than it saves. Induction variables
+        that are left feeding nothing but their own update are removed.
+        Functions that are not in SSA form are left alone.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
+    def __init__(self):
+        self.num_reduced = 0
+        self.num_eliminated = 0
+        self._ir_builder = ir_builder.IRBuilder()
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or not ssa.is_ssa(function):
+                continue
+            program_changed |= self.reduce(function)
+        return program_changed
+
+    def reduce(self, function):
+        cfg = self.get_analysis("cfg", function)
+        loop_info = self.get_analysis("loops", function)
+        if not loop_info.get_loops():
+            return False
+        if preheader.insert_preheaders(function, cfg, loop_info):
+            self.get_analysis_manager().invalidate(function)
+            cfg = self.get_analysis("cfg", function)
+            loop_info = self.get_analysis("loops", function)
+        dominator_tree = self.get_analysis("dominators", function)
+        induction_variables = self.get_analysis(
+            "induction_variables", function)
+
+        self._function = function
+        self._definition_blocks, definitions = def_use.get_definitions(cfg)
+        self._constants = def_use.get_constants(definitions)
+
+        # reduced variable -> the phi replacing it
+        replacements = {}
+        for loop in reversed(loop_info.get_loops()):
+            preheader_index = loop_info.get_preheader(loop)
+            if preheader_index is None:
+                continue
+            merged = self._get_merged(cfg, loop)
+            for derived in induction_variables.get_derived(loop):
+                if (not derived.is_scaled() or
+                    derived.get_basic().initial == construction.UNDEFINED):
+                    continue
+                # the new phi of a variable merged by a phi in the loop
+                # would be live next to its update, which costs copies
+                block = self._definition_blocks[derived.name]
+                if (derived.name in merged or
+                    not all(dominator_tree.dominates(block, latch)
+                            for latch in loop.get_latches())):
+                    continue
+                replacements[derived.name] = self._reduce(
+                    cfg, loop, preheader_index, derived)
+        if not replacements:
+            return False
+        self.num_reduced += len(replacements)
+
+        for basic_block in cfg.get_blocks():
+            kept = []
+            for instruction in basic_block.get_instructions():
+                if instruction.get_destination() in replacements:
+                    continue
+                kept.append(instruction)
+                if instruction.get_opcode() == BrilOperator.CONST:
+                    continue
+                arguments = instruction.get_arguments()
+                if any(arg in replacements for arg in arguments):
+                    instruction.set_arguments([
+                        replacements.get(arg, arg) for arg in arguments])
+            basic_block.transform_into(kept)
+
+        self._eliminate_dead_cycles(cfg, loop_info)
+        return True
+
+    def _reduce(self, cfg, loop, preheader_index, derived):
+        basic = derived.get_basic()
+        dest_type = derived.instruction.get_type()
+
+        # replay the chain from i0 for the start, and its products from
+        # the step of i for the step
+        initialization = []
+        start, step = basic.initial, basic.step
+        for link in derived.get_chain()[1:]:
+            start = self._emit(initialization, link.operator, start,
+                               link.invariant, dest_type)
+            if link.operator == BrilOperator.MULTIPLY:
+                step = self._emit(initialization, link.operator, step,
+                                  link.invariant, dest_type)
+        self._insert_before_terminator(
+            cfg.get_block(preheader_index), initialization)
+        if self._constants.get(step) == 0:
+            # the variable does not change in the loop
+            return start
+
+        # the new variable follows i around the loop
+        name = self._function.get_fresh_name(f"{derived.name}.sr")
+        update = self._function.get_fresh_name(f"{derived.name}.sr")
+        arguments = [start]
+        labels = [cfg.get_name(preheader_index)]
+        for label, argument in basic.phi.get_incoming():
+            predecessor = cfg.get_index_by_label(label)
+            if predecessor is not None and loop.contains(predecessor):
+                arguments.append(update)
+                labels.append(label)
+        phi = self._ir_builder.build_by_opcode(
+            BrilOperator.PHI, name, arguments + labels, dest_type)
+        header_block = cfg.get_block(loop.get_header())
+        instructions = header_block.get_instructions()
+        instructions.insert(instructions.index(basic.phi) + 1, phi)
+        self._insert_before_terminator(
+            cfg.get_block(self._definition_blocks[basic.update]),
+            [self._ir_builder.build_by_opcode(
+                basic.step_operator, update, [name, step], dest_type)])
+        return name
+
+    def _get_merged(self, cfg, loop):
+        """The variables read by the phis of the loop"""
+        merged = set()
+        for block in loop.get_blocks():
+            for phi in cfg.get_block(block).get_instructions():
+                if phi.get_opcode() != BrilOperator.PHI:
+                    break
+                merged.update(phi.get_arguments())
+        return merged
+
+    def _emit(self, instructions, operator, operand0, operand1, dest_type):
+        """The variable holding operand0 operator operand1, folded into a
+            const when both operands are constants
+        """
+        destination = self._function.get_fresh_name("sr")
+        constant0 = self._constants.get(operand0)
+        constant1 = self._constants.get(operand1)
+        value = None
+        if constant0 is not None and constant1 is not None:
+            value = opcode.fold(operator, [constant0, constant1])
+        if value is None:
+            instructions.append(self._ir_builder.build_by_opcode(
+                operator, destination, [operand0, operand1], dest_type))
+            return destination
+        instructions.append(self._ir_builder.build_by_opcode(
+            BrilOperator.CONST, destination, [value], dest_type))
+        self._constants[destination] = value
+        return destination
+
+    def _insert_before_terminator(self, basic_block, new_instructions):
+        instructions = basic_block.get_instructions()
+        if basic_block.get_terminator() is None:
+            instructions.extend(new_instructions)
+        else:
+            instructions[-1:-1] = new_instructions
+
+    def _eliminate_dead_cycles(self, cfg, loop_info):
+        """Remove the header phis only read by their own update, along
+            with the update
+        """
+        eliminated = True
+        while eliminated:
+            eliminated = False
+            users = {}
+            definitions = {}
+            for basic_block in cfg.get_blocks():
+                for instruction in basic_block.get_instructions():
+                    destination = instruction.get_destination()
+                    if destination is not None:
+                        definitions[destination] = instruction
+                    if instruction.get_opcode() == BrilOperator.CONST:
+                        continue
+                    for arg in instruction.get_arguments():
+                        users.setdefault(arg, set()).add(instruction)
+
+            for loop in loop_info.get_loops():
+                header_block = cfg.get_block(loop.get_header())
+                for phi in header_block.get_instructions():
+                    if phi.get_opcode() != BrilOperator.PHI:
+                        break
+                    update = self._get_dead_update(
+                        cfg, loop, phi, users, definitions)
+                    if update is None:
+                        continue
+                    for basic_block in cfg.get_blocks():
+                        instructions = basic_block.get_instructions()
+                        if phi in instructions or update in instructions:
+                            basic_block.transform_into([
+                                instruction for instruction in instructions
+                                if instruction is not phi and
+                                instruction is not update])
+                    self.num_eliminated += 1
+                    eliminated = True
+                    break
+                if eliminated:
+                    break
+
+    def _get_dead_update(self, cfg, loop, phi, users, definitions):
+        updates = set()
+        for label, argument in phi.get_incoming():
+            predecessor = cfg.get_index_by_label(label)
+            if predecessor is not None and loop.contains(predecessor):
+                updates.add(argument)
+        if len(updates) != 1:
+            return None
+        update = definitions.get(updates.pop())
+        if (update is None or update is phi or
+            opcode.has_side_effect(update.get_opcode())):
+            return None
+        if (users.get(phi.get_destination(), set()) - {update} or
+            users.get(update.get_destination(), set()) - {phi}):
+            return None
+        return update
+
+
+class StrengthReductionCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(construction.SSAConstructionPass())
+        # a factor computed in the loop is only invariant once hoisted
+        self.add_pass(licm.LoopInvariantCodeMotionPass())
+        self.add_pass(StrengthReductionPass())
+        # the set-up code left in the preheader of an inner loop may be
+        # invariant in the outer one
+        self.add_pass(licm.LoopInvariantCodeMotionPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import ir_builder
+from bril_compiler import program
+from bril_compiler.analysis import ssa
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.constant import sccp
+from bril_compiler.optimization.loop import licm
+from bril_compiler.optimization.loop import preheader
+from bril_compiler.optimization.redundancy import dce
+from bril_compiler.optimization.redundancy import gvn
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class LoopUnrollingPass(compiler_pass.BrilPass):
+    """Unrolling of innermost loops with a constant trip count, on SSA
+        form.
+        A loop whose copies fit in full_unroll_size instructions is
+        replaced by one copy of its body per iteration. A larger one
+        keeps its header and gets factor - 1 more copies of the body
+        between its latch and its header, so the exit test runs once
+        every factor iterations; the trip count modulo factor
+        iterations are peeled off in front of the loop, so the copies
+        never need a test of their own. The header tests of the copies
+        are known to go on and become fall-throughs, as do the jumps
+        from one copy to the next.
+        A function may grow by size_budget instructions at most.
+        factor, full_unroll_size and size_budget are set from the
+        command line with --unroll-factor, --unroll-full-size and
+        --unroll-size-budget, for both unroll and unroll-only.
+        num_dynamic_instructions_saved counts the executions of exit
+        tests and jumps the unrolling removes. Functions that are not in
+        SSA form are left alone.
+    """
+    PRESERVED_ANALYSES = ()
+    DEFAULT_FACTOR = 4
+    FULL_UNROLL_SIZE = 128
+    SIZE_BUDGET = 512
+
+    def __init__(self, factor=DEFAULT_FACTOR,
+                 full_unroll_size=FULL_UNROLL_SIZE,
+                 size_budget=SIZE_BUDGET):
+        self._factor = factor
+        self._full_unroll_size = full_unroll_size
+        self._size_budget = size_budget
+        self.num_fully_unrolled = 0
+        self.num_partially_unrolled = 0
+        self.num_dynamic_instructions_saved = 0
+        self._ir_builder = ir_builder.IRBuilder()
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or not ssa.is_ssa(function):
+                continue
+            program_changed |= self.unroll(function)
+        return program_changed
+
+    def unroll(self, function):
+        analysis_manager = self.get_analysis_manager()
+        budget = self._size_budget
+        # headers of the loops already looked at
+        visited = set()
+        program_changed = False
+        while True:
+            cfg = self.get_analysis("cfg", function)
+            loop_info = self.get_analysis("loops", function)
+            if preheader.insert_preheaders(function, cfg, loop_info):
+                analysis_manager.invalidate(function)
+                program_changed = True
+                continue
+            trip_counts = self.get_analysis("trip_counts", function)
+
+            unrolled = False
+            for loop in reversed(loop_info.get_loops()):
+                header_name = cfg.get_name(loop.get_header())
+                if loop.get_children() or header_name in visited:
+                    continue
+                visited.add(header_name)
+                trip_count = trip_counts.get_trip_count(loop)
+                if trip_count is None or len(loop.get_latches()) != 1:
+                    continue
+                size = sum(len(cfg.get_block(block).get_instructions())
+                           for block in loop.get_blocks())
+                factor = self._choose_factor(trip_count.count, size, budget)
+                if factor is None:
+                    continue
+                unroller = _Unroller(function, cfg, loop_info, trip_count,
+                                     self._ir_builder)
+                if factor == 0:
+                    budget -= unroller.unroll_fully()
+                    self.num_fully_unrolled += 1
+                else:
+                    budget -= unroller.unroll_partially(factor)
+                    self.num_partially_unrolled += 1
+                self.num_dynamic_instructions_saved += unroller.num_saved
+                unrolled = True
+                break
+            if not unrolled:
+                return program_changed
+            analysis_manager.invalidate(function)
+            program_changed = True
+
+    def _choose_factor(self, count, size, budget):
+        """0 to unroll fully, the factor to unroll by, or None"""
+        if count * size <= min(self._full_unroll_size, budget):
+            return 0
+        factor = self._factor
+        # the peeled iterations and the new copies of the body
+        while factor >= 2 and (count % factor + factor - 1) * size > budget:
+            factor -= 1
+        if factor < 2 or count < factor:
+            return None
+        return factor
+
+
+class _Unroller:
+    """Makes copies of the iterations of one loop. A copy has a block for
+        every block of the loop, and a fresh name for every variable the
+        loop defines; the header phis are replaced by the values they
+        take in the iteration.
+    """
+    def __init__(self, function, cfg, loop_info, trip_count, builder):
+        self._function = function
+        self._cfg = cfg
+        self._loop = trip_count.loop
+        self._trip_count = trip_count
+        self._ir_builder = builder
+        self._labels = set(cfg.get_names())
+        self.num_saved = 0
+
+        loop = self._loop
+        self._header = loop.get_header()
+        self._header_name = cfg.get_name(self._header)
+        self._latch = loop.get_latches()[0]
+        self._preheader = loop_info.get_preheader(loop)
+        # copied blocks -> how many times they run, for num_saved
+        self._executions = {}
+        # a copied exit test is dead unless the loop reads it elsewhere
+        condition = trip_count.compare.get_destination()
+        self._is_test_dead = not any(
+            condition in instruction.get_arguments()
+            for block in loop.get_blocks()
+            for instruction in cfg.get_block(block).get_instructions()
+            if instruction.get_opcode() != BrilOperator.CONST and
+            instruction.get_opcode() != BrilOperator.BR)
+        self._make_jumps_explicit(
+            list(loop.get_blocks()) + [self._preheader])
+        self._phis = []
+        for instruction in cfg.get_block(self._header).get_instructions():
+            if instruction.get_opcode() != BrilOperator.PHI:
+                break
+            self._phis.append(instruction)
+
+    def unroll_fully(self):
+        """Returns the number of instructions added"""
+        cfg = self._cfg
+        count = self._trip_count.count
+        entering_label, values, copies = self._peel(count)
+
+        header_block = cfg.get_block(self._header)
+        for phi in self._phis:
+            for label in phi.get_incoming_labels():
+                phi.remove_incoming(label)
+            phi.set_incoming(entering_label, values[phi.get_destination()])
+        instructions = header_block.get_instructions()
+        instructions[-1] = ir.JumpInstruction(
+            cfg.get_name(self._trip_count.exit))
+        self._executions[header_block] = 1
+
+        basic_blocks = []
+        for index, basic_block in enumerate(cfg.get_blocks()):
+            if index != self._header and self._loop.contains(index):
+                continue
+            basic_blocks.append(basic_block)
+            if index == self._preheader:
+                basic_blocks.extend(copies)
+        self._finish(basic_blocks)
+        return self._get_size(copies) - self._get_size(
+            cfg.get_block(block) for block in self._loop.get_blocks()
+            if block != self._header)
+
+    def unroll_partially(self, factor):
+        """Returns the number of instructions added"""
+        cfg = self._cfg
+        count = self._trip_count.count
+        entering_label, values, peeled = self._peel(count % factor)
+        preheader_name = cfg.get_name(self._preheader)
+        for phi in self._phis:
+            argument = values[phi.get_destination()]
+            phi.remove_incoming(preheader_name)
+            phi.set_incoming(entering_label, argument)
+
+        # the copies of the body follow the latch around the loop
+        latch_name = cfg.get_name(self._latch)
+        values = {phi.get_destination(): phi.get_argument_for(latch_name)
+                  for phi in self._phis}
+        executions = count // factor
+        copies = []
+        last_latch = cfg.get_block(self._latch)
+        self._executions[last_latch] = executions
+        # copy the latch before it is retargeted
+        iterations = []
+        for _ in range(factor - 1):
+            blocks, latch_block, values = self._copy_iteration(
+                values, executions)
+            iterations.append((blocks, latch_block))
+        for blocks, latch_block in iterations:
+            self._retarget(last_latch, blocks[0].get_label_name())
+            copies.extend(blocks)
+            last_latch = latch_block
+        for phi in self._phis:
+            phi.remove_incoming(latch_name)
+            phi.set_incoming(last_latch.get_label_name(),
+                             values[phi.get_destination()])
+
+        basic_blocks = []
+        for index, basic_block in enumerate(cfg.get_blocks()):
+            basic_blocks.append(basic_block)
+            if index == self._preheader:
+                basic_blocks.extend(peeled)
+            if index == self._latch:
+                basic_blocks.extend(copies)
+        self._finish(basic_blocks)
+        return self._get_size(peeled) + self._get_size(copies)
+
+    def _peel(self, count):
+        """count copies of the iteration, chained after the preheader.
+            Returns the label of the last block, the values of the header
+            phis after the copies and the copied blocks.
+        """
+        cfg = self._cfg
+        last_block = cfg.get_block(self._preheader)
+        values = {}
+        for phi in self._phis:
+            values[phi.get_destination()] = phi.get_argument_for(
+                cfg.get_name(self._preheader))
+        copies = []
+        for _ in range(count):
+            blocks, latch_block, values = self._copy_iteration(values, 1)
+            self._retarget(last_block, blocks[0].get_label_name())
+            copies.extend(blocks)
+            last_block = latch_block
+        return last_block.get_label_name(), values, copies
+
+    def _copy_iteration(self, values, executions):
+        """values are the values of the header phis in the iteration.
+            Returns the blocks of the copy, header first, its latch and the
+            values of the header phis in the next iteration. The latch of
+            the copy jumps back to the header.
+        """
+        cfg = self._cfg
+        loop = self._loop
+        names = dict(values)
+        labels = {}
+        for block in loop.get_blocks():
+            labels[cfg.get_name(block)] = self._fresh_label(
+                f"{cfg.get_name(block)}.unroll")
+            for instruction in cfg.get_block(block).get_instructions():
+                destination = instruction.get_destination()
+                if destination is not None and destination not in names:
+                    names[destination] = self._function.get_fresh_name(
+                        f"{destination}.unroll")
+
+        def map_label(label):
+            if label == self._header_name:
+                return label
+            return labels.get(label, label)
+
+        blocks = []
+        latch_block = None
+        for block in loop.get_blocks():
+            basic_block = program.BasicBlock()
+            basic_block.set_label(
+                ir.LabelInstruction(labels[cfg.get_name(block)]))
+            for instruction in cfg.get_block(block).get_instructions():
+                operator = instruction.get_opcode()
+                if block == self._header and operator == BrilOperator.PHI:
+                    continue
+                if (block == self._header and
+                    instruction is cfg.get_block(block).get_terminator()):
+                    # the iteration is known to go on
+                    basic_block.add_instruction(ir.JumpInstruction(
+                        map_label(cfg.get_name(self._trip_count.body))))
+                    if self._is_test_dead:
+                        self.num_saved += executions
+                    continue
+                basic_block.add_instruction(
+                    self._copy_instruction(instruction, names, map_label))
+            if block == self._header or block == self._latch:
+                self._executions[basic_block] = executions
+            if block == self._latch:
+                latch_block = basic_block
+            blocks.append(basic_block)
+
+        latch_name = cfg.get_name(self._latch)
+        next_values = {}
+        for phi in self._phis:
+            argument = phi.get_argument_for(latch_name)
+            next_values[phi.get_destination()] = names.get(argument, argument)
+        return blocks, latch_block, next_values
+
+    def _copy_instruction(self, instruction, names, map_label):
+        operator = instruction.get_opcode()
+        destination = instruction.get_destination()
+        if destination is not None:
+            destination = names[destination]
+        if operator == BrilOperator.CONST:
+            uses = [instruction.get_value()]
+        else:
+            uses = [names.get(arg, arg) for arg in instruction.get_arguments()]
+            if operator == BrilOperator.PHI:
+                uses += [map_label(label)
+                         for label in instruction.get_incoming_labels()]
+            else:
+                uses += [map_label(label)
+                         for label in instruction.get_labels()]
+                uses += instruction.get_functions()
+        return self._ir_builder.build_by_opcode(
+            operator, destination, uses, instruction.get_type())
+
+    def _make_jumps_explicit(self, blocks):
+        """Blocks are about to be copied or moved, so every block falling
+            through into the next one jumps to it instead
+        """
+        cfg = self._cfg
+        for block in blocks:
+            basic_block = cfg.get_block(block)
+            if basic_block.get_terminator() is not None:
+                continue
+            successor = cfg.get_successors(block)[0]
+            successor_block = cfg.get_block(successor)
+            if successor_block.get_label() is None:
+                successor_block.set_label(
+                    ir.LabelInstruction(cfg.get_name(successor)))
+            basic_block.add_instruction(
+                ir.JumpInstruction(cfg.get_name(successor)))
+
+    def _retarget(self, basic_block, label):
+        """Make the jump of basic_block to the header go to label"""
+        terminator = basic_block.get_terminator()
+        terminator.set_labels([
+            label if target == self._header_name else target
+            for target in terminator.get_labels()])
+
+    def _finish(self, basic_blocks):
+        """Lay the blocks out and drop the jumps to the next block"""
+        for basic_block, next_block in zip(basic_blocks, basic_blocks[1:]):
+            terminator = basic_block.get_terminator()
+            if (terminator is None or
+                terminator.get_opcode() != BrilOperator.JMP or
+                terminator.get_labels()[0] != next_block.get_label_name()):
+                continue
+            self.num_saved += self._executions.get(basic_block, 0)
+            basic_block.get_instructions().pop()
+        self._function.set_basic_blocks(basic_blocks)
+
+    def _get_size(self, basic_blocks):
+        return sum(len(basic_block.get_instructions())
+                   for basic_block in basic_blocks)
+
+    def _fresh_label(self, prefix):
+        index = 1
+        while f"{prefix}{index}" in self._labels:
+            index += 1
+        label = f"{prefix}{index}"
+        self._labels.add(label)
+        return label
+
+
+class LoopUnrollingCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self, factor=LoopUnrollingPass.DEFAULT_FACTOR,
+                 full_unroll_size=LoopUnrollingPass.FULL_UNROLL_SIZE,
+                 size_budget=LoopUnrollingPass.SIZE_BUDGET):
+        super().__init__()
+        self.add_pass(construction.SSAConstructionPass())
+        # a step or bound computed in the loop is only known once hoisted
+        self.add_pass(licm.LoopInvariantCodeMotionPass())
+        self.add_pass(LoopUnrollingPass(factor, full_unroll_size,
+                                        size_budget))
+        # fold the tests and the induction variable arithmetic of the
+        # copies, then number the straight-line code they form
+        self.add_pass(sccp.SparseConditionalConstantPropagationPass())
+        self.add_pass(gvn.GlobalValueNumberingPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import opcode
+from bril_compiler.analysis import dominance
+from bril_compiler.analysis import ssa
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.control_flow import simplify
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class AggressiveDeadCodeEliminationPass(compiler_pass.BrilPass):
+    """Aggressive dead code elimination (Cytron et al.) on SSA form.
+        Instead of removing what is provably dead, it keeps only what is
+        provably useful: instructions with side effects, the definitions
+        they read and the branches deciding whether they run, i.e. the
+        blocks in the reverse dominance frontier of a useful block. A
+        useful phi also needs the branches choosing its incoming edge.
+        Everything else is deleted, and a useless branch becomes a jump
+        to the nearest useful post-dominator of its block, which removes
+        the blocks it was choosing between.
+        The branches closing a loop are kept, so a loop that may not
+        terminate is never deleted. Functions that are not in SSA form
+        are left alone.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_removed = 0
+        self.num_branches_removed = 0
+        self.num_blocks_removed = 0
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or not ssa.is_ssa(function):
+                continue
+            program_changed |= self.eliminate(function)
+        return program_changed
+
+    def eliminate(self, function):
+        cfg = self.get_analysis("cfg", function)
+        post_dominator_tree = _build_post_dominator_tree(cfg)
+        marker = _Marker(cfg, post_dominator_tree)
+        marker.mark_roots()
+
+        # a branch is only replaced by a jump to a useful block without
+        # phis, which could not tell the new edge apart
+        while True:
+            marker.propagate()
+            targets = {}
+            for block in cfg.get_reverse_postorder():
+                terminator = cfg.get_block(block).get_terminator()
+                if (terminator is None or
+                    terminator.get_opcode() != BrilOperator.BR or
+                    marker.is_live(terminator)):
+                    continue
+                target = marker.get_useful_post_dominator(block)
+                if target is None or marker.has_live_phi(target):
+                    marker.mark_instruction(block, terminator)
+                else:
+                    targets[block] = target
+            if not marker.has_work():
+                break
+
+        num_removed = 0
+        basic_blocks = []
+        for block, basic_block in enumerate(cfg.get_blocks()):
+            if not cfg.is_reachable(block):
+                continue
+            basic_blocks.append(basic_block)
+            instructions = []
+            for instruction in basic_block.get_instructions():
+                if block in targets and instruction.is_terminator():
+                    target_block = cfg.get_block(targets[block])
+                    if target_block.get_label() is None:
+                        target_block.set_label(ir.LabelInstruction(
+                            cfg.get_name(targets[block])))
+                    instructions.append(ir.JumpInstruction(
+                        cfg.get_name(targets[block])))
+                    self.num_branches_removed += 1
+                elif (marker.is_live(instruction) or
+                      instruction.get_opcode() == BrilOperator.JMP):
+                    instructions.append(instruction)
+                else:
+                    num_removed += 1
+            basic_block.transform_into(instructions)
+        self.num_removed += num_removed
+        if not num_removed and not targets:
+            return False
+        function.set_basic_blocks(basic_blocks)
+        # the blocks the removed branches led to
+        self.num_blocks_removed += simplify.remove_unreachable_blocks(
+            function)
+        return True
+
+
+def _build_post_dominator_tree(cfg):
+    """Post-dominators of cfg, rooted at a virtual exit numbered
+        cfg.get_number_of_blocks(). The exits lead to it, and so do the
+        blocks that reach no exit, which only makes more blocks control
+        dependent on a branch.
+    """
+    num_blocks = cfg.get_number_of_blocks()
+    virtual_exit = num_blocks
+    # the edges of the reversed graph
+    successors = [[predecessor for predecessor in
+                   cfg.get_predecessors(block)
+                   if cfg.is_reachable(predecessor)]
+                  for block in range(num_blocks)]
+    predecessors = [list(cfg.get_successors(block))
+                    for block in range(num_blocks)]
+    successors.append(list(cfg.get_exits()))
+    predecessors.append([])
+    for block in cfg.get_exits():
+        predecessors[block].append(virtual_exit)
+
+    while True:
+        postorder = _get_postorder(virtual_exit, successors)
+        reached = set(postorder)
+        unreached = [block for block in cfg.get_reverse_postorder()
+                     if block not in reached]
+        if not unreached:
+            break
+        # the last block of an endless region in reverse postorder is
+        # usually where it loops back
+        block = unreached[-1]
+        successors[virtual_exit].append(block)
+        predecessors[block].append(virtual_exit)
+    postorder.reverse()
+    return dominance.DominatorTree(num_blocks + 1, virtual_exit,
+                                   predecessors, postorder)
+
+
+def _get_postorder(root, successors):
+    postorder = []
+    visited = set([root])
+    stack = [(root, iter(successors[root]))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if child not in visited:
+                visited.add(child)
+                stack.append((child, iter(successors[child])))
+                break
+        else:
+            stack.pop()
+            postorder.append(node)
+    return postorder
+
+
+class _Marker:
+    """Marks the useful instructions and blocks of a function in SSA
+        form
+    """
+    def __init__(self, cfg, post_dominator_tree):
+        self._cfg = cfg
+        self._post_dominator_tree = post_dominator_tree
+        self._virtual_exit = cfg.get_number_of_blocks()
+        self._definitions = {}
+        for block, basic_block in enumerate(cfg.get_blocks()):
+            for instruction in basic_block.get_instructions():
+                destination = instruction.get_destination()
+                if destination is not None:
+                    self._definitions[destination] = (block, instruction)
+        self._live_instructions = set()
+        self._live_blocks = [False] * cfg.get_number_of_blocks()
+        self._worklist = []
+
+    def mark_roots(self):
+        cfg = self._cfg
+        order = {block: position for position, block in
+                 enumerate(cfg.get_reverse_postorder())}
+        for block in cfg.get_reverse_postorder():
+            basic_block = cfg.get_block(block)
+            for instruction in basic_block.get_instructions():
+                if opcode.has_side_effect(instruction.get_opcode()):
+                    self.mark_instruction(block, instruction)
+            # exits are useful, so every block has a useful post-dominator
+            if not cfg.get_successors(block):
+                self.mark_block(block)
+            for successor in cfg.get_successors(block):
+                if order[successor] <= order[block]:
+                    # closes a loop
+                    self.mark_block(block)
+                    terminator = basic_block.get_terminator()
+                    if (terminator is not None and
+                        terminator.get_opcode() == BrilOperator.BR):
+                        self.mark_instruction(block, terminator)
+
+    def is_live(self, instruction):
+        return instruction in self._live_instructions
+
+    def has_work(self):
+        return bool(self._worklist)
+
+    def has_live_phi(self, block):
+        for instruction in self._cfg.get_block(block).get_instructions():
+            if instruction.get_opcode() != BrilOperator.PHI:
+                break
+            if self.is_live(instruction):
+                return True
+        return False
+
+    def get_useful_post_dominator(self, block):
+        """The nearest useful strict post-dominator of block, None if it
+            is the virtual exit
+        """
+        tree = self._post_dominator_tree
+        node = tree.get_immediate_dominator(block)
+        while node is not None and node != self._virtual_exit:
+            if self._live_blocks[node]:
+                return node
+            node = tree.get_immediate_dominator(node)
+        return None
+
+    def mark_instruction(self, block, instruction):
+        if instruction in self._live_instructions:
+            return
+        self._live_instructions.add(instruction)
+        self._worklist.append((block, instruction))
+        self.mark_block(block)
+
+    def mark_block(self, block):
+        if self._live_blocks[block]:
+            return
+        self._live_blocks[block] = True
+        # the branches deciding whether block runs
+        for controller in self._post_dominator_tree.get_dominance_frontier(
+                block):
+            if controller == self._virtual_exit:
+                continue
+            self._mark_terminator(controller)
+
+    def _mark_terminator(self, block):
+        terminator = self._cfg.get_block(block).get_terminator()
+        if (terminator is not None and
+            terminator.get_opcode() == BrilOperator.BR):
+            self.mark_instruction(block, terminator)
+
+    def _mark_definition(self, name):
+        definition = self._definitions.get(name)
+        # arguments and undefined values have no definition
+        if definition is not None:
+            self.mark_instruction(*definition)
+
+    def propagate(self):
+        while self._worklist:
+            block, instruction = self._worklist.pop()
+            operator = instruction.get_opcode()
+            if operator == BrilOperator.CONST:
+                continue
+            if operator == BrilOperator.PHI:
+                for label, arg in instruction.get_incoming():
+                    self._mark_definition(arg)
+                    predecessor = self._cfg.get_index_by_label(label)
+                    if predecessor is not None:
+                        self.mark_block(predecessor)
+                        self._mark_terminator(predecessor)
+                continue
+            for arg in instruction.get_arguments():
+                self._mark_definition(arg)
+
+
+class AggressiveDeadCodeEliminationCompositePass(
+        compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(construction.SSAConstructionPass())
+        self.add_pass(AggressiveDeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
+        self.add_pass(simplify.ControlFlowSimplificationPass())
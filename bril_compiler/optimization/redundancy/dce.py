@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+from bril_compiler import opcode
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+
+class DeadCodeEliminationPass(compiler_pass.BrilPass):
+    """Global dead code elimination driven by live variables.
+        A definition without side effects is removed when its variable is
+        not live right after it, on any path. Removing code can only
+        shrink the live-in set of its block, so just the predecessors of
+        the blocks whose live-in changed are revisited.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
+    def __init__(self):
+        self.num_removed = 0
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            program_changed |= self.eliminate(function)
+        return program_changed
+
+    def eliminate(self, function):
+        cfg = self.get_analysis("cfg", function)
+        live_variables = self.get_analysis("liveness", function)
+        get_id = function.get_symbol_table().get_id
+        num_blocks = cfg.get_number_of_blocks()
+        name_to_index = {name: i for i, name in enumerate(cfg.get_names())}
+
+        live_in = [live_variables.get_live_in(block)
+                   for block in range(num_blocks)]
+        # phi_uses[block][predecessor]: phi arguments of block read on
+        # the edge from predecessor
+        phi_uses = [self._phi_uses(cfg.get_block(block), get_id,
+                                   name_to_index)
+                    for block in range(num_blocks)]
+
+        num_removed = 0
+        worklist = list(range(num_blocks))
+        in_worklist = [True] * num_blocks
+        while worklist:
+            block = worklist.pop()
+            in_worklist[block] = False
+            live = 0
+            for successor in cfg.get_successors(block):
+                live |= live_in[successor]
+                live |= phi_uses[successor].get(block, 0)
+
+            basic_block = cfg.get_block(block)
+            kept = []
+            for instruction in reversed(basic_block.get_instructions()):
+                operator = instruction.get_opcode()
+                destination = instruction.get_destination()
+                if destination is not None:
+                    bit = 1 << get_id(destination)
+                    if (not live & bit and
+                        not opcode.has_side_effect(operator)):
+                        num_removed += 1
+                        continue
+                    live &= ~bit
+                kept.append(instruction)
+                if (operator == BrilOperator.PHI or
+                    operator == BrilOperator.CONST):
+                    continue
+                for arg in instruction.get_arguments():
+                    live |= 1 << get_id(arg)
+
+            phis_changed = False
+            if len(kept) != len(basic_block.get_instructions()):
+                kept.reverse()
+                basic_block.transform_into(kept)
+                if phi_uses[block]:
+                    # a removed phi changes what the predecessors have to
+                    # keep alive even when the live-in set stays the same
+                    new_phi_uses = self._phi_uses(
+                        basic_block, get_id, name_to_index)
+                    phis_changed = new_phi_uses != phi_uses[block]
+                    phi_uses[block] = new_phi_uses
+            if live == live_in[block] and not phis_changed:
+                continue
+            live_in[block] = live
+            for predecessor in cfg.get_predecessors(block):
+                if not in_worklist[predecessor]:
+                    in_worklist[predecessor] = True
+                    worklist.append(predecessor)
+
+        self.num_removed += num_removed
+        return num_removed > 0
+
+    def _phi_uses(self, basic_block, get_id, name_to_index):
+        phi_uses = {}
+        for instruction in basic_block.get_instructions():
+            if instruction.get_opcode() != BrilOperator.PHI:
+                break
+            for label, arg in instruction.get_incoming():
+                predecessor = name_to_index.get(label)
+                if predecessor is not None:
+                    phi_uses[predecessor] = (
+                        phi_uses.get(predecessor, 0) | 1 << get_id(arg))
+        return phi_uses
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+from bril_compiler.analysis import ssa
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.redundancy import dce
+from bril_compiler.optimization.redundancy.numbering import agent
+from bril_compiler.optimization.redundancy.numbering import extensions
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class GlobalValueNumberingPass(compiler_pass.BrilPass):
+    """Dominator-based value numbering on SSA form.
+        The blocks are numbered in a preorder walk of the dominator tree
+        with a single scoped numbering table, so a block reuses the
+        values of all its dominators, and the entries of a subtree are
+        undone when the walk leaves it. Every SSA name is defined once,
+        hence a value stays available wherever its block dominates.
+        Functions that are not in SSA form are left alone.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
+    def __init__(self):
+        self.num_block_processed = 0
+        self._extensions = [
+            extensions.ConstantPropagationExtension(),
+            extensions.ReassociationExtension(),
+            extensions.AlgebraicIdentityExtension(),
+            extensions.CommutativityExtension(),
+            extensions.IdentityPropagationExtension(),
+            extensions.IdentityToConstantInstructionExtension(),
+        ]
+
+    def optimize(self, module):
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or not ssa.is_ssa(function):
+                continue
+            self.number(function)
+        return True
+
+    def number(self, function):
+        cfg = self.get_analysis("cfg", function)
+        dominator_tree = self.get_analysis("dominators", function)
+        gvn_agent = agent.NumberingScopedAgent(self._extensions)
+        # (block, True) leaves the block after its subtree is done
+        stack = [(dominator_tree.get_root(), False)]
+        while stack:
+            block, leaving = stack.pop()
+            if leaving:
+                gvn_agent.leave()
+                continue
+            gvn_agent.enter(cfg.get_block(block))
+            self.num_block_processed += 1
+            stack.append((block, True))
+            for child in reversed(dominator_tree.get_children(block)):
+                stack.append((child, False))
+        gvn_agent.retire()
+
+
+class GlobalValueNumberingCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(construction.SSAConstructionPass())
+        self.add_pass(GlobalValueNumberingPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
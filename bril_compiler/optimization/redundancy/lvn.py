@@ -8,6 +8,8 @@ from bril_compiler.optimization.redundancy.numbering import agent
 from bril_compiler.optimization.redundancy.numbering import extensions
 
 class LocalValueNumberingOldPass(compiler_pass.BrilPass):
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
     def __init__(self):
         self.num_block_processed = 0
 
@@ -20,21 +22,69 @@ class LocalValueNumberingOldPass(compiler_pass.BrilPass):
                 # lvn_table.show_table()
 
 class LocalValueNumberingPass(compiler_pass.BrilPass):
-    def __init__(self):
+    """With extended_basic_blocks, a block with a single predecessor is
+        numbered in the scope of that predecessor, so every extended
+        basic block (a tree of such blocks) is numbered in one walk.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
+    def __init__(self, extended_basic_blocks=False):
         self.num_block_processed = 0
+        self._extended_basic_blocks = extended_basic_blocks
         self._extensions = [
+            extensions.ReassociationExtension(),
+            extensions.AlgebraicIdentityExtension(),
             extensions.CommutativityExtension(),
             extensions.IdentityPropagationExtension(),
         ]
 
     def optimize(self, module):
         for function in module.get_functions():
+            if self._extended_basic_blocks:
+                self.number_extended_basic_blocks(function)
+                continue
             for basic_block in function.get_basic_blocks():
                 lvn_agent = agent.NumberingLocalAgent(self._extensions)
                 lvn_agent.reform(basic_block)
                 lvn_agent.retire()
                 self.num_block_processed += 1
 
+    def number_extended_basic_blocks(self, function):
+        if not function.get_basic_blocks():
+            return
+        cfg = self.get_analysis("cfg", function)
+        entry = cfg.get_entry()
+
+        def is_root(block):
+            return (block == entry or
+                    len(cfg.get_predecessors(block)) != 1)
+
+        ebb_agent = agent.NumberingScopedAgent(self._extensions)
+        visited = [False] * cfg.get_number_of_blocks()
+        # the blocks left after the roots only sit on unreachable cycles
+        # of single-predecessor blocks
+        roots = [block for block in range(cfg.get_number_of_blocks())
+                 if is_root(block)]
+        roots += range(cfg.get_number_of_blocks())
+        for root in roots:
+            if visited[root]:
+                continue
+            # (block, True) leaves the block after its subtree is done
+            stack = [(root, False)]
+            while stack:
+                block, leaving = stack.pop()
+                if leaving:
+                    ebb_agent.leave()
+                    continue
+                visited[block] = True
+                ebb_agent.enter(cfg.get_block(block))
+                self.num_block_processed += 1
+                stack.append((block, True))
+                for successor in reversed(cfg.get_successors(block)):
+                    if not visited[successor] and not is_root(successor):
+                        stack.append((successor, False))
+        ebb_agent.retire()
+
 
 class LocalValueNumberingCompositePass(compiler_pass.BrilCompositePass):
     def __init__(self):
@@ -43,7 +93,16 @@ class LocalValueNumberingCompositePass(compiler_pass.BrilCompositePass):
         self.add_pass(tdce.TrivilDeadCodeEliminationPass())
 
 
+class ExtendedValueNumberingCompositePass(compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(LocalValueNumberingPass(extended_basic_blocks=True))
+        self.add_pass(tdce.TrivilDeadCodeEliminationPass())
+
+
 class NumberingConstantPropagationPass(compiler_pass.BrilPass):
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
     def __init__(self):
         self._extensions = [
             extensions.ConstantPropagationExtension(),
@@ -3,6 +3,7 @@
 from bril_compiler import ir
 from bril_compiler import ir_builder
 from bril_compiler import program
+from bril_compiler.constant import BrilOperator
 from bril_compiler.optimization.redundancy.numbering import base
 from bril_compiler.optimization.redundancy.numbering import table
 
@@ -10,15 +11,36 @@ from bril_compiler.optimization.redundancy.numbering import table
 class NumberingLocalAgent:
     def __init__(self, extensions):
 
-        self._lvn_table = table.NumberingTable(extensions)
+        self._lvn_table = table.NumberingTable(extensions, self._can_rename)
         self._extensions = extensions
         self._ir_builder = ir_builder.IRBuilder()
+        # the block being rebuilt
+        self._new_block = []
 
     def reform(self, basic_block):
         """main function"""
-        new_block = []
-        for instruction in basic_block.get_instructions():
-            identifier = self._lvn_table.add_entry(instruction)
+        self._number_block(basic_block)
+
+    def _number_block(self, basic_block):
+        instructions = basic_block.get_instructions()
+        # overwritten[i]: the destination of instruction i is assigned
+        # again later in the block
+        overwritten = [False] * len(instructions)
+        assigned_later = set()
+        for i in range(len(instructions) - 1, -1, -1):
+            destination = instructions[i].get_destination()
+            if destination is None:
+                continue
+            overwritten[i] = destination in assigned_later
+            assigned_later.add(destination)
+
+        new_block = self._new_block = []
+        for i, instruction in enumerate(instructions):
+            identifier = self._lvn_table.add_entry(
+                instruction, overwritten[i])
+            for renamed_ir, variable, renamed_variable in (
+                    self._lvn_table.take_renamed_definitions()):
+                self._rename_reads(renamed_ir, variable, renamed_variable)
             if identifier is None:
                 new_block.append(instruction)
                 continue
@@ -28,11 +50,78 @@ class NumberingLocalAgent:
             )
             new_block.append(new_instruction)
 
-        self._lvn_table.show_table("./tmp_table.txt")
         # Take action and change the basic block
         basic_block.transform_into(new_block)
+        self._new_block = []
+
+    def _get_enclosing_blocks(self):
+        """The numbered blocks whose values the current one sees"""
+        return []
+
+    def _find_rebuilt(self, rebuilt_ir):
+        """The instruction lists from the one holding rebuilt_ir to the
+            block being rebuilt, and the index of rebuilt_ir
+        """
+        blocks = [basic_block.get_instructions()
+                  for basic_block in self._get_enclosing_blocks()]
+        blocks.append(self._new_block)
+        for k in range(len(blocks) - 1, -1, -1):
+            for i, instruction in enumerate(blocks[k]):
+                if instruction is rebuilt_ir:
+                    return blocks[k:], i
+        raise ValueError
+
+    def _can_rename(self, rebuilt_ir):
+        """A definition may take a fresh name unless a branch lies
+            between it and the current instruction, since the other
+            path may still read its variable
+        """
+        blocks, _ = self._find_rebuilt(rebuilt_ir)
+        for instructions in blocks[:-1]:
+            terminator = instructions[-1] if instructions else None
+            if (terminator is not None and
+                terminator.get_opcode() == BrilOperator.BR and
+                len(set(terminator.get_labels())) > 1):
+                return False
+        return True
+
+    def _rename_reads(self, renamed_ir, variable, renamed_variable):
+        """Make the reads rebuilt after renamed_ir use its new name"""
+        blocks, index = self._find_rebuilt(renamed_ir)
+        for k, instructions in enumerate(blocks):
+            start = index + 1 if k == 0 else 0
+            for instruction in instructions[start:]:
+                if instruction.get_opcode() == BrilOperator.CONST:
+                    continue
+                arguments = instruction.get_arguments()
+                if variable in arguments:
+                    instruction.set_arguments([
+                        renamed_variable if argument == variable
+                        else argument
+                        for argument in arguments
+                    ])
 
     def retire(self):
         for extension in self._extensions:
             extension.reset()
 
+
+class NumberingScopedAgent(NumberingLocalAgent):
+    """Numbers a tree of blocks with one table: a block sees the values
+        of the blocks entered before it and not left yet.
+    """
+    def __init__(self, extensions):
+        super().__init__(extensions)
+        self._entered_blocks = []
+
+    def enter(self, basic_block):
+        self._lvn_table.push_scope()
+        self._number_block(basic_block)
+        self._entered_blocks.append(basic_block)
+
+    def leave(self):
+        self._lvn_table.pop_scope()
+        self._entered_blocks.pop()
+
+    def _get_enclosing_blocks(self):
+        return self._entered_blocks
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+from bril_compiler import opcode
+
 class NumberingUse:
     def __init__(self):
         raise NotImplementedError
@@ -12,6 +14,15 @@ class NumberingPrimitive(NumberingUse):
     def get_value(self):
         return self.value
 
+    def __eq__(self, another):
+        # const true and const 1 are different values
+        return (isinstance(another, NumberingPrimitive) and
+                type(self.value) is type(another.value) and
+                self.value == another.value)
+
+    def __hash__(self):
+        return hash(self.value)
+
     def __repr__(self):
         return f"{self.value}"
 
@@ -74,13 +85,13 @@ class NumberingIdentifier(NumberingUse):
 
 
 class NumberingValue:
+    """operator is an integer opcode (constant.BrilOperator)"""
     def __init__(self, operator, operands, value_type):
         self.operator = operator
         self.operands = operands
         self.type = value_type
 
-        strings = [operator] + [str(op) for op in operands]
-        self.key = ','.join(strings)
+        self.key = (operator, *operands)
 
     def get_operator(self):
         return self.operator
@@ -98,7 +109,7 @@ class NumberingValue:
         return hash(self.key)
 
     def __repr__(self):
-        s = f"({self.operator}"
+        s = f"({opcode.get_name(self.operator)}"
         for operand in self.operands:
             s += f", {operand}"
         s += ")"
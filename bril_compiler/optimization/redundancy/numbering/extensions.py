@@ -2,6 +2,8 @@
 
 import enum
 
+from bril_compiler import opcode
+from bril_compiler.constant import BrilOperator
 from bril_compiler.optimization.redundancy.numbering import base
 
 class NumberingExtensionType(enum.Enum):
@@ -15,7 +17,7 @@ class NumberingExtension:
         return self.type
 
     def _should_update(self, numbering_value):
-        return numbering_value[0] == "id" and numbering_value[1].is_number()
+        raise NotImplementedError
 
     def _update_value(self, numbering_value, table):
         raise NotImplementedError
@@ -32,14 +34,10 @@ class NumberingExtension:
 class CommutativityExtension(NumberingExtension):
     def __init__(self):
         self.type = NumberingExtensionType.PRE_BUILD_TABLE_EXTENSION
-        self.COMMUTATIVITY_LIST = [
-            "add", "mul", "sub", "div",
-            "and", "or", "xor",
-        ]
 
     def _should_update(self, numbering_value):
-        op = numbering_value.get_operator()
-        return op in self.COMMUTATIVITY_LIST
+        operator = numbering_value.get_operator()
+        return opcode.OPCODE_TABLE[operator].is_commutative
 
     def _update_value(self, numbering_value, table):
         operands = numbering_value.get_operands()
@@ -58,7 +56,7 @@ class IdentityPropagationExtension(NumberingExtension):
         self.sources = {}
 
     def _should_update(self, numbering_value):
-        return numbering_value.get_operator() != "const"
+        return numbering_value.get_operator() != BrilOperator.CONST
 
     def _find_source_identifier(self, identifier, table):
         if identifier in self.sources:
@@ -69,7 +67,10 @@ class IdentityPropagationExtension(NumberingExtension):
             return identifier
 
         referred_entry = table.get_entry_by_identifier(identifier)
-        if not referred_entry.value.get_operator() == "id":
+        if referred_entry is None:
+            # forgotten by the table, only for the current scope
+            return identifier
+        if referred_entry.value.get_operator() != BrilOperator.ID:
             self.sources[identifier] = identifier
             return identifier
 
@@ -82,7 +83,18 @@ class IdentityPropagationExtension(NumberingExtension):
     def _update_value(self, numbering_value, table):
         new_operands = []
         for operand in numbering_value.get_operands():
+            # the function of a call
+            if isinstance(operand, base.NumberingPrimitive):
+                new_operands.append(operand)
+                continue
             source_identifier = self._find_source_identifier(operand, table)
+            # a named source was defined outside the table; once it is
+            # in the table it has been redefined since the copy. A
+            # numbered one may have been forgotten by the table.
+            in_table = (
+                table.get_entry_by_identifier(source_identifier) is not None)
+            if source_identifier.is_number() != in_table:
+                source_identifier = operand
             new_operands.append(source_identifier)
 
         # print("numbering_value")
@@ -104,33 +116,20 @@ class ConstantPropagationExtension(NumberingExtension):
 
     def __init__(self):
         self.type = NumberingExtensionType.PRE_BUILD_TABLE_EXTENSION
-        self.SIMULATIONS = {
-            "add": lambda a: a[0] + a[1],
-            "sub": lambda a: a[0] - a[1],
-            "mul": lambda a: a[0] * a[1],
-            "div": lambda a: a[0] // a[1],
-            # "mod": lambda a: a[0] % a[1],
-            "and": lambda a: a[0] and a[1],
-            "or": lambda a: a[0] or a[1],
-            "xor": lambda a: a[0] ^ a[1],
-            "not": lambda a: not a[0],
-            "lt": lambda a: a[0] < a[1],
-            "gt": lambda a: a[0] > a[1],
-            "eq": lambda a: a[0] == a[1],
-            "le": lambda a: a[0] <= a[1],
-            "ge": lambda a: a[0] >= a[1],
-        }
 
     def _should_update(self, numbering_value):
-        return numbering_value.get_operator() in self.SIMULATIONS
+        operator = numbering_value.get_operator()
+        return opcode.OPCODE_TABLE[operator].fold is not None
 
     def _presume_result(self, operator, operands):
         # print(f"presuming {operator} {operands}")
-        if operator == "or" and True in operands:
+        if operator == BrilOperator.OR and True in operands:
             return True
-        elif operator == "and" and False in operands:
+        elif operator == BrilOperator.AND and False in operands:
             return False
-        elif (operator in ["eq", "le", "ge"] and
+        elif (operator in (BrilOperator.EQUAL,
+                           BrilOperator.LESS_THAN_OR_EQUAL_TO,
+                           BrilOperator.GREATER_THAN_OR_EQUAL_TO) and
               operands[0] == operands[1]):
             return True
         return None
@@ -143,8 +142,8 @@ class ConstantPropagationExtension(NumberingExtension):
                 continue
             referred_entry = table.get_entry_by_identifier(operand)
             referred_value = referred_entry.value
-            if referred_value.get_operator() != "const":
-                arguements.append(operand)
+            if referred_value.get_operator() != BrilOperator.CONST:
+                arguments.append(operand)
                 continue
             constant_primitive = referred_value.get_operands()[0]
             arguments.append(constant_primitive.get_value())
@@ -154,17 +153,19 @@ class ConstantPropagationExtension(NumberingExtension):
         if presumed_result is not None:
             presumed_result_primitive = base.NumberingPrimitive(presumed_result)
             return base.NumberingValue(
-                "const", [presumed_result_primitive],
+                BrilOperator.CONST, [presumed_result_primitive],
                 numbering_value.get_type())
 
         for argument in arguments:
             if isinstance(argument, base.NumberingIdentifier):
                 return numbering_value
 
-        result = self.SIMULATIONS[operator](arguments)
+        result = opcode.fold(operator, arguments)
+        if result is None:
+            return numbering_value
         result_primitive = base.NumberingPrimitive(result)
         return base.NumberingValue(
-            "const",
+            BrilOperator.CONST,
             [result_primitive],
             numbering_value.get_type()
         )
@@ -174,19 +175,189 @@ class IdentityToConstantInstructionExtension(NumberingExtension):
         self.type = NumberingExtensionType.RECONSTRUCTION_EXTENSION
 
     def _should_update(self, numbering_value):
-        return numbering_value.get_operator() == "id"
+        return numbering_value.get_operator() == BrilOperator.ID
 
     def _update_value(self, numbering_value, table):
         source_value = numbering_value
         while True:
-            if source_value.get_operator() != "id":
+            if source_value.get_operator() != BrilOperator.ID:
                 return numbering_value
             operand = source_value.get_operands()[0]
+            # a name is not in the table when it was read, so looking it
+            # up now could only find a later definition
+            if not operand.is_number():
+                return numbering_value
             referred_entry = table.get_entry_by_identifier(operand)
             if referred_entry is None:
                 return numbering_value
             source_value = referred_entry.value
-            if source_value.get_operator() == "const":
+            if source_value.get_operator() == BrilOperator.CONST:
                 break
         # print(source_value)
         return source_value
+
+
+def _get_constant(operand, table):
+    """The literal operand holds when it refers to a const entry, None
+        otherwise
+    """
+    if not isinstance(operand, base.NumberingIdentifier):
+        return None
+    if not operand.is_number():
+        return None
+    referred_entry = table.get_entry_by_identifier(operand)
+    if (referred_entry is None or
+        referred_entry.value.get_operator() != BrilOperator.CONST):
+        return None
+    return referred_entry.value.get_operands()[0].get_value()
+
+
+def _get_copied(operand, table):
+    """The operand a chain of id entries starting at operand copies"""
+    while isinstance(operand, base.NumberingIdentifier) and operand.is_number():
+        referred_entry = table.get_entry_by_identifier(operand)
+        if (referred_entry is None or
+            referred_entry.value.get_operator() != BrilOperator.ID):
+            break
+        source = referred_entry.value.get_operands()[0]
+        # a name defined in the table since the copy holds another value
+        if (not source.is_number() and
+            table.get_entry_by_identifier(source) is not None):
+            break
+        operand = source
+    return operand
+
+
+def _is_int(literal, number):
+    # const true == 1 in python, but not in bril
+    return type(literal) is int and literal == number
+
+
+class AlgebraicIdentityExtension(NumberingExtension):
+    """Simplifies an operation with an identity or absorbing operand:
+        x + 0, x - 0, x * 1, x / 1, x and true, x or false and x and x
+        become id x; x * 0, x - x, x and false, x or true become
+        constants. x / x is kept, x may be 0.
+    """
+    def __init__(self):
+        self.type = NumberingExtensionType.PRE_BUILD_TABLE_EXTENSION
+
+    def _should_update(self, numbering_value):
+        return numbering_value.get_operator() in (
+            BrilOperator.ADD, BrilOperator.SUBTRACT, BrilOperator.MULTIPLY,
+            BrilOperator.DIVIDE, BrilOperator.AND, BrilOperator.OR)
+
+    def _simplify(self, operator, operands, constants, same):
+        """id of an operand as (BrilOperator.ID, operand), a constant as
+            (BrilOperator.CONST, literal), None if nothing applies. same
+            tells that both operands hold the same value.
+        """
+        x, y = operands
+        cx, cy = constants
+        if operator == BrilOperator.ADD:
+            if _is_int(cy, 0):
+                return BrilOperator.ID, x
+            if _is_int(cx, 0):
+                return BrilOperator.ID, y
+        elif operator == BrilOperator.SUBTRACT:
+            if _is_int(cy, 0):
+                return BrilOperator.ID, x
+            if same:
+                return BrilOperator.CONST, 0
+        elif operator == BrilOperator.MULTIPLY:
+            if _is_int(cx, 0) or _is_int(cy, 0):
+                return BrilOperator.CONST, 0
+            if _is_int(cy, 1):
+                return BrilOperator.ID, x
+            if _is_int(cx, 1):
+                return BrilOperator.ID, y
+        elif operator == BrilOperator.DIVIDE:
+            if _is_int(cy, 1):
+                return BrilOperator.ID, x
+        else:
+            # and/or: absorbing is the value that decides the result
+            absorbing = operator == BrilOperator.OR
+            if cx is absorbing or cy is absorbing:
+                return BrilOperator.CONST, absorbing
+            if cy is (not absorbing):
+                return BrilOperator.ID, x
+            if cx is (not absorbing):
+                return BrilOperator.ID, y
+            if same:
+                return BrilOperator.ID, x
+        return None
+
+    def _update_value(self, numbering_value, table):
+        operator = numbering_value.get_operator()
+        operands = numbering_value.get_operands()
+        constants = [_get_constant(operand, table) for operand in operands]
+        sources = [_get_copied(operand, table) for operand in operands]
+        simplified = self._simplify(operator, operands, constants,
+                                    sources[0] == sources[1])
+        if simplified is None:
+            return numbering_value
+        operator, operand = simplified
+        if operator == BrilOperator.CONST:
+            operand = base.NumberingPrimitive(operand)
+        return base.NumberingValue(
+            operator, [operand], numbering_value.get_type())
+
+
+class ReassociationExtension(NumberingExtension):
+    """Folds the constants of a chain of add or mul:
+        (x + c1) + c2 becomes x + (c1 + c2), so chains starting from the
+        same x share their values. Both operations wrap around, hence
+        the rewrite holds for any 64-bit values. The table must already
+        hold c1 + c2, a new constant would cost an instruction and keep
+        x alive longer.
+    """
+    def __init__(self):
+        self.type = NumberingExtensionType.PRE_BUILD_TABLE_EXTENSION
+
+    def _should_update(self, numbering_value):
+        return numbering_value.get_operator() in (BrilOperator.ADD,
+                                                  BrilOperator.MULTIPLY)
+
+    def _split_constant(self, operands, table):
+        """(other operand, constant) when exactly one operand is a
+            constant, None otherwise
+        """
+        constants = [_get_constant(operand, table) for operand in operands]
+        if (constants[0] is None) == (constants[1] is None):
+            return None
+        if constants[0] is None:
+            return operands[0], constants[1]
+        return operands[1], constants[0]
+
+    def _is_readable(self, operand, table):
+        """Whether operand, read by an earlier entry, still names the
+            same value
+        """
+        in_table = table.get_entry_by_identifier(operand) is not None
+        return operand.is_number() == in_table
+
+    def _update_value(self, numbering_value, table):
+        operator = numbering_value.get_operator()
+        value_type = numbering_value.get_type()
+        outer = self._split_constant(numbering_value.get_operands(), table)
+        if outer is None or not outer[0].is_number():
+            return numbering_value
+        inner_operand, outer_constant = outer
+        inner_value = table.get_entry_by_identifier(inner_operand).value
+        if inner_value.get_operator() != operator:
+            return numbering_value
+        inner = self._split_constant(inner_value.get_operands(), table)
+        if inner is None or not self._is_readable(inner[0], table):
+            return numbering_value
+        operand, inner_constant = inner
+
+        constant = opcode.fold(operator, [inner_constant, outer_constant])
+        if constant == (0 if operator == BrilOperator.ADD else 1):
+            return base.NumberingValue(BrilOperator.ID, [operand], value_type)
+        constant_entry = table.get_entry_by_value(base.NumberingValue(
+            BrilOperator.CONST, [base.NumberingPrimitive(constant)],
+            value_type))
+        if constant_entry is None:
+            return numbering_value
+        return base.NumberingValue(
+            operator, [operand, constant_entry.number], value_type)
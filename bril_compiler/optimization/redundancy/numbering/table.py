@@ -2,9 +2,15 @@
 
 from bril_compiler import ir
 from bril_compiler import ir_builder
+from bril_compiler import opcode
+from bril_compiler.constant import BrilOperator
 from bril_compiler.optimization.redundancy.numbering import base
 from bril_compiler.optimization.redundancy.numbering import extensions
 
+# marks a key that was not in a mapping before a scoped write
+_MISSING = object()
+
+
 class NumberingTableEntry:
     def __init__(self, number, value, variable):
         self.number = number
@@ -13,8 +19,11 @@ class NumberingTableEntry:
 
 
 class NumberingTable:
-    IGNORE_OPERATIONS = ["jmp", "br"]
-    def __init__(self, numbering_extensions):
+    """can_rename(ir) tells whether the definition rebuilt as ir may take
+        a fresh name when its variable is assigned again; when it may
+        not, its value is forgotten until the scope is popped.
+    """
+    def __init__(self, numbering_extensions, can_rename=None):
         self._entries = []
         self._value_to_entry = {}
         self._identifiers = {}
@@ -27,10 +36,56 @@ class NumberingTable:
         #   a = 4         lvn.0 = 4
         #   a = 3    ->       a = 3
         self._identifier_to_rebuilt_ir = {}
+        self._can_rename = can_rename
+        # (renamed ir, old variable, new variable)
+        self._renamed_definitions = []
+        # numbers of the entries whose variable has been assigned again
+        self._forgotten = {}
+
+        # (mapping, key, previous value) of the writes done in the open
+        # scopes, undone by pop_scope(). Entries are never removed from
+        # _entries, so a number keeps naming the same entry.
+        self._undo_log = []
+        self._scope_marks = []
+
+    def push_scope(self):
+        """Entries added from now on are dropped by the matching
+            pop_scope(); the ones added before stay visible.
+        """
+        self._scope_marks.append(len(self._undo_log))
+
+    def pop_scope(self):
+        mark = self._scope_marks.pop()
+        while len(self._undo_log) > mark:
+            mapping, key, previous = self._undo_log.pop()
+            if previous is _MISSING:
+                del mapping[key]
+            else:
+                mapping[key] = previous
 
-    def add_entry(self, instruction):
-        operator = instruction.get_operator_string()
-        if operator in self.IGNORE_OPERATIONS:
+    def take_renamed_definitions(self):
+        """(ir, old variable, new variable) of the definitions renamed
+            since the last call; the reads rebuilt after ir still use the
+            old variable.
+        """
+        renamed_definitions = self._renamed_definitions
+        self._renamed_definitions = []
+        return renamed_definitions
+
+    def _assign(self, mapping, key, value):
+        if self._scope_marks:
+            self._undo_log.append((mapping, key, mapping.get(key, _MISSING)))
+        mapping[key] = value
+
+    def add_entry(self, instruction, overwritten=False):
+        """overwritten tells that the destination is assigned again later
+            in the block, so a new value is kept under a fresh name.
+        """
+        operator = instruction.get_opcode()
+        operator_info = opcode.OPCODE_TABLE[operator]
+        # terminators (jmp, br) and phis are kept as they are: the
+        # arguments of a phi are not values of this block
+        if operator_info.is_terminator or operator == BrilOperator.PHI:
             return None
 
         # Resolve the variable/identifier name
@@ -40,22 +95,36 @@ class NumberingTable:
         identifier = base.NumberingIdentifier(destination)
 
 
-        # if there's conflicting use of identifier,
+        # if the value held by identifier is still in the table, either
         #  1) change the table's variable name
         #  2) change the rebuilt instruciton's destination
-        if identifier in self._identifiers:
-            conflicting_entry = self._identifiers[identifier]
-            renamed_destination = self.rename_identifier(
-                conflicting_entry.number.get_string()
-            )
-            conflicting_entry.variable = base.NumberingIdentifier(
-                renamed_destination
-            )
-
-            # must resolve conflicting ir first
+        # or forget the value. Definitions passed as overwritten never
+        # get here; the ones of an enclosing block do.
+        conflicting_entry = self.get_entry_by_identifier(identifier)
+        if (conflicting_entry is not None and
+            conflicting_entry.variable == identifier):
             conflicting_ir = self._identifier_to_rebuilt_ir[identifier]
-            conflicting_ir.set_destination(renamed_destination)
-            self._identifier_to_rebuilt_ir[conflicting_entry.variable] = conflicting_ir
+            if self._can_rename is None or self._can_rename(conflicting_ir):
+                renamed_destination = self.rename_identifier(
+                    conflicting_entry.number.get_string()
+                )
+                conflicting_entry.variable = base.NumberingIdentifier(
+                    renamed_destination
+                )
+
+                # must resolve conflicting ir first
+                conflicting_ir.set_destination(renamed_destination)
+                self._assign(self._identifier_to_rebuilt_ir,
+                             conflicting_entry.variable, conflicting_ir)
+                self._renamed_definitions.append(
+                    (conflicting_ir, identifier.get_string(),
+                     renamed_destination))
+            else:
+                self._assign(self._forgotten, conflicting_entry.number, True)
+                if (self._value_to_entry.get(conflicting_entry.value) is
+                    conflicting_entry):
+                    self._assign(self._value_to_entry,
+                                 conflicting_entry.value, None)
 
 
         assert isinstance(identifier, base.NumberingIdentifier)
@@ -70,20 +139,28 @@ class NumberingTable:
                 continue
             value = extension.update(value, self)
 
-        duplicated_entry = self.get_entry_by_value(value)
+        # side-effecting operations (print) must never be merged
+        duplicated_entry = None
+        if not operator_info.has_side_effect:
+            duplicated_entry = self.get_entry_by_value(value)
         if duplicated_entry is not None:
-            self._identifiers[identifier] = duplicated_entry
+            self._assign(self._identifiers, identifier, duplicated_entry)
             return identifier
 
         # building new entry
         number = base.NumberingIdentifier(len(self._entries))
+        variable = identifier
+        if overwritten:
+            variable = base.NumberingIdentifier(
+                self.rename_identifier(number.get_string()))
         new_entry = NumberingTableEntry(
-            number, value, identifier
+            number, value, variable
         )
         self._entries.append(new_entry)
-        self._value_to_entry[value] = new_entry
-        self._identifiers[number] = new_entry
-        self._identifiers[identifier] = new_entry
+        if not operator_info.has_side_effect:
+            self._assign(self._value_to_entry, value, new_entry)
+        self._assign(self._identifiers, number, new_entry)
+        self._assign(self._identifiers, identifier, new_entry)
         return new_entry.number
 
     def reconstruct_instruction(self, identifier):
@@ -128,7 +205,8 @@ class NumberingTable:
 
         # The "id", "const" operations are special. We simply generate
         # its literal value even it's the second or more times visit
-        if numbering_value.get_operator() in ["id", "const"]:
+        if numbering_value.get_operator() in (BrilOperator.ID,
+                                              BrilOperator.CONST):
             return self._build_ir(
                 numbering_value.get_operator(),
                 uses=uses,
@@ -138,20 +216,20 @@ class NumberingTable:
 
         referred_entry = self.get_entry_by_identifier(identifier)
         return self._build_ir(
-            "id",
+            BrilOperator.ID,
             uses=[referred_entry.variable.get_string()],
             identifier=identifier,
             dest_type=numbering_value.get_type()
         )
 
-    def _build_ir(self, operator_string, uses, identifier, dest_type):
-        new_ir = self._ir_builder.build_by_name(
-            operator_string,
+    def _build_ir(self, operator, uses, identifier, dest_type):
+        new_ir = self._ir_builder.build_by_opcode(
+            operator,
             uses=uses,
             destination=identifier.get_string(),
             dest_type=dest_type,
         )
-        self._identifier_to_rebuilt_ir[identifier] = new_ir
+        self._assign(self._identifier_to_rebuilt_ir, identifier, new_ir)
         return new_ir
 
     def get_entry_by_value(self, numbering_value):
@@ -162,7 +240,10 @@ class NumberingTable:
     def get_entry_by_identifier(self, key):
         if key not in self._identifiers:
             return None
-        return self._identifiers[key]
+        entry = self._identifiers[key]
+        if entry.number in self._forgotten:
+            return None
+        return entry
 
     def _encode_to_value(self, instruction, extensions=[]):
         """We need three things:
@@ -170,12 +251,12 @@ class NumberingTable:
             2. a list of operands, which should refer to the table
             3. the operation type
         """
-        operator = instruction.get_operator_string()
+        operator = instruction.get_opcode()
         op_type = instruction.get_type()
         encoded_operands = []
         for operand in instruction.get_arguments():
             # const operation works on primitive values
-            if operator == "const":
+            if operator == BrilOperator.CONST:
                 primitive = base.NumberingPrimitive(operand)
                 encoded_operands.append(primitive)
                 continue
@@ -184,12 +265,36 @@ class NumberingTable:
             # basic block (local context)
             operand_id = base.NumberingIdentifier(operand)
             reference_entry = self.get_entry_by_identifier(operand_id)
+            if (reference_entry is None and
+                operand_id in self._identifiers):
+                reference_entry = self._hold_in_variable(operand_id)
             if reference_entry is not None:
                 operand_id = reference_entry.number
             encoded_operands.append(operand_id)
 
+        # the called function follows the arguments, like in the uses of
+        # the IRBuilder
+        for function in instruction.get_functions():
+            encoded_operands.append(base.NumberingPrimitive(function))
+
         return base.NumberingValue(operator, encoded_operands, op_type)
 
+    def _hold_in_variable(self, identifier):
+        """identifier still holds the value of a forgotten entry: a new
+            entry with the same value is kept in identifier, but is not
+            offered for reuse. The name alone would match the values read
+            before it was defined in the table.
+        """
+        forgotten_entry = self._identifiers[identifier]
+        number = base.NumberingIdentifier(len(self._entries))
+        new_entry = NumberingTableEntry(
+            number, forgotten_entry.value, identifier
+        )
+        self._entries.append(new_entry)
+        self._assign(self._identifiers, number, new_entry)
+        self._assign(self._identifiers, identifier, new_entry)
+        return new_entry
+
     def show_table(self, out_file=None):
         s = f"|{'#'.rjust(5)}|{'Value'.rjust(25)}|{'Id'.rjust(15)}|\n"
         s += "-" * 50 + "\n"
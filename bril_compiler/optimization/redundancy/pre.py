@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import ir_builder
+from bril_compiler import opcode
+from bril_compiler import program
+from bril_compiler.analysis import dataflow
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.redundancy import dce
+from bril_compiler.optimization.redundancy import gvn
+from bril_compiler.optimization.ssa import construction
+from bril_compiler.optimization.ssa import destruction
+
+
+class PartialRedundancyEliminationPass(compiler_pass.BrilPass):
+    """Partial redundancy elimination by lazy code motion (Knoop,
+        Ruething and Steffen), in the edge-based form of Cooper and
+        Torczon.
+        An expression is the operator of a pure instruction applied to
+        its argument names. Anticipability and availability are solved
+        with the dataflow engine, and give the earliest edges where an
+        expression can be computed without being evaluated on a path
+        that would not evaluate it anyway. A third problem delays the
+        placement as far as possible, so temporaries live no longer than
+        necessary. Every evaluation of a moved expression writes a
+        temporary (pre.N); the evaluations that become redundant read it
+        instead, and the new evaluations go at the end of the source or
+        at the start of the target of their edge, or in a block
+        splitting it. A loop-invariant expression leaves its loop when
+        it is anticipated on entry, e.g. when the loop header computes
+        it. A division is only moved when its divisor is a nonzero
+        constant, since an earlier trap would lose side effects.
+        Functions with phis are left alone, as the temporaries are
+        assigned more than once.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_inserted = 0
+        self.num_deleted = 0
+        self.num_split_edges = 0
+        self._ir_builder = ir_builder.IRBuilder()
+
+    def optimize(self, module):
+        program_changed = False
+        for function in module.get_functions():
+            if not function.get_basic_blocks() or function.has_phis():
+                continue
+            program_changed |= self.eliminate(function)
+        return program_changed
+
+    def eliminate(self, function):
+        if self._normalize(function):
+            self.get_analysis_manager().invalidate(function)
+        cfg = self.get_analysis("cfg", function)
+        expressions = _LocalExpressions(function, cfg)
+        if not expressions.get_number_of_expressions():
+            return False
+        universe = (1 << expressions.get_number_of_expressions()) - 1
+
+        available = dataflow.solve(
+            _AvailableExpressions(expressions, universe), cfg)
+        anticipable = dataflow.solve(
+            _AnticipableExpressions(expressions, universe), cfg)
+        entry = cfg.get_entry()
+        earliest = {}
+        for block in range(cfg.get_number_of_blocks()):
+            for successor in cfg.get_successors(block):
+                placeable = (anticipable.get_in(successor) &
+                             ~available.get_out(block))
+                if block != entry:
+                    placeable &= (expressions.get_killed(block) |
+                                  ~anticipable.get_out(block))
+                earliest[(block, successor)] = placeable
+        later = dataflow.solve(
+            _LaterPlacement(cfg, expressions, universe, earliest), cfg)
+
+        insertions = {}
+        moved = 0
+        for (block, successor), placeable in earliest.items():
+            later_edge = placeable | later.get_out(block)
+            inserted = later_edge & ~later.get_in(successor)
+            if inserted:
+                insertions[(block, successor)] = inserted
+                moved |= inserted
+        deletions = [0] * cfg.get_number_of_blocks()
+        for block in range(cfg.get_number_of_blocks()):
+            if block != entry:
+                deletions[block] = (expressions.get_upward_exposed(block) &
+                                    ~later.get_in(block))
+                moved |= deletions[block]
+        if not moved:
+            return False
+
+        temporaries = self._make_temporaries(function, expressions, moved)
+        for block in range(cfg.get_number_of_blocks()):
+            self._rewrite_block(cfg.get_block(block), expressions, moved,
+                                deletions[block], temporaries)
+        self._insert(function, cfg, expressions, insertions, temporaries)
+        return True
+
+    def _normalize(self, function):
+        """Give the function an entry block without predecessors and drop
+            the blocks it cannot reach, whose availability would be
+            vacuous. Returns whether anything changed.
+        """
+        changed = function.add_entry_block()
+        cfg = function.get_cfg()
+        reachable_blocks = [
+            basic_block for i, basic_block in enumerate(cfg.get_blocks())
+            if cfg.is_reachable(i)
+        ]
+        if len(reachable_blocks) != cfg.get_number_of_blocks():
+            function.set_basic_blocks(reachable_blocks)
+            changed = True
+        return changed
+
+    def _make_temporaries(self, function, expressions, moved):
+        temporaries = {}
+        for bit in dataflow.iterate_bits(moved):
+            temporaries[bit] = function.get_fresh_name("pre")
+        return temporaries
+
+    def _rewrite_block(self, basic_block, expressions, moved, deletions,
+                       temporaries):
+        """Every evaluation of a moved expression writes its temporary;
+            the upward exposed one of a deleted expression reads it
+        """
+        instructions = []
+        killed = 0
+        for instruction in basic_block.get_instructions():
+            bit = expressions.get_bit(instruction)
+            destination = instruction.get_destination()
+            if bit is None or not (moved >> bit) & 1:
+                instructions.append(instruction)
+            elif (deletions >> bit) & 1 and not (killed >> bit) & 1:
+                instructions.append(ir.IdInstruction(
+                    temporaries[bit], destination, instruction.get_type()))
+                # later evaluations in the block are not upward exposed
+                deletions &= ~(1 << bit)
+                self.num_deleted += 1
+            else:
+                instructions.append(self._evaluate(
+                    expressions, bit, temporaries))
+                instructions.append(ir.IdInstruction(
+                    temporaries[bit], destination, instruction.get_type()))
+            if destination is not None:
+                killed |= expressions.get_kills(destination)
+        basic_block.transform_into(instructions)
+
+    def _evaluate(self, expressions, bit, temporaries):
+        operator, arguments, dest_type = expressions.get_expression(bit)
+        return self._ir_builder.build_by_opcode(
+            operator, temporaries[bit], list(arguments), dest_type)
+
+    def _insert(self, function, cfg, expressions, insertions, temporaries):
+        split_blocks = {}
+        for (block, successor), inserted in insertions.items():
+            new_instructions = [
+                self._evaluate(expressions, bit, temporaries)
+                for bit in dataflow.iterate_bits(inserted)]
+            self.num_inserted += len(new_instructions)
+            basic_block = cfg.get_block(block)
+            terminator = basic_block.get_terminator()
+            if len(cfg.get_successors(block)) == 1:
+                instructions = basic_block.get_instructions()
+                if terminator is None:
+                    instructions.extend(new_instructions)
+                else:
+                    instructions[-1:-1] = new_instructions
+            elif len(cfg.get_predecessors(successor)) == 1:
+                successor_block = cfg.get_block(successor)
+                successor_block.transform_into(
+                    new_instructions + successor_block.get_instructions())
+            else:
+                target = cfg.get_name(successor)
+                split_block = program.BasicBlock()
+                split_block.set_label(ir.LabelInstruction(
+                    function.get_fresh_label(f"{target}.split")))
+                for instruction in new_instructions:
+                    split_block.add_instruction(instruction)
+                split_block.add_instruction(ir.JumpInstruction(target))
+                terminator.set_labels([
+                    split_block.get_label_name() if label == target
+                    else label for label in terminator.get_labels()
+                ])
+                split_blocks.setdefault(block, []).append(
+                    (successor, split_block))
+                self.num_split_edges += 1
+                # get_fresh_label must see the labels taken so far
+                function.get_basic_blocks().append(split_block)
+
+        if not split_blocks:
+            return
+        # a split block falls through into its target when the block laid
+        # out before the target cannot; otherwise it goes right after its
+        # source, which ends in a branch and so cannot fall through into it
+        falling_through = {}
+        for source_splits in split_blocks.values():
+            for successor, split_block in source_splits:
+                previous = cfg.get_block(successor - 1)
+                if (successor in falling_through or
+                    previous.get_terminator() is None):
+                    continue
+                falling_through[successor] = split_block
+                # the jump into the target is not needed any more
+                split_block.get_instructions().pop()
+        basic_blocks = []
+        for index, basic_block in enumerate(cfg.get_blocks()):
+            if index in falling_through:
+                basic_blocks.append(falling_through[index])
+            basic_blocks.append(basic_block)
+            basic_blocks.extend(
+                split_block for _, split_block in split_blocks.get(index, ())
+                if split_block not in falling_through.values())
+        function.set_basic_blocks(basic_blocks)
+
+
+class _LocalExpressions:
+    """The expressions of a function, numbered as bits, and the local
+        sets of every block: the expressions evaluated before any of
+        their arguments is assigned (upward exposed), the ones evaluated
+        after the last assignment of their arguments (downward exposed)
+        and the ones with an argument assigned in the block (killed).
+    """
+    def __init__(self, function, cfg):
+        self._bits = {}
+        self._expressions = []
+        # variable -> the expressions reading it
+        self._kills = {}
+        nonzero = self._get_nonzero_constants(function)
+
+        self._keys = {}
+        for basic_block in cfg.get_blocks():
+            for instruction in basic_block.get_instructions():
+                key = self._get_key(instruction, nonzero)
+                if key is None:
+                    continue
+                self._keys[instruction] = key
+                if key in self._bits:
+                    continue
+                bit = len(self._expressions)
+                self._bits[key] = bit
+                self._expressions.append(
+                    (key[0], instruction.get_arguments(),
+                     instruction.get_type()))
+                for arg in set(key[1]):
+                    self._kills[arg] = self._kills.get(arg, 0) | 1 << bit
+
+        self._upward_exposed = []
+        self._downward_exposed = []
+        self._killed = []
+        for basic_block in cfg.get_blocks():
+            upward_exposed, downward_exposed, killed = 0, 0, 0
+            for instruction in basic_block.get_instructions():
+                bit = self.get_bit(instruction)
+                if bit is not None:
+                    if not (killed >> bit) & 1:
+                        upward_exposed |= 1 << bit
+                    downward_exposed |= 1 << bit
+                destination = instruction.get_destination()
+                if destination is not None:
+                    kills = self.get_kills(destination)
+                    killed |= kills
+                    downward_exposed &= ~kills
+            self._upward_exposed.append(upward_exposed)
+            self._downward_exposed.append(downward_exposed)
+            self._killed.append(killed)
+
+    def _get_nonzero_constants(self, function):
+        """Variables only ever assigned constants other than zero"""
+        constants = {}
+        for basic_block in function.get_basic_blocks():
+            for instruction in basic_block.get_instructions():
+                destination = instruction.get_destination()
+                if destination is None:
+                    continue
+                constants[destination] = constants.get(destination, True) and (
+                    instruction.get_opcode() == BrilOperator.CONST and
+                    instruction.get_value() != 0)
+        for name, _ in function.arguments:
+            constants[name] = False
+        return set(name for name, nonzero in constants.items() if nonzero)
+
+    def _get_key(self, instruction, nonzero):
+        operator = instruction.get_opcode()
+        if instruction.get_destination() is None:
+            return None
+        info = opcode.get_info(operator)
+        if info.fold is None or info.has_side_effect:
+            return None
+        arguments = instruction.get_arguments()
+        if (operator == BrilOperator.DIVIDE and
+            arguments[1] not in nonzero):
+            return None
+        if info.is_commutative:
+            arguments = tuple(sorted(arguments))
+        return (operator, tuple(arguments))
+
+    def get_number_of_expressions(self):
+        return len(self._expressions)
+
+    def get_bit(self, instruction):
+        """The bit of the expression instruction evaluates, or None"""
+        key = self._keys.get(instruction)
+        if key is None:
+            return None
+        return self._bits[key]
+
+    def get_expression(self, bit):
+        """(operator, arguments, type) of an expression"""
+        return self._expressions[bit]
+
+    def get_kills(self, name):
+        return self._kills.get(name, 0)
+
+    def get_upward_exposed(self, block):
+        return self._upward_exposed[block]
+
+    def get_downward_exposed(self, block):
+        return self._downward_exposed[block]
+
+    def get_killed(self, block):
+        return self._killed[block]
+
+
+class _AvailableExpressions(dataflow.DataflowProblem):
+    """Expressions evaluated on every path to a point and not killed
+        since
+    """
+    def __init__(self, expressions, universe):
+        self._expressions = expressions
+        self._universe = universe
+
+    def boundary(self, block):
+        return 0
+
+    def initial(self, block):
+        return self._universe
+
+    def meet(self, block, values):
+        result = self._universe
+        for value in values:
+            result &= value
+        return result
+
+    def transfer(self, block, value):
+        return (self._expressions.get_downward_exposed(block) |
+                (value & ~self._expressions.get_killed(block)))
+
+
+class _AnticipableExpressions(dataflow.DataflowProblem):
+    """Expressions every path from a point evaluates before an argument
+        is assigned
+    """
+    FORWARD = False
+
+    def __init__(self, expressions, universe):
+        self._expressions = expressions
+        self._universe = universe
+
+    def boundary(self, block):
+        return 0
+
+    def initial(self, block):
+        return self._universe
+
+    def meet(self, block, values):
+        result = self._universe
+        for value in values:
+            result &= value
+        return result
+
+    def transfer(self, block, value):
+        return (self._expressions.get_upward_exposed(block) |
+                (value & ~self._expressions.get_killed(block)))
+
+
+class _LaterPlacement(dataflow.DataflowProblem):
+    """The expressions whose evaluation can still be delayed past the
+        start (in) and the end (out) of a block. An expression is late
+        on an edge when it is earliest there or can be delayed through
+        the source.
+    """
+    def __init__(self, cfg, expressions, universe, earliest):
+        self._cfg = cfg
+        self._expressions = expressions
+        self._universe = universe
+        self._earliest = earliest
+
+    def boundary(self, block):
+        return 0
+
+    def initial(self, block):
+        return self._universe
+
+    def meet(self, block, values):
+        result = self._universe
+        for predecessor, value in zip(self._cfg.get_predecessors(block),
+                                      values):
+            result &= self._earliest[(predecessor, block)] | value
+        return result
+
+    def transfer(self, block, value):
+        return value & ~self._expressions.get_upward_exposed(block)
+
+
+class PartialRedundancyEliminationCompositePass(
+        compiler_pass.BrilCompositePass):
+    def __init__(self):
+        super().__init__()
+        self.add_pass(PartialRedundancyEliminationPass())
+        # forward the temporaries through the copies reading them
+        self.add_pass(construction.SSAConstructionPass())
+        self.add_pass(gvn.GlobalValueNumberingPass())
+        self.add_pass(dce.DeadCodeEliminationPass())
+        self.add_pass(destruction.SSADestructionPass())
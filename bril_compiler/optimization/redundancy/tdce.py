@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 
+from bril_compiler import opcode
+from bril_compiler.constant import BrilOperator
 from bril_compiler.optimization import compiler_pass
 
-class TrivilDeadCodeEliminationPass(compiler_pass.BrilPass):
+class TrivilDeadCodeEliminationOldPass(compiler_pass.BrilPass):
+    """Sweeps every function until neither unused definitions nor
+        overwritten stores are left. Kept as the reference for
+        TrivilDeadCodeEliminationPass and bin/bench_tdce.py.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
     def __init__(self):
         self.modules = 0
 
@@ -33,13 +41,16 @@ class TrivilDeadCodeEliminationPass(compiler_pass.BrilPass):
 
     def unused_instruction_elimination_algorithm(self, function):
         program_changed = False
-        used = set()
+        symbol_table = function.intern_symbols()
+        get_id = symbol_table.get_id
+        used = bytearray(len(symbol_table))
         for basic_block in function.get_basic_blocks():
             for instruction in basic_block.get_instructions():
-                if instruction is None:
+                if (instruction is None or
+                    instruction.get_opcode() == BrilOperator.CONST):
                     continue
                 for arg in instruction.get_arguments():
-                    used.add(arg)
+                    used[get_id(arg)] = 1
 
         for basic_block in function.get_basic_blocks():
             instructions = basic_block.get_instructions()
@@ -48,7 +59,8 @@ class TrivilDeadCodeEliminationPass(compiler_pass.BrilPass):
                     continue
                 destination = instruction.get_destination()
                 if (destination is not None and
-                    destination not in used):
+                    not used[get_id(destination)] and
+                    not opcode.has_side_effect(instruction.get_opcode())):
                     program_changed = True
                     instructions[i] = None # mark as deleted
 
@@ -57,33 +69,179 @@ class TrivilDeadCodeEliminationPass(compiler_pass.BrilPass):
     def dead_store_elimination(self, module):
         program_changed = False
         for function in module.get_functions():
+            symbol_table = function.intern_symbols()
+            # indexed by symbol id, shared by the blocks of the function
+            last_defined = [None] * len(symbol_table)
             for basic_block in function.get_basic_blocks():
                 program_changed |= (
-                    self.dead_store_elimination_algorithm(basic_block)
+                    self.dead_store_elimination_algorithm(
+                        basic_block, symbol_table, last_defined)
                 )
         return program_changed
 
-    def dead_store_elimination_algorithm(self, basic_block):
+    def dead_store_elimination_algorithm(self, basic_block, symbol_table,
+                                         last_defined):
+        """last_defined[id] is the index of the latest store to the
+            variable that is not followed by a use yet; the entries set
+            here are cleared again before returning.
+        """
         program_changed = False
-        last_defined = {}
+        get_id = symbol_table.get_id
+        defined_ids = []
         instructions = basic_block.get_instructions()
         for i, instruction in enumerate(instructions):
             if instruction is None:
                 continue
-            for arg in instruction.get_arguments():
-                if arg in last_defined:
-                    last_defined[arg] = None
+            if instruction.get_opcode() != BrilOperator.CONST:
+                for arg in instruction.get_arguments():
+                    last_defined[get_id(arg)] = None
 
             destination = instruction.get_destination()
             if destination is None:
                 continue
 
-            if (destination in last_defined and
-                last_defined[destination] is not None):
+            destination_id = get_id(destination)
+            last_defined_index = last_defined[destination_id]
+            if last_defined_index is not None:
                 program_changed = True
-                last_defined_index = last_defined[destination]
                 instructions[last_defined_index] = None
-            last_defined[destination] = i
+            # a call runs even if its result is overwritten
+            if opcode.has_side_effect(instruction.get_opcode()):
+                last_defined[destination_id] = None
+                continue
+            last_defined[destination_id] = i
+            defined_ids.append(destination_id)
 
+        for destination_id in defined_ids:
+            last_defined[destination_id] = None
         return program_changed
 
+
+# kinds of the per-block variable events
+_USE = 0
+_DEFINITION = 1
+
+
+class TrivilDeadCodeEliminationPass(compiler_pass.BrilPass):
+    """Removes the same instructions as TrivilDeadCodeEliminationOldPass
+        in one pass over the IR.
+        Every variable keeps a count of its uses; a definition is pushed
+        on the worklist when the count drops to zero. Within a block, the
+        uses and definitions of each variable form a linked list, and a
+        definition directly followed by another definition is an
+        overwritten store. Deleting an instruction unlinks its events and
+        only re-examines their neighbours.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
+    def __init__(self):
+        self.modules = 0
+
+    def optimize(self, module):
+        for function in module.get_functions():
+            self.eliminate(function)
+        return True
+
+    def eliminate(self, function):
+        symbol_table = function.intern_symbols()
+        get_id = symbol_table.get_id
+        num_symbols = len(symbol_table)
+
+        instructions = []
+        use_counts = [0] * num_symbols
+        definitions_of = [[] for _ in range(num_symbols)]
+        # event lists: node -> kind, instruction, previous, next node
+        kinds, owners, previous, following = [], [], [], []
+        # instruction -> its event nodes
+        instruction_nodes = []
+
+        def add_node(kind, instruction_index, last_nodes, symbol_id):
+            node = len(kinds)
+            kinds.append(kind)
+            owners.append(instruction_index)
+            last_node = last_nodes.get(symbol_id)
+            previous.append(last_node)
+            following.append(None)
+            if last_node is not None:
+                following[last_node] = node
+            last_nodes[symbol_id] = node
+            return node
+
+        for basic_block in function.get_basic_blocks():
+            # symbol id -> last event node in this block
+            last_nodes = {}
+            for instruction in basic_block.get_instructions():
+                instruction_index = len(instructions)
+                instructions.append(instruction)
+                nodes = []
+                if instruction.get_opcode() != BrilOperator.CONST:
+                    for arg in instruction.get_arguments():
+                        symbol_id = get_id(arg)
+                        use_counts[symbol_id] += 1
+                        nodes.append((symbol_id, add_node(
+                            _USE, instruction_index, last_nodes, symbol_id)))
+                destination = instruction.get_destination()
+                if destination is not None:
+                    symbol_id = get_id(destination)
+                    definitions_of[symbol_id].append(instruction_index)
+                    nodes.append((symbol_id, add_node(
+                        _DEFINITION, instruction_index, last_nodes,
+                        symbol_id)))
+                instruction_nodes.append(nodes)
+
+        deleted = bytearray(len(instructions))
+        queued = bytearray(len(instructions))
+        worklist = []
+
+        def push(instruction_index):
+            # a call runs even if its result is not used
+            if opcode.has_side_effect(
+                    instructions[instruction_index].get_opcode()):
+                return
+            if not queued[instruction_index]:
+                queued[instruction_index] = 1
+                worklist.append(instruction_index)
+
+        def is_overwritten(node):
+            next_node = following[node]
+            return (kinds[node] == _DEFINITION and next_node is not None and
+                    kinds[next_node] == _DEFINITION)
+
+        for symbol_id in range(num_symbols):
+            if use_counts[symbol_id] == 0:
+                for instruction_index in definitions_of[symbol_id]:
+                    push(instruction_index)
+        for node in range(len(kinds)):
+            if is_overwritten(node):
+                push(owners[node])
+
+        while worklist:
+            instruction_index = worklist.pop()
+            deleted[instruction_index] = 1
+            neighbours = []
+            for symbol_id, node in instruction_nodes[instruction_index]:
+                previous_node, next_node = previous[node], following[node]
+                if previous_node is not None:
+                    following[previous_node] = next_node
+                    neighbours.append(previous_node)
+                if next_node is not None:
+                    previous[next_node] = previous_node
+                if kinds[node] != _USE:
+                    continue
+                use_counts[symbol_id] -= 1
+                if use_counts[symbol_id] == 0:
+                    for definition in definitions_of[symbol_id]:
+                        if not deleted[definition]:
+                            push(definition)
+            for node in neighbours:
+                if not deleted[owners[node]] and is_overwritten(node):
+                    push(owners[node])
+
+        instruction_index = 0
+        for basic_block in function.get_basic_blocks():
+            new_instructions = []
+            for instruction in basic_block.get_instructions():
+                if not deleted[instruction_index]:
+                    new_instructions.append(instruction)
+                instruction_index += 1
+            basic_block.transform_into(new_instructions)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+
+# the phi argument for a predecessor on which the variable is not defined
+UNDEFINED = "__undefined"
+
+
+class SSAConstructionPass(compiler_pass.BrilPass):
+    """Rewrite every function into SSA form.
+        Phis are placed on the iterated dominance frontiers of the
+        definitions (Cytron et al.), but only where the variable is live
+        on entry, which keeps the pruned form free of the dead phis
+        minimal SSA piles up in large functions. Variables are then
+        renamed in a preorder walk of the dominator tree.
+    """
+    PRESERVED_ANALYSES = compiler_pass.CONTROL_FLOW_ANALYSES
+
+    def __init__(self):
+        self.num_phis = 0
+
+    def optimize(self, module):
+        for function in module.get_functions():
+            self.construct(function)
+        return True
+
+    def construct(self, function):
+        if not function.get_basic_blocks():
+            return
+        if self._normalize(function):
+            self.get_analysis_manager().invalidate(function)
+        cfg = self.get_analysis("cfg", function)
+        dominator_tree = self.get_analysis("dominators", function)
+        live_variables = self.get_analysis("liveness", function)
+        symbol_table = function.intern_symbols()
+
+        definition_blocks, types = self._collect_definitions(function, cfg)
+        phi_variables = self._place_phis(
+            cfg, dominator_tree, live_variables, definition_blocks)
+        self._insert_phis(cfg, symbol_table, types, phi_variables)
+        _Renamer(function, cfg, dominator_tree, definition_blocks,
+                 phi_variables).rename()
+
+    def _normalize(self, function):
+        """Give the function an entry block without predecessors, drop
+            the blocks it cannot reach and label every block so phis can
+            refer to it. Returns whether anything changed.
+        """
+        changed = function.add_entry_block()
+        cfg = function.get_cfg()
+        reachable_blocks = [
+            basic_block for i, basic_block in enumerate(cfg.get_blocks())
+            if cfg.is_reachable(i)
+        ]
+        if len(reachable_blocks) != cfg.get_number_of_blocks():
+            function.set_basic_blocks(reachable_blocks)
+            cfg = function.get_cfg()
+            changed = True
+        labeled = False
+        for i, basic_block in enumerate(cfg.get_blocks()):
+            if basic_block.get_label() is None:
+                basic_block.set_label(ir.LabelInstruction(cfg.get_name(i)))
+                labeled = True
+        if labeled:
+            # the cached graph cannot look the new labels up
+            function.invalidate_cfg()
+        return changed or labeled
+
+    def _collect_definitions(self, function, cfg):
+        """Blocks defining each symbol id (arguments are defined in the
+            entry block) and the type of every variable.
+        """
+        symbol_table = function.get_symbol_table()
+        get_id = symbol_table.get_id
+        definition_blocks = [[] for _ in range(len(symbol_table))]
+        types = [None] * len(symbol_table)
+        for name, arg_type in function.arguments:
+            definition_blocks[get_id(name)].append(cfg.get_entry())
+            types[get_id(name)] = arg_type
+        for index in range(cfg.get_number_of_blocks()):
+            for instruction in cfg.get_block(index).get_instructions():
+                destination = instruction.get_destination()
+                if destination is None:
+                    continue
+                symbol_id = get_id(destination)
+                blocks = definition_blocks[symbol_id]
+                if not blocks or blocks[-1] != index:
+                    blocks.append(index)
+                types[symbol_id] = instruction.get_type()
+        return definition_blocks, types
+
+    def _place_phis(self, cfg, dominator_tree, live_variables,
+                    definition_blocks):
+        """phi_variables[block] lists the symbol ids needing a phi there"""
+        num_blocks = cfg.get_number_of_blocks()
+        phi_variables = [[] for _ in range(num_blocks)]
+        # per-block stamps of the variable being placed, so nothing has
+        # to be cleared between variables
+        has_phi = [-1] * num_blocks
+        is_definition = [-1] * num_blocks
+        for symbol_id, blocks in enumerate(definition_blocks):
+            if not blocks:
+                continue
+            for block in blocks:
+                is_definition[block] = symbol_id
+            worklist = list(blocks)
+            while worklist:
+                block = worklist.pop()
+                for frontier in dominator_tree.get_dominance_frontier(block):
+                    if has_phi[frontier] == symbol_id:
+                        continue
+                    if not live_variables.is_live_in(frontier, symbol_id):
+                        continue
+                    has_phi[frontier] = symbol_id
+                    phi_variables[frontier].append(symbol_id)
+                    if is_definition[frontier] != symbol_id:
+                        is_definition[frontier] = symbol_id
+                        worklist.append(frontier)
+        return phi_variables
+
+    def _insert_phis(self, cfg, symbol_table, types, phi_variables):
+        for index, symbol_ids in enumerate(phi_variables):
+            if not symbol_ids:
+                continue
+            predecessor_labels = [
+                cfg.get_name(predecessor)
+                for predecessor in cfg.get_predecessors(index)
+            ]
+            phis = []
+            for symbol_id in sorted(symbol_ids):
+                phis.append(ir.PhiInstruction(
+                    [UNDEFINED] * len(predecessor_labels),
+                    predecessor_labels,
+                    symbol_table.get_name(symbol_id),
+                    types[symbol_id]
+                ))
+            basic_block = cfg.get_block(index)
+            basic_block.transform_into(phis + basic_block.get_instructions())
+            self.num_phis += len(phis)
+
+
+class _Renamer:
+    """Gives every definition a fresh name (x.0, x.1, ...) and rewrites
+        the uses to the reaching one.
+    """
+    def __init__(self, function, cfg, dominator_tree, definition_blocks,
+                 phi_variables):
+        self._cfg = cfg
+        self._dominator_tree = dominator_tree
+        self._symbol_table = function.get_symbol_table()
+        self._is_renamed = [bool(blocks) for blocks in definition_blocks]
+        self._counters = [0] * len(definition_blocks)
+        self._stacks = [[] for _ in definition_blocks]
+        for name, _ in function.arguments:
+            self._stacks[self._symbol_table.get_id(name)].append(name)
+        # phi added by construction -> the variable it merges; the other
+        # phis were in the program already
+        self._new_phis = {}
+        for index, symbol_ids in enumerate(phi_variables):
+            instructions = cfg.get_block(index).get_instructions()
+            for phi in instructions[:len(symbol_ids)]:
+                self._new_phis[phi] = phi.get_destination()
+
+    def rename(self):
+        worklist = [(self._dominator_tree.get_root(), None)]
+        while worklist:
+            block, pushed = worklist.pop()
+            if pushed is not None:
+                for symbol_id in pushed:
+                    self._stacks[symbol_id].pop()
+                continue
+            pushed = self._rename_block(block)
+            worklist.append((block, pushed))
+            for child in reversed(self._dominator_tree.get_children(block)):
+                worklist.append((child, None))
+
+    def _rename_block(self, block):
+        get_id = self._symbol_table.get_id
+        pushed = []
+        for instruction in self._cfg.get_block(block).get_instructions():
+            operator = instruction.get_opcode()
+            if operator != BrilOperator.PHI and operator != BrilOperator.CONST:
+                arguments = instruction.get_arguments()
+                if arguments:
+                    instruction.set_arguments(
+                        [self._current_name(arg) for arg in arguments])
+            destination = instruction.get_destination()
+            if destination is not None:
+                symbol_id = get_id(destination)
+                new_name = self._fresh_name(symbol_id)
+                instruction.set_destination(new_name)
+                self._stacks[symbol_id].append(new_name)
+                pushed.append(symbol_id)
+
+        label = self._cfg.get_name(block)
+        for successor in self._cfg.get_successors(block):
+            for phi in self._cfg.get_block(successor).get_instructions():
+                if phi.get_opcode() != BrilOperator.PHI:
+                    break
+                variable = self._new_phis.get(phi)
+                if variable is None:
+                    variable = phi.get_argument_for(label)
+                    if variable is None:
+                        continue
+                phi.set_incoming(label, self._current_name(variable, True))
+        return pushed
+
+    def _current_name(self, name, for_phi=False):
+        symbol_id = self._symbol_table.get_id(name)
+        if (symbol_id is None or symbol_id >= len(self._is_renamed) or
+            not self._is_renamed[symbol_id]):
+            return name
+        stack = self._stacks[symbol_id]
+        if stack:
+            return stack[-1]
+        return UNDEFINED if for_phi else name
+
+    def _fresh_name(self, symbol_id):
+        name = self._symbol_table.get_name(symbol_id)
+        while True:
+            new_name = f"{name}.{self._counters[symbol_id]}"
+            self._counters[symbol_id] += 1
+            if new_name not in self._symbol_table:
+                return self._symbol_table.intern_name(new_name)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+from bril_compiler import ir
+from bril_compiler import program
+from bril_compiler.constant import BrilOperator
+from bril_compiler.optimization import compiler_pass
+from bril_compiler.optimization.ssa import construction
+
+
+class SSADestructionPass(compiler_pass.BrilPass):
+    """Lower the phis of every function back into copies.
+        Phi-related variables whose live ranges do not interfere are
+        coalesced into one name first, so most phis disappear without a
+        copy. The remaining phis of a block become one parallel copy per
+        incoming edge, placed at the end of the predecessor, at the top of
+        a single-predecessor block or in a block splitting the critical
+        edge, and sequentialized with one temporary per copy cycle.
+    """
+    PRESERVED_ANALYSES = ()
+
+    def __init__(self):
+        self.num_copies = 0
+        self.num_coalesced = 0
+
+    def optimize(self, module):
+        for function in module.get_functions():
+            self.destruct(function)
+        return True
+
+    def destruct(self, function):
+        cfg = self.get_analysis("cfg", function)
+        if not any(basic_block.get_phis()
+                   for basic_block in cfg.get_blocks()):
+            return
+        live_variables = self.get_analysis("liveness", function)
+        # get_fresh_name must see every name of the function
+        function.intern_symbols()
+
+        coalescer = _Coalescer(function, cfg, live_variables)
+        coalescer.coalesce()
+        self.num_coalesced += coalescer.num_coalesced
+        coalescer.rename()
+
+        edge_copies = self._collect_edge_copies(cfg)
+        self._place_copies(function, cfg, edge_copies)
+
+    def _collect_edge_copies(self, cfg):
+        """Remove the phis and return the parallel copy of every edge as
+            {(predecessor, block): [(destination, source, type)]}
+        """
+        edge_copies = {}
+        for index, basic_block in enumerate(cfg.get_blocks()):
+            phis = basic_block.get_phis()
+            if not phis:
+                continue
+            basic_block.transform_into(
+                basic_block.get_instructions()[len(phis):])
+            for predecessor in cfg.get_predecessors(index):
+                label = cfg.get_name(predecessor)
+                copies = []
+                for phi in phis:
+                    source = phi.get_argument_for(label)
+                    destination = phi.get_destination()
+                    if (source is None or source == construction.UNDEFINED
+                        or source == destination):
+                        continue
+                    copies.append((destination, source, phi.get_type()))
+                if copies:
+                    edge_copies[(predecessor, index)] = copies
+        return edge_copies
+
+    def _place_copies(self, function, cfg, edge_copies):
+        split_blocks = {}
+        temporaries = {}
+        for (predecessor, index), copies in edge_copies.items():
+            instructions = self._sequentialize(
+                copies, function, temporaries)
+            self.num_copies += len(instructions)
+
+            predecessor_block = cfg.get_block(predecessor)
+            terminator = predecessor_block.get_terminator()
+            if (terminator is None or
+                terminator.get_opcode() == BrilOperator.JMP):
+                # the edge is the only way out of the predecessor
+                body = predecessor_block.get_instructions()
+                if terminator is None:
+                    body.extend(instructions)
+                else:
+                    body[-1:-1] = instructions
+            elif len(cfg.get_predecessors(index)) == 1:
+                basic_block = cfg.get_block(index)
+                basic_block.transform_into(
+                    instructions + basic_block.get_instructions())
+            else:
+                target = cfg.get_name(index)
+                split_block = program.BasicBlock()
+                split_block.set_label(ir.LabelInstruction(
+                    function.get_fresh_label(f"{target}.split")))
+                for instruction in instructions:
+                    split_block.add_instruction(instruction)
+                split_block.add_instruction(ir.JumpInstruction(target))
+                terminator.set_labels([
+                    split_block.get_label_name() if label == target
+                    else label for label in terminator.get_labels()
+                ])
+                split_blocks.setdefault(predecessor, []).append(split_block)
+                # get_fresh_label must see the labels taken so far
+                function.get_basic_blocks().append(split_block)
+
+        if not split_blocks:
+            return
+        # a split block goes right after its predecessor, which ends in a
+        # branch and so cannot fall through into it
+        basic_blocks = []
+        for index, basic_block in enumerate(cfg.get_blocks()):
+            basic_blocks.append(basic_block)
+            basic_blocks.extend(split_blocks.get(index, ()))
+        function.set_basic_blocks(basic_blocks)
+
+    def _sequentialize(self, copies, function, temporaries):
+        """Order a parallel copy into id instructions. Each cycle is
+            broken with a temporary, so a cycle of n copies costs n + 1.
+        """
+        pending = {}
+        types = {}
+        num_reads = {}
+        for destination, source, dest_type in copies:
+            pending[destination] = source
+            types[destination] = dest_type
+            num_reads[source] = num_reads.get(source, 0) + 1
+
+        instructions = []
+        ready = [destination for destination in pending
+                 if not num_reads.get(destination)]
+        while pending:
+            while ready:
+                destination = ready.pop()
+                source = pending.pop(destination)
+                instructions.append(ir.IdInstruction(
+                    source, destination, types[destination]))
+                num_reads[source] -= 1
+                if num_reads[source] == 0 and source in pending:
+                    ready.append(source)
+            if not pending:
+                break
+            # everything left is on a cycle: save one of its values
+            destination = next(iter(pending))
+            dest_type = types[destination]
+            temporary = temporaries.get(str(dest_type))
+            if temporary is None:
+                temporary = function.get_fresh_name("ssa.tmp")
+                temporaries[str(dest_type)] = temporary
+            instructions.append(ir.IdInstruction(
+                destination, temporary, dest_type))
+            for other, source in pending.items():
+                if source == destination:
+                    pending[other] = temporary
+                    num_reads[destination] -= 1
+                    num_reads[temporary] = num_reads.get(temporary, 0) + 1
+            ready.append(destination)
+        return instructions
+
+
+class _Coalescer:
+    """Merges phi-related variables into congruence classes that share a
+        name. Two classes merge only if no member of one is live where a
+        member of the other is defined, with phi destinations defined at
+        the top of their block and phi arguments used at the end of the
+        predecessor they come from.
+        Interference is only recorded between phi-related variables and
+        kept as bitsets over symbol ids.
+    """
+    def __init__(self, function, cfg, live_variables):
+        self._function = function
+        self._cfg = cfg
+        self._symbol_table = function.get_symbol_table()
+        num_symbols = len(self._symbol_table)
+        self._parents = list(range(num_symbols))
+        self._members = [1 << symbol_id for symbol_id in range(num_symbols)]
+        self._is_argument = [False] * num_symbols
+        for name, _ in function.arguments:
+            self._is_argument[self._symbol_table.get_id(name)] = True
+        self._candidates = self._collect_candidates()
+        self._interference = self._build_interference(live_variables)
+        self.num_coalesced = 0
+
+    def _phis(self):
+        for basic_block in self._cfg.get_blocks():
+            for instruction in basic_block.get_instructions():
+                if instruction.get_opcode() != BrilOperator.PHI:
+                    break
+                yield instruction
+
+    def _collect_candidates(self):
+        get_id = self._symbol_table.get_id
+        candidates = 0
+        for phi in self._phis():
+            candidates |= 1 << get_id(phi.get_destination())
+            for arg in phi.get_arguments():
+                if arg != construction.UNDEFINED:
+                    candidates |= 1 << get_id(arg)
+        return candidates
+
+    def _build_interference(self, live_variables):
+        """interference[v]: candidates live where candidate v is defined"""
+        get_id = self._symbol_table.get_id
+        candidates = self._candidates
+        interference = {}
+
+        def define(symbol_id, live):
+            if (candidates >> symbol_id) & 1:
+                interference[symbol_id] = (
+                    interference.get(symbol_id, 0) |
+                    (live & candidates & ~(1 << symbol_id))
+                )
+
+        for index in range(self._cfg.get_number_of_blocks()):
+            live = live_variables.get_live_out(index)
+            instructions = self._cfg.get_block(index).get_instructions()
+            num_phis = 0
+            for instruction in instructions:
+                if instruction.get_opcode() != BrilOperator.PHI:
+                    break
+                num_phis += 1
+            for instruction in reversed(instructions[num_phis:]):
+                destination = instruction.get_destination()
+                if destination is not None:
+                    symbol_id = get_id(destination)
+                    define(symbol_id, live)
+                    live &= ~(1 << symbol_id)
+                if instruction.get_opcode() != BrilOperator.CONST:
+                    for arg in instruction.get_arguments():
+                        live |= 1 << get_id(arg)
+            # the phis of a block are defined together at its top
+            phi_definitions = 0
+            for phi in instructions[:num_phis]:
+                phi_definitions |= 1 << get_id(phi.get_destination())
+            for phi in instructions[:num_phis]:
+                define(get_id(phi.get_destination()), live | phi_definitions)
+            live &= ~phi_definitions
+            if index == self._cfg.get_entry():
+                arguments = 0
+                for name, _ in self._function.arguments:
+                    arguments |= 1 << get_id(name)
+                for name, _ in self._function.arguments:
+                    define(get_id(name), live | arguments)
+        return interference
+
+    def _find(self, symbol_id):
+        root = symbol_id
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[symbol_id] != root:
+            self._parents[symbol_id], symbol_id = root, self._parents[symbol_id]
+        return root
+
+    def _interferes(self, root0, root1):
+        members0, members1 = self._members[root0], self._members[root1]
+        return (self._interference.get(root0, 0) & members1 or
+                self._interference.get(root1, 0) & members0)
+
+    def _union(self, symbol_id0, symbol_id1):
+        root0, root1 = self._find(symbol_id0), self._find(symbol_id1)
+        if root0 == root1:
+            return False
+        # arguments keep their names, so a class holds at most one
+        if self._is_argument[root0] and self._is_argument[root1]:
+            return False
+        if self._interferes(root0, root1):
+            return False
+        # the smaller id is the older name; arguments come first
+        if (self._is_argument[root1] or
+            (not self._is_argument[root0] and root1 < root0)):
+            root0, root1 = root1, root0
+        self._parents[root1] = root0
+        self._members[root0] |= self._members[root1]
+        self._interference[root0] = (
+            self._interference.get(root0, 0) |
+            self._interference.pop(root1, 0)
+        )
+        self.num_coalesced += 1
+        return True
+
+    def coalesce(self):
+        get_id = self._symbol_table.get_id
+        for phi in self._phis():
+            destination_id = get_id(phi.get_destination())
+            for arg in phi.get_arguments():
+                if arg != construction.UNDEFINED:
+                    self._union(destination_id, get_id(arg))
+
+    def rename(self):
+        """Replace every variable by the name of its class"""
+        get_id = self._symbol_table.get_id
+        get_name = self._symbol_table.get_name
+
+        def class_name(name):
+            symbol_id = get_id(name)
+            if symbol_id is None or symbol_id >= len(self._parents):
+                return name
+            return get_name(self._find(symbol_id))
+
+        for basic_block in self._cfg.get_blocks():
+            for instruction in basic_block.get_instructions():
+                operator = instruction.get_opcode()
+                if operator != BrilOperator.CONST:
+                    arguments = instruction.get_arguments()
+                    if arguments:
+                        instruction.set_arguments(
+                            [class_name(arg) for arg in arguments])
+                destination = instruction.get_destination()
+                if destination is not None:
+                    instruction.set_destination(class_name(destination))
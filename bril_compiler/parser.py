@@ -2,11 +2,13 @@
 
 import json
 import os
+import re
 import sys
 
 from bril_compiler import program
-from bril_compiler import constant
 from bril_compiler import ir
+from bril_compiler import opcode
+from bril_compiler.constant import BrilOperator
 
 class BrilParser(object):
     def __init__(self):
@@ -17,53 +19,84 @@ class BrilParser(object):
 
 
 class JSonToBrilParser(BrilParser):
+    STREAM_CHUNK_SIZE = 1 << 16
+
     def __init__(self):
         self._num_file_parsed = 0
-        self.BINARY_ARITHMETIC_CONSTRUCTOR_MAP = {
-            "add": ir.AddInstruction,
-            "sub": ir.SubtractInstruction,
-            "mul": ir.MultiplyInstruction,
-            "div": ir.DivideInstruction,
-            "eq": ir.EqualInstruction,
-            "gt": ir.GreaterThanInstruction,
-            "ge": ir.GreaterThanOrEqualToInstruction,
-            "lt": ir.LessThanInstruction,
-            "le": ir.LessThanOrEqualToInstruction,
-            "and": ir.AndInstruction,
-            "or": ir.OrInstruction
-        }
-        self.UNARY_OPERATOR_CONSTRUCTOR_MAP = {
-            "id": ir.IdInstruction,
-            "print": ir.PrintInstruction,
-            "not": ir.NotInstruction
-        }
-
 
     def parse(self, file_path):
-        data = self._text_to_json(file_path)
+        """Parse a Bril program from either its JSON or textual form.
+            Textual sources are handled in-process by BrilTextParser, so
+            no bril2json subprocess or temporary file is involved.
+        """
+        source = self._read_source(file_path)
+        if not self._is_json(source):
+            return BrilTextParser().parse_text(source)
+        return self.parse_json(json.loads(source))
+
+    def parse_json(self, data):
+        """Build a Module from an already loaded Bril JSON object"""
         module = program.Module()
         for function_json in data['functions']:
-            # function
-            function = program.Function(function_json['name'])
-            if 'args' in function_json:
-                for function_argument_json in function_json['args']:
-                    function.add_argument(
-                        function_argument_json['name'],
-                        function_argument_json['type']
-                    )
-            # parse JSon and generate a list of instructions
-            instructions = []
-            for instr_json in function_json['instrs']:
-                instruction = self._json_to_instruction(instr_json)
-                instructions.append(instruction)
-
-            # form basic blocks
-            self._form_basic_blocks(function, instructions)
-
-            # add function into module
-            module.add_function(function)
+            module.add_function(self._json_to_function(function_json))
         return module
 
+    def iterate_functions(self, stream):
+        """Lazily parse the functions of a Bril JSON document read from
+            a file object. Each function object is decoded as soon as its
+            text is complete, so only one function is held in memory.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ""
+        # skip everything up to the opening bracket of "functions"
+        while True:
+            key_index = buffer.find('"functions"')
+            if key_index >= 0 and buffer.find("[", key_index) >= 0:
+                buffer = buffer[buffer.find("[", key_index) + 1:]
+                break
+            chunk = stream.read(self.STREAM_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("iterate_functions: no functions array")
+            buffer += chunk
+
+        while True:
+            buffer = buffer.lstrip(" \t\r\n,")
+            if buffer.startswith("]"):
+                return
+            try:
+                function_json, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # read at least as much as buffered to keep it linear
+                chunk = stream.read(max(self.STREAM_CHUNK_SIZE, len(buffer)))
+                if not chunk:
+                    raise ValueError("iterate_functions: truncated input")
+                buffer += chunk
+                continue
+            buffer = buffer[end:]
+            yield self._json_to_function(function_json)
+
+    def _json_to_function(self, function_json):
+        function = program.Function(function_json['name'])
+        if 'args' in function_json:
+            for function_argument_json in function_json['args']:
+                function.add_argument(
+                    function_argument_json['name'],
+                    function_argument_json['type']
+                )
+        if 'type' in function_json:
+            function.return_type = function_json['type']
+        # parse JSon and generate a list of instructions
+        symbol_table = function.get_symbol_table()
+        instructions = []
+        for instr_json in function_json['instrs']:
+            self._intern_names(instr_json, symbol_table)
+            instruction = self._json_to_instruction(instr_json)
+            instructions.append(instruction)
+
+        # form basic blocks
+        self._form_basic_blocks(function, instructions)
+        return function
+
     def _form_basic_blocks(self, function, instructions):
         """
         Setup instrucitons in function in place
@@ -72,7 +105,10 @@ class JSonToBrilParser(BrilParser):
         for instruction in instructions:
             # Do not include the label instruction
             if instruction.is_label():
-                if not curr_block.is_empty():
+                # a labeled block is kept even without instructions since
+                # jumps may target it
+                if (not curr_block.is_empty() or
+                    curr_block.get_label() is not None):
                     function.add_basic_block(curr_block)
                     curr_block = program.BasicBlock()
                 curr_block.set_label(instruction)
@@ -84,17 +120,30 @@ class JSonToBrilParser(BrilParser):
                 function.add_basic_block(curr_block)
                 curr_block = program.BasicBlock()
 
-        if not curr_block.is_empty():
+        if not curr_block.is_empty() or curr_block.get_label() is not None:
             function.add_basic_block(curr_block)
 
-    def _text_to_json(self, file_path):
+    def _read_source(self, file_path):
         if not os.path.exists(file_path):
             print(f"Error {file_path} does not exist.")
             quit()
-        TMP_FILE = "./tmp.json"
-        os.system(f"bril2json < {file_path} > {TMP_FILE}")
-        fp = open(TMP_FILE, "rb")
-        return json.load(fp)
+        with open(file_path, "r") as fp:
+            return fp.read()
+
+    def _is_json(self, source):
+        """Bril JSON is always an object while textual Bril starts with a
+            function, a comment or whitespace.
+        """
+        return source.lstrip().startswith("{")
+
+    def _intern_names(self, instr_json, symbol_table):
+        """Replace variable names by the function's canonical strings"""
+        if "dest" in instr_json:
+            instr_json["dest"] = symbol_table.intern_name(instr_json["dest"])
+        if "args" in instr_json:
+            instr_json["args"] = [
+                symbol_table.intern_name(arg) for arg in instr_json["args"]
+            ]
 
     def _json_to_instruction(self, instr_json):
         """Transform json object into labels"""
@@ -105,39 +154,173 @@ class JSonToBrilParser(BrilParser):
 
         # for the rest of instructions, we can guarantee that
         # they possess the "op" property
-        operator = instr_json["op"]
-        if operator == "const":
+        operator = opcode.get_opcode(instr_json["op"])
+        if operator is None:
+            print(f"instr_json.op == {instr_json}")
+            raise NotImplementedError
+
+        if operator == BrilOperator.CONST:
             return ir.ConstInstruction(instr_json["value"],
                                        instr_json["dest"],
                                        instr_json["type"])
-        elif operator == "jmp":
-            return ir.JumpInstruction(instr_json["labels"][0])
-        elif operator == "br":
-            return ir.BranchInstruction(instr_json["args"][0],
-                                        instr_json["labels"][0],
-                                        instr_json["labels"][1])
-        elif operator in self.UNARY_OPERATOR_CONSTRUCTOR_MAP:
-            if "dest" not in instr_json:
-                instr_json["dest"] = None
-                instr_json["type"] = None
-            return self.UNARY_OPERATOR_CONSTRUCTOR_MAP[operator](
-                instr_json["args"][0],
-                instr_json["dest"],
-                instr_json["type"]
-            )
-        elif operator in self.BINARY_ARITHMETIC_CONSTRUCTOR_MAP:
-            return self.BINARY_ARITHMETIC_CONSTRUCTOR_MAP[operator](
-                instr_json["args"][0],
-                instr_json["args"][1],
-                instr_json["dest"],
-                instr_json["type"]
-            )
-        else:
-            print(f"instr_json.op == {instr_json}")
-            raise NotImplementedError
+
+        # the operands follow the IRBuilder convention: variables first,
+        # then labels (e.g. br cond .true .false), then functions
+        uses = (instr_json.get("args", []) + instr_json.get("labels", []) +
+                instr_json.get("funcs", []))
+        return ir.get_instruction_class(operator).from_uses(
+            uses,
+            instr_json.get("dest"),
+            instr_json.get("type")
+        )
+
+
+class BrilTextParser(JSonToBrilParser):
+    """In-process parser for the textual Bril format.
+        Every instruction is read into the same dictionary shape bril2json
+        emits and goes through JSonToBrilParser._json_to_instruction, so
+        both front ends construct identical IR.
+    """
+    TOKEN_PATTERN = re.compile(r"#[^\n]*|[{}()<>:;=,]|[^\s{}()<>:;=,#]+")
+
+    def parse(self, file_path):
+        return self.parse_text(self._read_source(file_path))
+
+    def parse_text(self, source):
+        self._tokens = [
+            token for token in self.TOKEN_PATTERN.findall(source)
+            if not token.startswith("#")
+        ]
+        self._position = 0
+
+        module = program.Module()
+        while not self._at_end():
+            module.add_function(self._parse_function())
+        self._num_file_parsed += 1
+        return module
+
+    def _parse_function(self):
+        token = self._next()
+        if not token.startswith("@"):
+            self._error(f"expected function name, got '{token}'")
+        function = program.Function(token[1:])
+
+        if self._peek() == "(":
+            self._next()
+            while self._peek() != ")":
+                arg_name = self._next()
+                self._expect(":")
+                function.add_argument(arg_name, self._parse_type())
+                if self._peek() == ",":
+                    self._next()
+            self._expect(")")
+
+        if self._peek() == ":":
+            self._next()
+            function.return_type = self._parse_type()
+
+        self._expect("{")
+        symbol_table = function.get_symbol_table()
+        instructions = []
+        while self._peek() != "}":
+            instr_json = self._parse_instruction()
+            self._intern_names(instr_json, symbol_table)
+            instructions.append(self._json_to_instruction(instr_json))
+        self._expect("}")
+
+        self._form_basic_blocks(function, instructions)
+        return function
+
+    def _parse_instruction(self):
+        """Read one label or one ';'-terminated instruction as Bril JSON"""
+        token = self._next()
+        if token.startswith(".") and self._peek() == ":":
+            self._next()
+            return {"label": token[1:]}
+
+        instr_json = {}
+        if self._peek() in [":", "="]:
+            instr_json["dest"] = token
+            if self._peek() == ":":
+                self._next()
+                instr_json["type"] = self._parse_type()
+            self._expect("=")
+            token = self._next()
+
+        instr_json["op"] = token
+        operands = []
+        while self._peek() != ";":
+            operands.append(self._next())
+        self._expect(";")
+
+        if token == "const":
+            if len(operands) != 1:
+                self._error(f"const expects one literal, got {operands}")
+            instr_json["value"] = self._parse_literal(
+                operands[0], instr_json.get("type"))
+            return instr_json
+
+        args, funcs, labels = [], [], []
+        for operand in operands:
+            if operand.startswith("@"):
+                funcs.append(operand[1:])
+            elif operand.startswith("."):
+                labels.append(operand[1:])
+            else:
+                args.append(operand)
+        if args:
+            instr_json["args"] = args
+        if funcs:
+            instr_json["funcs"] = funcs
+        if labels:
+            instr_json["labels"] = labels
+        return instr_json
+
+    def _parse_type(self):
+        type_name = self._next()
+        if self._peek() != "<":
+            return type_name
+        self._next()
+        parameter = self._parse_type()
+        self._expect(">")
+        return {type_name: parameter}
+
+    def _parse_literal(self, literal, literal_type):
+        if literal in ["true", "false"]:
+            return literal == "true"
+        if literal_type == "float":
+            return float(literal)
+        if literal_type == "char":
+            return literal.strip("'")
+        try:
+            return int(literal)
+        except ValueError:
+            return float(literal)
+
+    def _at_end(self):
+        return self._position >= len(self._tokens)
+
+    def _peek(self):
+        if self._at_end():
+            self._error("unexpected end of input")
+        return self._tokens[self._position]
+
+    def _next(self):
+        token = self._peek()
+        self._position += 1
+        return token
+
+    def _expect(self, expected):
+        token = self._next()
+        if token != expected:
+            self._error(f"expected '{expected}', got '{token}'")
+
+    def _error(self, message):
+        raise ValueError(f"BrilTextParser: {message}")
+
 
 if __name__ == "__main__":
     parser = JSonToBrilParser()
-    module = parser.parse("test/bril/tdce/simple.bril")
+    module = parser.parse("test/turnt/tdce/simple.bril")
     data = module.dump_json()
     json.dump(data, sys.stdout)
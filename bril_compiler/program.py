@@ -1,5 +1,47 @@
 #!/usr/bin/env python3
 
+import sys
+
+from bril_compiler import ir
+from bril_compiler.constant import BrilOperator
+
+class SymbolTable(object):
+    """Interns the variable names of a function into dense integer ids,
+        so analyses can index lists and bitsets instead of hashing names.
+        The parser interns every name it reads; names created later by a
+        pass get the next free id the first time they are interned.
+    """
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+
+    def intern(self, name):
+        """Return the id of name, allocating one if it is new"""
+        symbol_id = self._ids.get(name)
+        if symbol_id is None:
+            name = sys.intern(name)
+            symbol_id = len(self._names)
+            self._ids[name] = symbol_id
+            self._names.append(name)
+        return symbol_id
+
+    def intern_name(self, name):
+        """Return the canonical string object of name"""
+        return self._names[self.intern(name)]
+
+    def get_id(self, name):
+        return self._ids.get(name)
+
+    def get_name(self, symbol_id):
+        return self._names[symbol_id]
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+
 class BasicBlock(object):
     def __init__(self):
         self._label = None
@@ -11,6 +53,29 @@ class BasicBlock(object):
     def get_label(self):
         return self._label
 
+    def get_label_name(self):
+        if self._label is None:
+            return None
+        return self._label.get_name()
+
+    def get_terminator(self):
+        """The last instruction if it is a terminator, otherwise None"""
+        if not self._instructions:
+            return None
+        last_instruction = self._instructions[-1]
+        if last_instruction is None or not last_instruction.is_terminator():
+            return None
+        return last_instruction
+
+    def get_phis(self):
+        """The phis at the top of the block"""
+        phis = []
+        for instruction in self._instructions:
+            if instruction.get_opcode() != BrilOperator.PHI:
+                break
+            phis.append(instruction)
+        return phis
+
     def is_empty(self):
         return len(self._instructions) == 0
 
@@ -36,6 +101,9 @@ class Function(object):
         self._basic_blocks = []
         # tuple (name, type)
         self.arguments = []
+        self.return_type = None
+        self._symbol_table = SymbolTable()
+        self._cfg = None
 
     def get_identifier(self):
         return self._identifier
@@ -48,10 +116,90 @@ class Function(object):
 
     def add_basic_block(self, block):
         self._basic_blocks.append(block)
+        self._cfg = None
+
+    def set_basic_blocks(self, blocks):
+        self._basic_blocks = blocks
+        self._cfg = None
+
+    def get_cfg(self):
+        """The control-flow graph, built on first use and cached.
+            A pass that adds, removes or reorders blocks, or changes a
+            terminator, has to call invalidate_cfg().
+        """
+        if self._cfg is None:
+            self._cfg = ControlFlowGraph(self)
+        return self._cfg
+
+    def invalidate_cfg(self):
+        self._cfg = None
+
+    def get_fresh_label(self, prefix):
+        """A label not used by any block, numbered like bril's fresh()"""
+        labels = set()
+        for basic_block in self._basic_blocks:
+            labels.add(basic_block.get_label_name())
+        index = 1
+        while f"{prefix}{index}" in labels:
+            index += 1
+        return f"{prefix}{index}"
+
+    def get_fresh_name(self, prefix):
+        """A variable name prefix.N not in the symbol table. The name is
+            interned, so it is not handed out again.
+        """
+        index = 0
+        while f"{prefix}.{index}" in self._symbol_table:
+            index += 1
+        return self._symbol_table.intern_name(f"{prefix}.{index}")
+
+    def has_phis(self):
+        return any(instruction.get_opcode() == BrilOperator.PHI
+                   for basic_block in self._basic_blocks
+                   for instruction in basic_block.get_instructions())
+
+    def add_entry_block(self):
+        """Dominance and SSA construction expect an entry block without
+            predecessors. If the first block is a jump target, put a new
+            empty block in front of it that falls through into it.
+        """
+        if not self._basic_blocks:
+            return False
+        if not self.get_cfg().get_predecessors(0):
+            return False
+        entry_block = BasicBlock()
+        entry_block.set_label(
+            ir.LabelInstruction(self.get_fresh_label("entry")))
+        self._basic_blocks.insert(0, entry_block)
+        self._cfg = None
+        return True
 
     def add_argument(self, name, arg_type):
+        name = self._symbol_table.intern_name(name)
         self.arguments.append((name, arg_type))
 
+    def get_symbol_table(self):
+        return self._symbol_table
+
+    def intern_symbols(self):
+        """Make sure every variable in the function has an id.
+            Passes may introduce names (e.g. lvn.0) after parsing; call
+            this before sizing id-indexed arrays.
+        """
+        symbol_table = self._symbol_table
+        for basic_block in self._basic_blocks:
+            for instruction in basic_block.get_instructions():
+                if instruction is None or instruction.is_label():
+                    continue
+                destination = instruction.get_destination()
+                if destination is not None:
+                    symbol_table.intern(destination)
+                if instruction.get_opcode() == BrilOperator.CONST:
+                    continue
+                for arg in instruction.get_arguments():
+                    symbol_table.intern(arg)
+        return symbol_table
+
     def dump_json(self):
         function_json = {}
         # function name
@@ -64,6 +212,8 @@ class Function(object):
                 'name': arg_name,
                 'type': arg_type
             })
+        if self.return_type is not None:
+            function_json['type'] = self.return_type
 
         # instrs
         function_json['instrs'] = []
@@ -80,6 +230,127 @@ class Function(object):
         return function_json
 
 
+class ControlFlowGraph(object):
+    """Successor/predecessor edges between the basic blocks of a function.
+        Blocks are referred to by their index in the function's block
+        list. Unlabeled blocks get fresh names (b1, b2, ...) in the same
+        way bril's cfg.py names them.
+    """
+    def __init__(self, function):
+        self._blocks = list(function.get_basic_blocks())
+        self._block_to_index = {}
+        self._names = []
+        self._label_to_index = {}
+        self._reverse_postorder = None
+        self._reachable = None
+
+        labels = set()
+        for basic_block in self._blocks:
+            if basic_block.get_label_name() is not None:
+                labels.add(basic_block.get_label_name())
+
+        fresh_index = 1
+        for i, basic_block in enumerate(self._blocks):
+            self._block_to_index[basic_block] = i
+            name = basic_block.get_label_name()
+            if name is None:
+                while f"b{fresh_index}" in labels:
+                    fresh_index += 1
+                name = f"b{fresh_index}"
+                labels.add(name)
+            else:
+                self._label_to_index[name] = i
+            self._names.append(name)
+
+        self._successors = [[] for _ in self._blocks]
+        self._predecessors = [[] for _ in self._blocks]
+        for i, basic_block in enumerate(self._blocks):
+            terminator = basic_block.get_terminator()
+            if terminator is None:
+                targets = [i + 1] if i + 1 < len(self._blocks) else []
+            else:
+                targets = []
+                for label in terminator.get_labels():
+                    target = self._label_to_index[label]
+                    if target not in targets:
+                        targets.append(target)
+            self._successors[i] = targets
+            for target in targets:
+                self._predecessors[target].append(i)
+
+    def get_blocks(self):
+        return self._blocks
+
+    def get_number_of_blocks(self):
+        return len(self._blocks)
+
+    def get_block(self, index):
+        return self._blocks[index]
+
+    def get_index(self, basic_block):
+        return self._block_to_index[basic_block]
+
+    def get_index_by_label(self, label):
+        return self._label_to_index.get(label)
+
+    def get_name(self, index):
+        return self._names[index]
+
+    def get_names(self):
+        return self._names
+
+    def get_entry(self):
+        return 0
+
+    def get_exits(self):
+        return [i for i, successors in enumerate(self._successors)
+                if not successors]
+
+    def get_successors(self, index):
+        return self._successors[index]
+
+    def get_predecessors(self, index):
+        return self._predecessors[index]
+
+    def get_reverse_postorder(self):
+        """Indices of the blocks reachable from the entry, in reverse
+            postorder. Computed iteratively so deep CFGs do not hit the
+            recursion limit.
+        """
+        if self._reverse_postorder is not None:
+            return self._reverse_postorder
+        postorder = []
+        if self._blocks:
+            visited = [False] * len(self._blocks)
+            visited[0] = True
+            stack = [(0, iter(self._successors[0]))]
+            while stack:
+                index, successors = stack[-1]
+                for successor in successors:
+                    if not visited[successor]:
+                        visited[successor] = True
+                        stack.append(
+                            (successor, iter(self._successors[successor])))
+                        break
+                else:
+                    stack.pop()
+                    postorder.append(index)
+        postorder.reverse()
+        self._reverse_postorder = postorder
+        self._reachable = [False] * len(self._blocks)
+        for index in postorder:
+            self._reachable[index] = True
+        return postorder
+
+    def get_postorder(self):
+        return self.get_reverse_postorder()[::-1]
+
+    def is_reachable(self, index):
+        if self._reachable is None:
+            self.get_reverse_postorder()
+        return self._reachable[index]
+
+
 class Module(object):
     def __init__(self):
         self._functions = []
@@ -90,6 +361,9 @@ class Module(object):
     def add_function(self, function):
         self._functions.append(function)
 
+    def set_functions(self, functions):
+        self._functions = functions
+
     def dump_json(self):
         module_json = {}
         module_json["functions"] = []